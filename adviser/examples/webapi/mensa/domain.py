@@ -40,9 +40,15 @@ class MensaDomain(LookupDomain):
         last_results (List[dict]): Current results which the user might request info about
     """
 
-    def __init__(self):
+    def __init__(self, prefetch: bool = False, cache_file: str = None):
+        """
+        Args:
+            prefetch (bool): whether the parser keeps the menus of the current and the next week
+                             cached in the background, so that lookups are answered from memory
+            cache_file (str): path of a file the parsed menus are persisted in across restarts
+        """
         LookupDomain.__init__(self, 'MensaAPI', 'Mensa Food')
-        self.parser = MensaParser()
+        self.parser = MensaParser(prefetch=prefetch, cache_file=cache_file)
         self.last_results = []
 
     def find_entities(self, constraints: dict, requested_slots: Iterable = iter(())):
@@ -19,10 +19,20 @@
 
 from typing import Tuple, List, Dict
 import datetime
+import os
+import pickle
 import re
+import threading
+import time
 from lxml import html
 import requests
 from enum import Enum
+from loguru import logger
+
+#: the endpoint returning the menus
+MENSA_URL = 'https://sws2.maxmanager.xyz/inc/ajax-php_konnektor.inc.php'
+#: seconds the website is waited for
+REQUEST_TIMEOUT = 10
 
 
 class ParseDateError(Exception):
@@ -166,19 +176,130 @@ class Meal():
 
 
 class MensaParser():
-	def __init__(self, cache: bool = True):
+	def __init__(self, cache: bool = True, ttl: float = 3600, cache_file: str = None,
+			prefetch: bool = False, prefetch_interval: float = None, url: str = MENSA_URL):
 		"""
 		The class to issue post requests and parse the response. Will also take care of caching the
 		parser's results.
 
+		The meals of a date are returned from the cache for ``ttl`` seconds after they were
+		parsed. With ``cache_file``, the cache is written to disk after each request and loaded
+		again when the parser is created, so that a restarted dialog system does not have to
+		fetch the menus again. With ``prefetch``, a background thread keeps the menus of the
+		current and the next week in the cache, so that dialogs do not wait for the website.
+
 		Args:
 			cache (bool): Whether to cache results or not.
+			ttl (float): Seconds the meals of a date are returned from the cache.
+			cache_file (str): Path of a file the cache is persisted in (None: not persisted).
+			prefetch (bool): Whether to start prefetching right away (see `start_prefetch`).
+			prefetch_interval (float): Seconds between two prefetches (default: half the ttl).
+			url (str): The endpoint returning the menus.
 
 		"""
 		
-		#: dict of str: storgae to cache parsed meals
+		#: dict of datetime.date: tuple of (time parsed, meals) caching parsed meals
 		self.storage = {}
 		self.cache = cache
+		self.ttl = ttl
+		self.cache_file = cache_file
+		self.url = url
+		self.prefetch_interval = prefetch_interval if prefetch_interval is not None else ttl / 2
+		self._lock = threading.Lock()
+		self._session = requests.Session()
+		self._prefetch_thread = None
+		self._stop_prefetch = threading.Event()
+		if cache and cache_file:
+			self._load_cache()
+		if prefetch:
+			self.start_prefetch()
+
+	def _load_cache(self):
+		"""Loads the unexpired entries of the cache file, if it exists."""
+
+		try:
+			with open(self.cache_file, 'rb') as file:
+				storage = pickle.load(file)
+		except FileNotFoundError:
+			return
+		except Exception as e:
+			logger.warning(f"Ignoring unreadable mensa cache file {self.cache_file}: {e}")
+			return
+		now = time.time()
+		with self._lock:
+			self.storage.update({date: entry for date, entry in storage.items()
+				if now - entry[0] < self.ttl})
+
+	def _save_cache(self):
+		"""Writes the unexpired entries of the cache to the cache file (replacing it at once, so
+		that readers never see a partly written file)."""
+
+		now = time.time()
+		with self._lock:
+			storage = {date: entry for date, entry in self.storage.items()
+				if now - entry[0] < self.ttl}
+		tmp_file = f"{self.cache_file}.{os.getpid()}-{threading.get_ident()}.tmp"
+		with open(tmp_file, 'wb') as file:
+			pickle.dump(storage, file)
+		os.replace(tmp_file, self.cache_file)
+
+	def _cached(self, date: datetime.date, max_age: float = None) -> List[Meal]:
+		"""Returns the cached meals of a date if they are younger than ``max_age`` seconds
+		(default: the ttl), else None."""
+
+		with self._lock:
+			entry = self.storage.get(date)
+		max_age = self.ttl if max_age is None else max_age
+		if entry is not None and time.time() - entry[0] < max_age:
+			return entry[1]
+		return None
+
+	def start_prefetch(self):
+		"""Starts a background thread which parses the menus from today until the end of next
+		week every ``prefetch_interval`` seconds. Dates whose menus are failed to be fetched are
+		tried again in the next round."""
+
+		if not self.cache or (self._prefetch_thread and self._prefetch_thread.is_alive()):
+			return
+		self._stop_prefetch.clear()
+		self._prefetch_thread = threading.Thread(target=self._prefetch_loop, daemon=True,
+			name='mensa-prefetch')
+		self._prefetch_thread.start()
+
+	def stop_prefetch(self):
+		"""Stops the background thread started by `start_prefetch`."""
+
+		self._stop_prefetch.set()
+		if self._prefetch_thread is not None:
+			self._prefetch_thread.join()
+			self._prefetch_thread = None
+
+	def _prefetch_loop(self):
+		while not self._stop_prefetch.is_set():
+			self.prefetch()
+			self._stop_prefetch.wait(self.prefetch_interval)
+
+	def prefetch(self, dates: List[datetime.date] = None):
+		"""Parses the menus of the given dates (default: today until the end of next week) which
+		are not cached or will expire before the next prefetch.
+
+		Args:
+			dates: The dates to prefetch.
+		"""
+
+		if dates is None:
+			today = datetime.date.today()
+			days = 7 - today.weekday() + 7
+			dates = [today + datetime.timedelta(days=day) for day in range(days)]
+		for date in dates:
+			if self._stop_prefetch.is_set():
+				return
+			if self._cached(date, max_age=self.ttl - self.prefetch_interval) is not None:
+				continue
+			try:
+				self._parse(datetime.datetime.combine(date, datetime.time()))
+			except Exception as e:
+				logger.warning(f"Could not prefetch the mensa menu of {date}: {e}")
 
 	def _parse(self, date: datetime.datetime) -> List[Meal]:
 		"""
@@ -191,6 +312,9 @@ class MensaParser():
         Returns:
             :obj:`list` of Meal: List of parsed meals
 
+        Raises:
+            requests.RequestException: If the request fails; nothing is cached then.
+
         """
 
 		date_str = date.strftime('%Y-%m-%d')
@@ -206,15 +330,20 @@ class MensaParser():
 		'startNextWeek': date_next_week_str
 		}
 
-		# issue post request
-		response = requests.post('https://sws2.maxmanager.xyz/inc/ajax-php_konnektor.inc.php',\
-			headers={}, cookies={}, data=data)
+		# issue post request (reusing the connection of previous requests)
+		response = self._session.post(self.url, headers={}, cookies={}, data=data,\
+			timeout=REQUEST_TIMEOUT)
+		# an error page would parse to no meals, which must not be cached
+		response.raise_for_status()
 		tree = html.fromstring(response.content.decode(response.encoding))
 		meals = [self._parse_meal(meal, date.strftime('%A')) for meal in\
 			tree.xpath('//div[contains(@class, "splMeal")]')]
 
-		if self.storage:
-			self.storage[date] = meals
+		if self.cache:
+			with self._lock:
+				self.storage[date.date()] = (time.time(), meals)
+			if self.cache_file:
+				self._save_cache()
 
 		return meals
 
@@ -307,9 +436,8 @@ class MensaParser():
 		"""
 
 		date = self._parse_date(date)
-		if use_cache and date.date() in self.storage:
-			# NOTE data could be deprecated
-			return self.storage[date.date()]
-		else:
+		meals = self._cached(date.date()) if use_cache else None
+		if meals is None:
 			# issue request to server
-			return self._parse(date)
+			meals = self._parse(date)
+		return meals
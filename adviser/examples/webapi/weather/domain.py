@@ -17,28 +17,72 @@
 #
 ###############################################################################
 
-from typing import List, Iterable
-import json
-from urllib.request import urlopen
+from typing import Dict, List, Iterable
+import threading
+from concurrent.futures import Future
 from datetime import datetime
 
+import requests
+
+from utils.cache import LRUCache
 from utils.domain.lookupdomain import LookupDomain
 
 API_KEY = ''
+FORECAST_URL = 'http://api.openweathermap.org/data/2.5/forecast'
+# seconds between two forecasts of the API; lookups are cached per location and interval
+FORECAST_INTERVAL = 3 * 60 * 60
+# seconds to wait for the API to connect and to respond
+REQUEST_TIMEOUT = (3.05, 10)
 
 
 class WeatherDomain(LookupDomain):
     """Domain for the Weather API.
 
+    A response of the API contains the forecasts of the next days for a location, one per
+    `FORECAST_INTERVAL`; they are cached per (location, interval) for `cache_ttl` seconds.
+    Requests reuse the connection to the API, and concurrent lookups of the same location
+    wait for a single request.
+
     Attributes:
         last_results (List[dict]): Current results which the user might request info about
     """
 
-    def __init__(self):
+    def __init__(self, base_url: str = FORECAST_URL, api_key: str = None,
+                 cache_ttl: float = 1800, cache_size: int = 4096):
+        """
+        Args:
+            base_url (str): URL of the forecast endpoint (e.g. a local stand-in for tests)
+            api_key (str): key of the API (default: API_KEY)
+            cache_ttl (float): seconds a forecast is returned from the cache
+            cache_size (int): maximum number of cached forecasts
+        """
         LookupDomain.__init__(self, 'WeatherAPI', 'Weather')
+        self.base_url = base_url
+        self.api_key = api_key
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._init_connections()
 
         self.last_results = []
 
+    def _init_connections(self):
+        """ Creates the HTTP session and the forecast cache """
+        self.session = requests.Session()
+        self._forecasts = LRUCache(max_size=self.cache_size, ttl=self.cache_ttl)
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # sessions and locks cannot be pickled; they are created anew on unpickling
+        state = self.__dict__.copy()
+        for attribute in ('session', '_forecasts', '_pending', '_lock'):
+            state.pop(attribute, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_connections()
+
     def find_entities(self, constraints: dict, requested_slots: Iterable = iter(())):
         """ Returns all entities from the data backend that meet the constraints.
 
@@ -121,19 +165,52 @@ class WeatherDomain(LookupDomain):
         return 'artificial_id'
 
     def _query(self, location, date):
-        """if location is None:
-            location = 'Stuttgart'
-        if date is None:
-            date = datetime.now()"""
-
-        url = f'http://api.openweathermap.org/data/2.5/forecast?q={location}&APPID={API_KEY}'
+        """ Returns the forecast for the location closest to the date (None if there is none),
+            from the cache if possible """
+        location_key = ' '.join(str(location).lower().split())
+        key = (location_key, round(date.timestamp() / FORECAST_INTERVAL))
+        forecast = self._forecasts.get(key)
+        if forecast is None:
+            # e.g. dates before the first or after the last forecast
+            forecasts = self._forecasts.get((location_key, None))
+            if forecasts is None:
+                forecasts = self._download(location, location_key)
+            forecast = self._find_closest(forecasts, date)
+            if forecast is not None:
+                self._forecasts.put(key, forecast)
+        return forecast
+
+    def _download(self, location, location_key: str) -> List[dict]:
+        """ Requests the forecasts for a location and caches each of them for its interval, and
+            all of them for the location
+
+        If the location is already being requested by another thread, waits for that
+        request instead of sending another one.
+        """
+        with self._lock:
+            future = self._pending.get(location_key)
+            downloading = future is None
+            if downloading:
+                future = self._pending[location_key] = Future()
+        if not downloading:
+            return future.result()
         try:
-            f = urlopen(url)
-            forecasts = json.loads(f.read())['list']
-            return self._find_closest(forecasts, date)
+            response = self.session.get(self.base_url, timeout=REQUEST_TIMEOUT, params={
+                'q': location, 'APPID': self.api_key if self.api_key is not None else API_KEY})
+            response.raise_for_status()
+            forecasts = response.json()['list']
+            self._forecasts.put((location_key, None), forecasts)
+            for forecast in forecasts:
+                self._forecasts.put(
+                    (location_key, round(int(forecast['dt']) / FORECAST_INTERVAL)), forecast)
+            future.set_result(forecasts)
+            return forecasts
         except BaseException as e:
-            raise(e)
-            return None
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._pending[location_key]
 
     def _find_closest(self, forecasts, preferred_time):
         """ From a list of forecasts, find the one which is closest to the specified time"""
@@ -147,7 +224,7 @@ class WeatherDomain(LookupDomain):
                 closest_difference = time_difference
             else:
                 return closest_forecast
-        return None
+        return closest_forecast
 
     def get_keyword(self):
         return 'weather'
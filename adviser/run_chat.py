@@ -102,7 +102,7 @@ def load_weather_domain():
 def load_mensa_domain(backchannel: bool = False):
     from examples.webapi.mensa import MensaDomain, MensaNLU
     from services.policy.policy_api import HandcraftedPolicy as PolicyAPI
-    mensa = MensaDomain()
+    mensa = MensaDomain(prefetch=True)
     mensa_nlu = MensaNLU(domain=mensa)
     mensa_bst = HandcraftedBST(domain=mensa)
     mensa_policy = PolicyAPI(domain=mensa)
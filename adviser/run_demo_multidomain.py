@@ -54,7 +54,7 @@ from utils.userstate import EmotionType
 # load domains
 lecturers = JSONLookupDomain(name='ImsLecturers', display_name="Lecturers")
 weather = WeatherDomain()
-mensa = MensaDomain()
+mensa = MensaDomain(prefetch=True)
 
 # only debug logging
 conversation_log_dir = "./conversation_logs"
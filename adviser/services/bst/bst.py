@@ -17,11 +17,12 @@
 #
 ###############################################################################
 
-from typing import List, Set
+from typing import List, Set, Union
 
 from services.service import PublishSubscribe
 from services.service import Service
-from utils.beliefstate import BeliefState
+from utils.beliefstate import BeliefState, BeliefStateDelta
+from utils.domain.domain import Domain
 from utils.useract import UserActionType, UserAct
 
 
@@ -30,14 +31,37 @@ class HandcraftedBST(Service):
     A rule-based approach to belief state tracking.
     """
 
-    def __init__(self, domain=None, logger=None):
+    def __init__(self, domain=None, logger=None, history_size: int = None,
+                 publish_deltas: bool = False, snapshot_interval: int = 10,
+                 compact_beliefstate: bool = False):
+        """
+        Args:
+            domain (JSONLookupDomain): the domain of the dialog
+            logger (DiasysLogger): logger
+            history_size (int): number of turns the belief state keeps in its history
+                                (None: all turns of the dialog)
+            publish_deltas (bool): if True, only the changes of each turn are published as
+                                   BeliefStateDelta; subscribers reconstruct the belief state
+                                   with a BeliefStateReceiver
+            snapshot_interval (int): when publishing deltas, the complete belief state is
+                                     published every `snapshot_interval` turns (and on the
+                                     first turn of each dialog)
+            compact_beliefstate (bool): if True, the informs and requests of the belief state
+                                        are stored in NumPy arrays (see BeliefState)
+        """
         Service.__init__(self, domain=domain)
         self.logger = logger
-        self.bs = BeliefState(domain)
+        self.history_size = history_size
+        self.publish_deltas = publish_deltas
+        self.snapshot_interval = snapshot_interval
+        self.compact_beliefstate = compact_beliefstate
+        # set when a subscriber could not apply a delta, see request_snapshot
+        self.snapshot_requested = False
+        self.bs = BeliefState(domain, history_size=history_size, compact=compact_beliefstate)
 
     @PublishSubscribe(sub_topics=["user_acts"], pub_topics=["beliefstate"])
     def update_bst(self, user_acts: List[UserAct] = None) \
-            -> dict(beliefstate=BeliefState):
+            -> dict(beliefstate=Union[BeliefState, BeliefStateDelta]):
         """
             Updates the current dialog belief state (which tracks the system's
             knowledge about what has been said in the dialog) based on the user actions generated
@@ -48,9 +72,10 @@ class HandcraftedBST(Service):
 
             Returns:
                 (dict): a dictionary with the key "beliefstate" and the value the updated
-                        BeliefState object
+                        BeliefState object (or its BeliefStateDelta, if publishing deltas)
 
         """
+        self._commit_reload()
         # save last turn to memory
         self.bs.start_new_turn()
         if user_acts:
@@ -64,8 +89,25 @@ class HandcraftedBST(Service):
             self.bs["num_matches"] = num_entries
             self.bs["discriminable"] = discriminable
 
+        if self.publish_deltas:
+            # the first published turn of a dialog is number 2
+            snapshot = self.snapshot_requested or self.bs.num_turns == 2 or \
+                (self.snapshot_interval and self.bs.num_turns % self.snapshot_interval == 0)
+            self.snapshot_requested = False
+            return {'beliefstate': self.bs.make_delta(snapshot=snapshot)}
         return {'beliefstate': self.bs}
 
+    @PublishSubscribe(sub_topics=["snapshot_request"])
+    def request_snapshot(self, snapshot_request: bool = None):
+        """
+            Publishes the complete belief state with the next turn (when publishing deltas),
+            called by subscribers which received a delta without knowing the previous turn
+
+            Args:
+                snapshot_request (bool): the request published by the subscriber
+        """
+        self.snapshot_requested = True
+
     def dialog_start(self):
         """
             Restets the belief state so it is ready for a new dialog
@@ -75,7 +117,15 @@ class HandcraftedBST(Service):
                         the value is a new BeliefState object
         """
         # initialize belief state
-        self.bs = BeliefState(self.domain)
+        self.bs = BeliefState(self.domain, history_size=self.history_size,
+                              compact=self.compact_beliefstate)
+        self._commit_reload()
+
+    def _commit_reload(self):
+        """ Puts a database reloaded in the background into use between turns, so that the
+            services answering a turn all see the same data (see JSONLookupDomain.reload) """
+        if isinstance(self.domain, Domain):
+            self.domain.commit_reload()
 
     def _reset_informs(self, acts: List[UserAct]):
         """
@@ -78,11 +78,9 @@ class GlobalMemory(Memory):
         self.domain = domain
     
     def get_member(self, primary_key_value: str, attribute_name: str) -> str:
-        primary_key_name = self.domain.get_primary_key()
-        table_name = self.domain.get_domain_name()
-        query_result = self.domain.query_db(
-            f'SELECT {attribute_name} FROM {table_name} '
-            f'WHERE {primary_key_name} = \'{primary_key_value}\'')
+        # the domain caches the results of repeated lookups
+        query_result = self.domain.find_info_about_entity(primary_key_value,
+                                                          {attribute_name: None})
         if not query_result:
             raise ValueError(f"Couldn't find an entry for primary key {primary_key_value}.")
         return query_result[0][attribute_name]
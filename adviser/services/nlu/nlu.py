@@ -17,15 +17,18 @@
 #
 ###############################################################################
 
-import json
+import copy
 import os
-import re
 from typing import List
 
+from services.nlu.regex_guard import RegexGuard
+from services.nlu.rulesets import load_rule_set
+from services.nlu.slotmatcher import load_slot_matcher
 from services.service import PublishSubscribe
 from services.service import Service
 from utils import UserAct, UserActionType
 from utils.beliefstate import BeliefState
+from utils.cache import LRUCache
 from utils.common import Language
 from utils.domain.jsonlookupdomain import JSONLookupDomain
 from utils.logger import DiasysLogger
@@ -66,7 +69,9 @@ class HandcraftedNLU(Service):
     """
 
     def __init__(self, domain: JSONLookupDomain, logger: DiasysLogger = DiasysLogger(),
-                 language: Language = None):
+                 language: Language = None, profile_regexes: bool = False,
+                 regex_time_budget: float = None, languages: List[Language] = None,
+                 cache_size: int = 1024, cache_ttl: float = None, inform_matcher: str = 'regex'):
         """
         Loads
             - domain key
@@ -79,9 +84,30 @@ class HandcraftedNLU(Service):
 
         Args:
             domain {domain.jsonlookupdomain.JSONLookupDomain} -- Domain
+            language {Language} -- language of the first turn (default: English)
+            languages {List[Language]} -- all languages the NLU has to understand; their
+                                          rules are shared by all NLU instances of the process
+            profile_regexes {bool} -- record the match time of every rule (see `regex_report`)
+            regex_time_budget {float} -- maximum time in seconds a suspicious rule may take
+                                         before it is interrupted and flagged (None: no limit)
+            cache_size {int} -- number of utterances whose user acts are memoized
+                                (0 disables the cache; always disabled when profiling)
+            cache_ttl {float} -- time in seconds after which memoized user acts expire
+                                 (None: never)
+            inform_matcher {str} -- 'regex' to detect informs with the inform rules of the domain,
+                                    'index' to look up all slot values (and binary slot names)
+                                    in a single scan, see `slotmatcher.SlotValueMatcher`
         """
         Service.__init__(self, domain=domain)
         self.logger = logger
+        self.regex_guard = RegexGuard(time_budget=regex_time_budget, profile=profile_regexes,
+                                      logger=logger)
+        # the user acts only depend on the utterance, the language and the last system act,
+        # so recurring utterances ("yes", "thanks", ...) can skip the regex evaluation
+        self.cache = LRUCache(max_size=0 if profile_regexes else cache_size, ttl=cache_ttl)
+        if inform_matcher not in ('regex', 'index'):
+            raise ValueError("Unknown inform matcher '%s'" % inform_matcher)
+        self.slot_matcher = load_slot_matcher(domain) if inform_matcher == 'index' else None
 
         self.language = language if language else Language.ENGLISH
 
@@ -101,7 +127,12 @@ class HandcraftedNLU(Service):
         self.sys_act_info = {
             'last_act': None, 'lastInformedPrimKeyVal': None, 'lastRequestSlot': None}
 
-        self.language = Language.ENGLISH
+        # rule sets of all configured languages are loaded up front, so switching the
+        # language between turns does not require reading or compiling any regexes
+        self.languages = list(languages) if languages else [self.language]
+        if self.language not in self.languages:
+            self.languages.append(self.language)
+        self.rule_sets = {}
         self._initialize()
 
     @PublishSubscribe(sub_topics=["user_utterance"], pub_topics=["user_acts"])
@@ -131,6 +162,18 @@ class HandcraftedNLU(Service):
         self.slots_requested, self.slots_informed = set(), set()
         if user_utterance is not None:
             user_utterance = user_utterance.strip()
+
+        cache_key = self._cache_key(user_utterance)
+        cached = self.cache.get(cache_key) if cache_key is not None else None
+        if cached is not None:
+            user_acts, slots_requested, slots_informed, self.req_everything = cached
+            self.user_acts = [copy.copy(user_act) for user_act in user_acts]
+            self.slots_requested, self.slots_informed = set(slots_requested), set(slots_informed)
+            self.logger.dialog_turn("User Actions: %s" % str(self.user_acts))
+            result['user_acts'] = self.user_acts
+            return result
+
+        if user_utterance is not None:
             self._match_general_act(user_utterance)
             self._match_domain_specific_act(user_utterance)
 
@@ -147,11 +190,62 @@ class HandcraftedNLU(Service):
                 self.user_acts.append(UserAct(text=user_utterance if user_utterance else "",
                                               act_type=UserActionType.Bad))
         self._assign_scores()
+        if cache_key is not None:
+            self.cache.put(cache_key, ([copy.copy(user_act) for user_act in self.user_acts],
+                                       frozenset(self.slots_requested),
+                                       frozenset(self.slots_informed), self.req_everything))
         self.logger.dialog_turn("User Actions: %s" % str(self.user_acts))
         result['user_acts'] = self.user_acts
 
         return result
 
+    def _cache_key(self, user_utterance: str):
+        """
+        Builds the key under which the user acts for an utterance are memoized.
+
+        Args:
+            user_utterance {str} --  stripped text input from user
+
+        Returns:
+            a hashable key, or None if the result must not be cached
+        """
+        if user_utterance is None or self.cache.max_size <= 0:
+            return None
+        last_act = self.sys_act_info['last_act']
+        if last_act is None:
+            last_act_key = None
+        else:
+            # the values of the last system act end up in affirm/deny acts after a confirm
+            last_act_key = (last_act.type, tuple(sorted(
+                (slot, str(values)) for slot, values in last_act.slot_values.items())))
+        return self.language, user_utterance, last_act_key
+
+    @PublishSubscribe(sub_topics=["language"])
+    def set_language(self, language: Language = None):
+        """
+        Selects the rules used for the following user utterances.
+
+        Args:
+            language (Language): one of the languages the NLU was configured with
+        """
+        if language not in self.rule_sets:
+            self.logger.error("NLU was not configured for language %s" % str(language))
+            return
+        self.language = language
+        self.rule_set = self.rule_sets[language]
+
+    @property
+    def general_regex(self) -> dict:
+        return self.rule_set.general_regex
+
+    @property
+    def request_regex(self) -> dict:
+        return self.rule_set.request_regex
+
+    @property
+    def inform_regex(self) -> dict:
+        return self.rule_set.inform_regex
+
     @PublishSubscribe(sub_topics=["sys_state"])
     def _update_sys_act_info(self, sys_state):
         if "lastInformedPrimKeyVal" in sys_state:
@@ -172,10 +266,11 @@ class HandcraftedNLU(Service):
 
         """
 
+        general_regex = self.rule_set.general_compiled
         # Iteration over all general acts
-        for act in self.general_regex:
+        for act in general_regex:
             # Check if the regular expression and the user utterance match
-            if re.search(self.general_regex[act], user_utterance, re.I):
+            if self.regex_guard.search(('general', act), general_regex[act], user_utterance):
                 # Mapping the act to User Act
                 if act != 'dontcare' and act != 'req_everything':
                     user_act_type = UserActionType(act)
@@ -264,9 +359,11 @@ class HandcraftedNLU(Service):
         Returns:
 
         """
+        request_regex = self.rule_set.request_compiled
         # Iteration over all user requestable slots
         for slot in self.USER_REQUESTABLE:
-            if self._check(re.search(self.request_regex[slot], user_utterance, re.I)):
+            if self._check(self.regex_guard.search(('request', slot), request_regex[slot],
+                                                   user_utterance)):
                 self._add_request(user_utterance, slot)
 
     def _add_request(self, user_utterance: str, slot: str):
@@ -288,6 +385,7 @@ class HandcraftedNLU(Service):
     def _match_inform(self, user_utterance: str):
         """
         Iterates over all user inform slot-value regexes and find matches with the user utterance
+        (or looks the slot values up in the index, if the NLU uses the index matcher)
 
         Args:
             user_utterance {str} --  text input from user
@@ -296,20 +394,48 @@ class HandcraftedNLU(Service):
 
         """
 
+        if self.slot_matcher is not None:
+            for slot, value, negated in self.slot_matcher.find_mentions(user_utterance):
+                if negated and slot not in self.slot_matcher.binary_slots:
+                    user_act = UserAct(text=user_utterance, act_type=UserActionType.NegativeInform,
+                                       slot=slot, value=value)
+                    self.user_acts.append(user_act)
+                else:
+                    self._add_matched_inform(user_utterance, slot, value)
+            return
+
+        inform_regex = self.rule_set.inform_compiled
         # Iteration over all user informable slots and their slots
         for slot in self.USER_INFORMABLE:
-            for value in self.inform_regex[slot]:
-                if self._check(re.search(self.inform_regex[slot][value], user_utterance, re.I)):
-                    if slot == self.domain_key and self.req_everything:
-                        # Adding all requestable slots because of the req_everything
-                        for req_slot in self.USER_REQUESTABLE:
-                            # skipping the domain key slot
-                            if req_slot != self.domain_key:
-                                # Adding user request act
-                                self._add_request(user_utterance, req_slot)
-                    # Adding user inform act
-                    self._add_inform(user_utterance, slot, value)
-        
+            for value in inform_regex[slot]:
+                if self._check(self.regex_guard.search(('inform', slot, value),
+                                                       inform_regex[slot][value],
+                                                       user_utterance)):
+                    self._add_matched_inform(user_utterance, slot, value)
+
+    def _add_matched_inform(self, user_utterance: str, slot: str, value: str):
+        """
+        Adds the user inform act for a matched slot value, and the requests for all slots
+        if the user asked for everything about the informed entity
+
+        Args:
+            user_utterance {str} --  text input from user
+            slot {str} -- informed slot
+            value {str} -- value for the informed slot
+
+        Returns:
+
+        """
+        if slot == self.domain_key and self.req_everything:
+            # Adding all requestable slots because of the req_everything
+            for req_slot in self.USER_REQUESTABLE:
+                # skipping the domain key slot
+                if req_slot != self.domain_key:
+                    # Adding user request act
+                    self._add_request(user_utterance, req_slot)
+        # Adding user inform act
+        self._add_inform(user_utterance, slot, value)
+
     def _add_inform(self, user_utterance: str, slot: str, value: str):
         """
         Creates the user request act and adds it to the user act list
@@ -441,28 +567,31 @@ class HandcraftedNLU(Service):
 
     def _initialize(self):
         """
-            Loads the correct regex files based on which language has been selected
-            this should only be called on the first turn of the dialog
-
-            Args:
-                language (Language): Enum representing the language the user has selected
+            Loads the (shared) rule sets of all configured languages and selects the rules of
+            the current language
         """
-        if self.language == Language.ENGLISH:
-            # Loading regular expression from JSON files
-            # as dictionaries {act:regex, ...} or {slot:{value:regex, ...}, ...}
-            self.general_regex = json.load(open(self.base_folder + '/GeneralRules.json'))
-            self.request_regex = json.load(open(self.base_folder + '/' + self.domain_name
-                                                + 'RequestRules.json'))
-            self.inform_regex = json.load(open(self.base_folder + '/' + self.domain_name
-                                               + 'InformRules.json'))
-        elif self.language == Language.GERMAN:
-            # TODO: Change this once
+        for language in self.languages:
             # Loading regular expression from JSON files
             # as dictionaries {act:regex, ...} or {slot:{value:regex, ...}, ...}
-            self.general_regex = json.load(open(self.base_folder + '/GeneralRulesGerman.json'))
-            self.request_regex = json.load(open(self.base_folder + '/' + self.domain_name
-                                                + 'GermanRequestRules.json'))
-            self.inform_regex = json.load(open(self.base_folder + '/' + self.domain_name
-                                               + 'GermanInformRules.json'))
-        else:
-            print('No language')
+            self.rule_sets[language] = load_rule_set(self.domain_name, language)
+        self.rule_set = self.rule_sets[self.language]
+        self._register_regexes()
+
+    def _register_regexes(self):
+        """ Lets the regex guard inspect all loaded rules for expensive constructs """
+        for rule_set in self.rule_sets.values():
+            for act, pattern in rule_set.general_regex.items():
+                self.regex_guard.register(('general', act), pattern)
+            for slot, pattern in rule_set.request_regex.items():
+                self.regex_guard.register(('request', slot), pattern)
+            for slot, values in rule_set.inform_regex.items():
+                for value, pattern in values.items():
+                    self.regex_guard.register(('inform', slot, value), pattern)
+
+    def regex_report(self, top_n: int = 10) -> str:
+        """ Returns a table of the most expensive rules (requires `profile_regexes=True`)
+
+        Args:
+            top_n (int): number of rules to list
+        """
+        return self.regex_guard.report(top_n)
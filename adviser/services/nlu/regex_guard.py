@@ -0,0 +1,208 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+""" This module provides profiling and time budgets for the NLU regular expressions. """
+
+import re
+import time
+from typing import Dict, List, Pattern, Tuple, Union
+
+from utils.logger import DiasysLogger
+
+try:
+    # the regex module supports interrupting a search after a timeout, re does not
+    import regex
+except ImportError:
+    regex = None
+
+
+# rules are identified by their type and keys, e.g. ('inform', 'name', 'Batman')
+RuleId = Tuple[str, ...]
+
+# a quantified group that is quantified again, e.g. (a+)+ or ((ab)*)*
+_NESTED_QUANTIFIER = re.compile(r'[*+}]\)+[*+{]')
+# a lookaround that contains an unbounded wildcard, e.g. (?=.*foo) or (?!.*bar)
+_WILDCARD_LOOKAROUND = re.compile(r'\(\?<?[=!][^)]*\.[*+]')
+
+
+def _search(pattern: Union[str, Pattern], text: str, flags: int):
+    if isinstance(pattern, Pattern):
+        return pattern.search(text)
+    return re.search(pattern, text, flags)
+
+
+def is_suspicious(pattern: str) -> bool:
+    """ Checks whether a regular expression contains constructs that are known to be prone
+        to catastrophic backtracking.
+
+    Args:
+        pattern (str): the regular expression
+
+    Returns:
+        True if the pattern contains nested quantifiers or lookarounds with wildcards
+    """
+    return bool(_NESTED_QUANTIFIER.search(pattern) or _WILDCARD_LOOKAROUND.search(pattern))
+
+
+class RuleStats:
+    """ Accumulated match times (in seconds) of a single rule. """
+
+    __slots__ = "calls", "total", "max"
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, duration: float):
+        self.calls += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.calls if self.calls else 0.0
+
+
+class RegexGuard:
+    """
+    Wraps the regular expression searches of the NLU.
+
+    In profiling mode, the time spent on every rule is recorded, so the most expensive rules
+    can be reported after running a corpus through the NLU.
+
+    If a time budget is set, suspicious rules (see `is_suspicious`) and rules which already
+    exceeded the budget once are evaluated with a timeout. A rule whose search is interrupted
+    is flagged and treated as not matching, so a single bad rule cannot stall the NLU.
+    Guarding requires the `regex` package; without it, rules are only flagged after the fact.
+    """
+
+    def __init__(self, time_budget: float = None, profile: bool = False,
+                 logger: DiasysLogger = None):
+        """
+        Args:
+            time_budget (float): maximum time in seconds a single rule may take (None: no limit)
+            profile (bool): if True, match times are recorded for every rule
+            logger (DiasysLogger): logger used to report rules exceeding the time budget
+        """
+        self.time_budget = time_budget
+        self.profile = profile
+        self.logger = logger
+        self.stats: Dict[RuleId, RuleStats] = {}
+        self.guarded_rules = set()
+        self.flagged_rules = set()
+
+    @property
+    def active(self) -> bool:
+        """ Whether searches have to go through the guard at all """
+        return self.profile or self.time_budget is not None
+
+    def register(self, rule_id: RuleId, pattern: str):
+        """ Marks a rule for guarded evaluation if its pattern looks suspicious.
+
+        Args:
+            rule_id (RuleId): unique name of the rule, e.g. ('general', 'thanks')
+            pattern (str): the regular expression of the rule
+        """
+        if self.time_budget is not None and is_suspicious(pattern):
+            self.guarded_rules.add(rule_id)
+
+    def search(self, rule_id: RuleId, pattern: Union[str, Pattern], text: str, flags: int = re.I):
+        """ Searches the text for the pattern, respecting profiling and time budget settings.
+
+        Args:
+            rule_id (RuleId): unique name of the rule, e.g. ('inform', 'name', 'Batman')
+            pattern (Union[str, Pattern]): the regular expression of the rule, either as string
+                                           or compiled (flags are then taken from the pattern)
+            text (str): the user utterance
+            flags (int): flags passed to the search of a string pattern
+
+        Returns:
+            the match object, or None if there was no match or the time budget was exceeded
+        """
+        if not self.active:
+            return _search(pattern, text, flags)
+
+        start = time.perf_counter()
+        if rule_id in self.guarded_rules and regex is not None:
+            if isinstance(pattern, Pattern):
+                pattern, flags = pattern.pattern, pattern.flags
+            try:
+                match = regex.search(pattern, text, flags | regex.V0, timeout=self.time_budget)
+            except TimeoutError:
+                match = None
+                self._flag(rule_id, text)
+            except regex.error:
+                # pattern uses re-only syntax, no guard possible
+                self.guarded_rules.discard(rule_id)
+                match = re.search(pattern, text, flags)
+        else:
+            match = _search(pattern, text, flags)
+        duration = time.perf_counter() - start
+
+        if self.profile:
+            if rule_id not in self.stats:
+                self.stats[rule_id] = RuleStats()
+            self.stats[rule_id].add(duration)
+        if self.time_budget is not None and duration > self.time_budget \
+                and rule_id not in self.guarded_rules:
+            # too late to interrupt this search, but guard every future one
+            self.guarded_rules.add(rule_id)
+            self._flag(rule_id, text)
+        return match
+
+    def _flag(self, rule_id: RuleId, text: str):
+        self.flagged_rules.add(rule_id)
+        if self.logger:
+            self.logger.warning("NLU rule '%s' exceeded the time budget of %fs for input '%s'"
+                                % ("/".join(rule_id), self.time_budget, text))
+
+    def worst_rules(self, top_n: int = 10, key: str = "max") -> List[Tuple[RuleId, RuleStats]]:
+        """ Returns the most expensive rules recorded in profiling mode.
+
+        Args:
+            top_n (int): number of rules to return
+            key (str): sort criterion, one of 'max', 'mean' or 'total'
+
+        Returns:
+            list of (rule id, RuleStats) tuples, most expensive first
+        """
+        return sorted(self.stats.items(), key=lambda item: getattr(item[1], key),
+                      reverse=True)[:top_n]
+
+    def report(self, top_n: int = 10, key: str = "max") -> str:
+        """ Returns a human readable table of the most expensive rules.
+
+        Args:
+            top_n (int): number of rules to list
+            key (str): sort criterion, one of 'max', 'mean' or 'total'
+        """
+        lines = ["{:<50} {:>8} {:>12} {:>12} {:>12}".format(
+            "rule", "calls", "total (ms)", "mean (us)", "max (us)")]
+        for rule_id, stats in self.worst_rules(top_n, key):
+            lines.append("{:<50} {:>8} {:>12.3f} {:>12.1f} {:>12.1f}{}".format(
+                "/".join(rule_id), stats.calls, stats.total * 1e3, stats.mean * 1e6,
+                stats.max * 1e6,
+                " (flagged)" if rule_id in self.flagged_rules else ""))
+        return "\n".join(lines)
+
+    def reset(self):
+        """ Forgets all recorded match times """
+        self.stats = {}
@@ -0,0 +1,102 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+""" This module loads and caches the regular expressions used by the handcrafted NLU. """
+
+import json
+import os
+import re
+import threading
+from typing import Dict, Tuple
+
+from utils.common import Language
+
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# file name patterns (general rules, request rules, inform rules) per language
+_RULE_FILES = {
+    Language.ENGLISH: ('GeneralRules.json', '{}RequestRules.json', '{}InformRules.json'),
+    Language.GERMAN: ('GeneralRulesGerman.json', '{}GermanRequestRules.json',
+                      '{}GermanInformRules.json'),
+}
+
+# rule sets shared by all NLU instances of this process, indexed by (domain name, language)
+_rule_sets: Dict[Tuple[str, Language], 'RuleSet'] = {}
+_rule_sets_lock = threading.Lock()
+
+
+class RuleSet:
+    """
+    The regular expressions of one domain in one language.
+
+    The rules are kept both as read from the JSON files ({act: regex, ...},
+    {slot: regex, ...} and {slot: {value: regex, ...}, ...}) and as compiled patterns
+    with the same structure, so matching does not depend on the size of the `re` cache.
+    """
+
+    def __init__(self, general_regex: dict, request_regex: dict, inform_regex: dict):
+        self.general_regex = general_regex
+        self.request_regex = request_regex
+        self.inform_regex = inform_regex
+
+        self.general_compiled = {act: re.compile(pattern, re.I)
+                                 for act, pattern in general_regex.items()}
+        self.request_compiled = {slot: re.compile(pattern, re.I)
+                                 for slot, pattern in request_regex.items()}
+        self.inform_compiled = {slot: {value: re.compile(pattern, re.I)
+                                       for value, pattern in values.items()}
+                                for slot, values in inform_regex.items()}
+
+    @classmethod
+    def from_files(cls, domain_name: str, language: Language, base_folder: str = None):
+        """ Reads the general and domain specific rules of a language from their JSON files
+
+        Args:
+            domain_name (str): name of the domain, used as prefix of the rule files
+            language (Language): language of the rules
+            base_folder (str): folder containing the rule files
+                               (default: resources/nlu_regexes)
+        """
+        if language not in _RULE_FILES:
+            raise ValueError("No NLU rules available for language {}".format(language))
+        base_folder = base_folder or os.path.join(get_root_dir(), 'resources', 'nlu_regexes')
+        general_file, request_file, inform_file = _RULE_FILES[language]
+        rules = []
+        for file_name in (general_file, request_file.format(domain_name),
+                          inform_file.format(domain_name)):
+            with open(os.path.join(base_folder, file_name), encoding='utf-8') as rule_file:
+                rules.append(json.load(rule_file))
+        return cls(*rules)
+
+
+def load_rule_set(domain_name: str, language: Language) -> RuleSet:
+    """ Returns the rule set of a domain and language, reading and compiling it only on first use
+
+    Args:
+        domain_name (str): name of the domain
+        language (Language): language of the rules
+    """
+    key = (domain_name, language)
+    with _rule_sets_lock:
+        if key not in _rule_sets:
+            _rule_sets[key] = RuleSet.from_files(domain_name, language)
+        return _rule_sets[key]
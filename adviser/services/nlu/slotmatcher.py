@@ -0,0 +1,148 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+""" This module provides an index based matcher for slot values mentioned by the user. """
+
+import re
+import threading
+from typing import Dict, List, Tuple
+
+from utils.domain.jsonlookupdomain import JSONLookupDomain
+
+
+_TOKEN = re.compile(r"[a-z0-9à-ÿ]+")
+# words negating the following slot value mention, e.g. "I am not interested in robotics"
+NEGATIONS = frozenset(['not', 'no', 'dont', 'don', 'doesnt', 'never', 'without', 'nothing',
+                       'neither', 'nor', 'nicht', 'kein', 'keine', 'keinen', 'ohne'])
+# words after which a negation no longer applies, e.g. "not robotics but linguistics"
+_CLAUSE_BREAKS = frozenset(['but', 'and', 'however', 'though', 'aber', 'sondern', 'und'])
+# key of the matches stored at the node of a trie where a phrase ends
+_END = None
+
+
+def tokenize(text: str) -> List[str]:
+    """ Splits a text into lowercased word tokens; a plural 's' is removed from longer words so
+        that e.g. "databases" and "database" are treated the same.
+
+    Args:
+        text (str): the text to tokenize
+    """
+    tokens = []
+    for token in _TOKEN.findall(text.lower().replace("'", "")):
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class SlotValueMatcher:
+    """
+    Finds mentions of slot values in a user utterance with a single scan over its tokens.
+
+    All values of the informable slots are stored in a trie over their tokens. For binary slots
+    (possible values 'true' and 'false', e.g. the topics of the campus courses domain), the
+    name of the slot is indexed instead ("machine_learning" -> "machine learning") and the
+    polarity of the mention decides the value. The cost of a scan depends on the length of the
+    utterance and of the longest indexed phrase, not on the number of slots or values.
+    """
+
+    def __init__(self, domain: JSONLookupDomain):
+        """
+        Args:
+            domain (JSONLookupDomain): the domain whose informable slots are indexed
+        """
+        self._trie = {}
+        self.binary_slots = set()
+        for slot in domain.get_informable_slots():
+            values = domain.get_possible_values(slot)
+            if values and set(values) <= {'true', 'false'}:
+                self.binary_slots.add(slot)
+                self._add(slot.replace('_', ' '), slot, None)
+            else:
+                for value in values:
+                    self._add(value, slot, value)
+
+    def _add(self, phrase: str, slot: str, value: str):
+        tokens = tokenize(phrase)
+        if not tokens:
+            return
+        node = self._trie
+        for token in tokens:
+            node = node.setdefault(token, {})
+        node.setdefault(_END, []).append((slot, value))
+
+    def find_mentions(self, user_utterance: str) -> List[Tuple[str, str, bool]]:
+        """ Returns all slot values mentioned in the utterance.
+
+        Overlapping mentions are resolved in favour of the longest phrase, so
+        "machine learning" is not additionally recognized as "learning".
+
+        Args:
+            user_utterance (str): text input from user
+
+        Returns:
+            list of (slot, value, negated) tuples in order of their occurrence; for binary
+            slots the value is 'true', or 'false' if the mention is negated
+        """
+        tokens = tokenize(user_utterance)
+        mentions = []
+        negated = False
+        idx = 0
+        while idx < len(tokens):
+            token = tokens[idx]
+            if token in NEGATIONS:
+                negated = True
+            elif token in _CLAUSE_BREAKS:
+                negated = False
+
+            # follow the trie as far as possible, remember the longest complete phrase
+            node = self._trie
+            end, matches = idx, None
+            for pos in range(idx, len(tokens)):
+                node = node.get(tokens[pos])
+                if node is None:
+                    break
+                if _END in node:
+                    end, matches = pos + 1, node[_END]
+            if matches is None:
+                idx += 1
+                continue
+            for slot, value in matches:
+                if slot in self.binary_slots:
+                    mentions.append((slot, 'false' if negated else 'true', negated))
+                else:
+                    mentions.append((slot, value, negated))
+            idx = end
+        return mentions
+
+
+_matchers: Dict[str, SlotValueMatcher] = {}
+_matchers_lock = threading.Lock()
+
+
+def load_slot_matcher(domain: JSONLookupDomain) -> SlotValueMatcher:
+    """ Returns the matcher for a domain, building the index only once per process
+
+    Args:
+        domain (JSONLookupDomain): the domain whose informable slots are indexed
+    """
+    with _matchers_lock:
+        if domain.get_domain_name() not in _matchers:
+            _matchers[domain.get_domain_name()] = SlotValueMatcher(domain)
+        return _matchers[domain.get_domain_name()]
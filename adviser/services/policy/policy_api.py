@@ -23,7 +23,7 @@ from utils.domain.lookupdomain import LookupDomain
 from services.service import PublishSubscribe, Service
 from utils import SysAct, SysActionType
 from utils.logger import DiasysLogger
-from utils.beliefstate import BeliefState
+from utils.beliefstate import BeliefState, BeliefStateReceiver
 from utils.useract import UserActionType
 from collections import defaultdict
 
@@ -53,8 +53,10 @@ class HandcraftedPolicy(Service):
         self.s_index = 0  # the index in current suggestions for the current system reccomendation
         self.domain_key = domain.get_primary_key()
         self.logger = logger
+        self.bs_receiver = BeliefStateReceiver(logger)
 
-    @PublishSubscribe(sub_topics=["beliefstate"], pub_topics=["sys_act", "sys_state"])
+    @PublishSubscribe(sub_topics=["beliefstate"],
+                      pub_topics=["sys_act", "sys_state", "snapshot_request"])
     def choose_sys_act(self, beliefstate: BeliefState = None, sys_act: SysAct = None)\
             -> dict(sys_act=SysAct):
 
@@ -75,6 +77,14 @@ class HandcraftedPolicy(Service):
                         action
 
         """
+        beliefstate = self.bs_receiver.receive(beliefstate)
+        if beliefstate is None:
+            # received a belief state delta without knowing the previous turn: ask the user to
+            # repeat and the BST to publish the complete belief state with the next turn
+            sys_act = SysAct()
+            sys_act.type = SysActionType.Bad
+            return {'sys_act': sys_act, 'sys_state': {'last_act': sys_act},
+                    'snapshot_request': True}
         # variables for general (non-domain specific) actions
         # self.turn = dialog_graph.num_turns
         self.prev_sys_act = sys_act
@@ -18,12 +18,12 @@
 ###############################################################################
 
 from collections import defaultdict
-from typing import List, Dict
+from typing import List, Dict, Union
 
 from services.service import PublishSubscribe
 from services.service import Service
 from utils import SysAct, SysActionType
-from utils.beliefstate import BeliefState
+from utils.beliefstate import BeliefState, BeliefStateReceiver
 from utils.domain.jsonlookupdomain import JSONLookupDomain
 from utils.logger import DiasysLogger
 from utils.useract import UserActionType
@@ -64,6 +64,7 @@ class HandcraftedPolicy(Service):
         self.domain_key = domain.get_primary_key()
         self.logger = logger
         self.max_turns = max_turns
+        self.bs_receiver = BeliefStateReceiver(logger)
 
     def dialog_start(self):
         """
@@ -74,7 +75,8 @@ class HandcraftedPolicy(Service):
         self.current_suggestions = []  # list of current suggestions
         self.s_index = 0  # the index in current suggestions for the current system reccomendation
 
-    @PublishSubscribe(sub_topics=["beliefstate"], pub_topics=["sys_act", "sys_state"])
+    @PublishSubscribe(sub_topics=["beliefstate"],
+                      pub_topics=["sys_act", "sys_state", "snapshot_request"])
     def choose_sys_act(self, beliefstate: BeliefState) \
             -> dict(sys_act=SysAct):
 
@@ -93,6 +95,14 @@ class HandcraftedPolicy(Service):
                         action
 
         """
+        beliefstate = self.bs_receiver.receive(beliefstate)
+        if beliefstate is None:
+            # received a belief state delta without knowing the previous turn: ask the user to
+            # repeat and the BST to publish the complete belief state with the next turn
+            sys_act = SysAct()
+            sys_act.type = SysActionType.Bad
+            return {'sys_act': sys_act, 'sys_state': {'last_act': sys_act},
+                    'snapshot_request': True}
         self.turns += 1
         # do nothing on the first turn --LV
         sys_state = {}
@@ -351,13 +361,11 @@ class HandcraftedPolicy(Service):
         # if there is more than one result
         if len(q_res) > 1 and not beliefstate['requests']:
             constraints, dontcare = self._get_constraints(beliefstate)
-            # Gather all the results for each column
-            temp = {key: [] for key in q_res[0].keys()}
-            # If any column has multiple values, ask for clarification
-            for result in q_res:
-                for key in result.keys():
-                    if key != self.domain_key:
-                        temp[key].append(result[key])
+            # Count the values of each column among the results (q_res was queried with the
+            # same constraints); if any column has multiple values, ask for clarification
+            temp = self.domain.value_histogram(
+                constraints, [slot for slot in self.domain.get_system_requestable_slots()
+                              if slot != self.domain_key])
             next_req = self._gen_next_request(temp, beliefstate)
             if next_req:
                 sys_act.type = SysActionType.Request
@@ -368,7 +376,8 @@ class HandcraftedPolicy(Service):
         sys_act.type = SysActionType.InformByName
         return sys_act
 
-    def _gen_next_request(self, temp: Dict[str, List[str]], belief_state: BeliefState):
+    def _gen_next_request(self, temp: Dict[str, Union[Dict[str, int], List[str]]],
+                          belief_state: BeliefState):
         """
             Calculates which slot to request next based asking for non-binary slotes first and then
             based on which binary slots provide the biggest reduction in the size of db results
@@ -377,8 +386,9 @@ class HandcraftedPolicy(Service):
                   it's relatively simple, but could add up over time
 
             Args:
-                temp (Dict[str, List[str]]: a dictionary with the keys and values for each result
-                                            in the result set
+                temp (Dict[str, Dict[str, int]]): a dictionary with the number of results for each
+                                                  value of each slot (or with the list of values
+                                                  of each slot in the result set)
 
             Returns: (str) representing the slot to ask for next (or empty if none)
         """
@@ -397,7 +407,8 @@ class HandcraftedPolicy(Service):
         # Otherwise look to see if there are differnces in binary slots
         return self._highest_info_gain(bin_slots, temp)
 
-    def _highest_info_gain(self, bin_slots: List[str], temp: Dict[str, List[str]]):
+    def _highest_info_gain(self, bin_slots: List[str],
+                           temp: Dict[str, Union[Dict[str, int], List[str]]]):
         """ Since we don't have lables, we can't properlly calculate entropy, so instead we'll go
             for trying to ask after a feature that splits the results in half as evenly as possible
             (that way we gain most info regardless of which way the user chooses)
@@ -405,17 +416,21 @@ class HandcraftedPolicy(Service):
             Args:
                 bin_slots: a list of strings representing system requestable binary slots which
                            have not yet been specified
-                temp (Dict[str, List[str]]: a dictionary with the keys and values for each result
-                                            in the result set
+                temp (Dict[str, Dict[str, int]]): a dictionary with the number of results for each
+                                                  value of each slot (or with the list of values
+                                                  of each slot in the result set)
 
             Returns: (str) representing the slot to ask for next (or empty if none)
         """
         diffs = {}
         for slot in bin_slots:
             val1, val2 = self.domain.get_possible_values(slot)
-            values_dic = defaultdict(int)
-            for val in temp[slot]:
-                values_dic[val] += 1
+            if isinstance(temp[slot], dict):
+                values_dic = temp[slot]
+            else:
+                values_dic = defaultdict(int)
+                for val in temp[slot]:
+                    values_dic[val] += 1
             if val1 in values_dic and val2 in values_dic:
                 diffs[slot] = abs(values_dic[val1] - values_dic[val2])
             # If all slots have the same value, we don't need to request anything, return none
@@ -32,7 +32,7 @@ from services.policy.rl.experience_buffer import Buffer, NaivePrioritizedBuffer
 from services.service import Service, PublishSubscribe
 from services.simulator.goal import Goal
 from utils import common
-from utils.beliefstate import BeliefState
+from utils.beliefstate import BeliefState, BeliefStateReceiver
 from utils.domain.jsonlookupdomain import JSONLookupDomain
 from utils.logger import DiasysLogger
 from utils.sysact import SysAct, SysActionType
@@ -70,6 +70,7 @@ class DQNPolicy(RLPolicy, Service):
             logger=logger, max_turns=max_turns, device=device)
 
         Service.__init__(self, domain=domain)
+        self.bs_receiver = BeliefStateReceiver(logger)
 
         self.writer = summary_writer
         self.training_frequency = training_frequency
@@ -169,7 +170,8 @@ class DQNPolicy(RLPolicy, Service):
             self.total_train_dialogs += 1
         self.train_batch()
 
-    @PublishSubscribe(sub_topics=["beliefstate"], pub_topics=["sys_act", "sys_state"])
+    @PublishSubscribe(sub_topics=["beliefstate"],
+                      pub_topics=["sys_act", "sys_state", "snapshot_request"])
     def choose_sys_act(self, beliefstate: BeliefState = None) -> dict(sys_act=SysAct):
         """
             Determine the next system act based on the given beliefstate
@@ -184,6 +186,14 @@ class DQNPolicy(RLPolicy, Service):
                         be needed by the NLU to disambiguate challenging utterances.
         """
 
+        beliefstate = self.bs_receiver.receive(beliefstate)
+        if beliefstate is None:
+            # received a belief state delta without knowing the previous turn: ask the user to
+            # repeat and the BST to publish the complete belief state with the next turn
+            sys_act = SysAct()
+            sys_act.type = SysActionType.Bad
+            return {'sys_act': sys_act, 'sys_state': {'last_act': sys_act},
+                    'snapshot_request': True}
         self.num_dialogs = self.cumulative_train_dialogs % self.train_dialogs
         if self.cumulative_train_dialogs == 0 and self.target_model is not None:
             # start with same weights for target and online net when a new epoch begins
@@ -19,12 +19,14 @@
 
 import random
 
+import numpy as np
 import torch
 
 from services.policy.rl.experience_buffer import UniformBuffer
 from services.simulator.goal import Goal
 from services.stats.evaluation import ObjectiveReachedEvaluator
 from utils import common
+from utils.beliefarrays import ArrayInforms, ArrayRequests, load_belief_index
 from utils.beliefstate import BeliefState
 from utils.domain.jsonlookupdomain import JSONLookupDomain
 from utils.logger import DiasysLogger
@@ -97,6 +99,8 @@ class RLPolicy(object):
 
         self.writer = None
 
+        # positions of slots and values in compact belief states
+        self.belief_index = load_belief_index(domain)
         # get state size
         self.state_dim = self.beliefstate_dict_to_vector(
             BeliefState(domain)._init_beliefstate()).size(1)
@@ -144,6 +148,9 @@ class RLPolicy(object):
     def beliefstate_dict_to_vector(self, beliefstate: BeliefState):
         """ Converts the beliefstate dict to a torch tensor
 
+        For compact belief states (see `BeliefState`), the informs and requests are copied
+        from their arrays instead of being looked up slot by slot.
+
         Args:
             beliefstate: dict of belief (with at least beliefs and system keys)
 
@@ -151,17 +158,36 @@ class RLPolicy(object):
             belief tensor with dimension 1 x state_dim
         """
 
-        belief_vec = []
-
         # add user acts
-        belief_vec += [1 if act in beliefstate['user_acts'] else 0 for act in UserActionType]
+        user_act_vec = [1 if act in beliefstate['user_acts'] else 0 for act in UserActionType]
         # handle none actions
-        belief_vec.append(1 if sum(belief_vec) == 0 else 1)
+        user_act_vec.append(1 if sum(user_act_vec) == 0 else 1)
 
+        # append system features
+        sys_vec = [float(self.sys_state['lastActionInformNone']),
+                   float(self.sys_state['offerHappened'])]
+        candidate_count = beliefstate['num_matches']
+        # buckets for match count: 0, 1, 2-4, >4
+        sys_vec.append(float(candidate_count == 0))
+        sys_vec.append(float(candidate_count == 1))
+        sys_vec.append(float(2 <= candidate_count <= 4))
+        sys_vec.append(float(candidate_count > 4))
+        sys_vec.append(float(beliefstate["discriminable"]))
+
+        informs, requests = beliefstate['informs'], beliefstate['requests']
+        if isinstance(informs, ArrayInforms) and isinstance(requests, ArrayRequests) \
+                and len(informs.probs) == self.belief_index.informs_size \
+                and len(requests.flags) == len(self.belief_index.requestable_slots):
+            # compact belief state: informs and requests are already laid out as in the vector
+            belief_vec = np.concatenate((user_act_vec, informs.probs, requests.flags, sys_vec))
+            return torch.from_numpy(belief_vec).to(dtype=torch.float,
+                                                   device=self.device).unsqueeze(0)
+
+        belief_vec = user_act_vec
         # add informs (including special flag if slot not mentioned)
         for slot in sorted(self.domain.get_informable_slots()):
             values = self.domain.get_possible_values(slot) + ["dontcare"]
-            if slot not in beliefstate['informs']:
+            if slot not in informs:
                 # add **NONE** value first, then 0.0 for all others
                 belief_vec.append(1.0)
                 # also add value for don't care
@@ -169,27 +195,17 @@ class RLPolicy(object):
             else:
                 # add **NONE** value first
                 belief_vec.append(0.0)
-                bs_slot = beliefstate['informs'][slot]
+                bs_slot = informs[slot]
                 belief_vec += [bs_slot[value] if value in bs_slot else 0.0 for value in values]
 
         # add requests
         for slot in sorted(self.domain.get_requestable_slots()):
-            if slot in beliefstate['requests']:
+            if slot in requests:
                 belief_vec.append(1.0)
             else:
                 belief_vec.append(0.0)
 
-        # append system features
-        belief_vec.append(float(self.sys_state['lastActionInformNone']))
-        belief_vec.append(float(self.sys_state['offerHappened']))
-        candidate_count = beliefstate['num_matches']
-        # buckets for match count: 0, 1, 2-4, >4
-        belief_vec.append(float(candidate_count == 0))
-        belief_vec.append(float(candidate_count == 1))
-        belief_vec.append(float(2 <= candidate_count <= 4))
-        belief_vec.append(float(candidate_count > 4))
-        belief_vec.append(float(beliefstate["discriminable"]))
-
+        belief_vec += sys_vec
         # convert to torch tensor
         return torch.tensor([belief_vec], dtype=torch.float, device=self.device)
 
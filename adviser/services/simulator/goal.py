@@ -190,8 +190,8 @@ class Goal(object):
                         self.inf_slot_values[constraint], size=1)[0]))
 
             # check if there are enough venues for the current goal
-            num_venues = len(self.domain.find_entities(constraints={
-                constraint.slot: constraint.value for constraint in self.constraints}))
+            num_venues = self.domain.count_entities(constraints={
+                constraint.slot: constraint.value for constraint in self.constraints})
 
             possible_req_slots = sorted(
                 list(set(self.req_slots).difference(constraint_slots)))
@@ -240,8 +240,8 @@ class Goal(object):
         else:
             self.requests = requests
 
-        num_venues = len(self.domain.find_entities(constraints={
-            constraint.slot: constraint.value for constraint in self.constraints}))
+        num_venues = self.domain.count_entities(constraints={
+            constraint.slot: constraint.value for constraint in self.constraints})
         if 'MinVenues' in self.parameters:
             assert num_venues >= self.parameters['MinVenues'], "There are not enough venues for\
                 the given constraints in the database. Either change constraints or lower\
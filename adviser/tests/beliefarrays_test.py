@@ -0,0 +1,67 @@
+import os
+import sys
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.append(get_root_dir())
+from utils.beliefarrays import ArrayInforms, ArrayRequests, BeliefIndex
+
+
+def test_informs_behave_like_dict(domain, constraintA):
+    """
+    Tests whether the array backed informs support the dictionary operations of the BST.
+
+    Args:
+        domain: Domain Object (given in conftest.py)
+        constraintA (dict): an existing slot-value pair in the domain (given in
+        conftest_<domain>.py)
+    """
+    informs = ArrayInforms(BeliefIndex(domain))
+    slot, value = constraintA['slot'], constraintA['value']
+    assert slot not in informs
+    informs[slot] = {value: 0.5}
+    informs[slot]['dontcare'] = 0.25
+    assert slot in informs
+    assert dict(informs[slot]) == {value: 0.5, 'dontcare': 0.25}
+    del informs[slot][value]
+    assert value not in informs[slot]
+    del informs[slot]
+    assert slot not in informs
+    assert len(informs) == 0
+
+
+def test_unknown_values_are_kept_outside_arrays(domain, constraintA):
+    """
+    Tests whether values not contained in the ontology are stored, but not vectorized.
+
+    Args:
+        domain: Domain Object (given in conftest.py)
+        constraintA (dict): an existing slot-value pair in the domain (given in
+        conftest_<domain>.py)
+    """
+    index = BeliefIndex(domain)
+    informs = ArrayInforms(index, {constraintA['slot']: {'not in ontology': 1.0}})
+    assert informs[constraintA['slot']]['not in ontology'] == 1.0
+    offset = index.slot_offsets[constraintA['slot']]
+    assert informs.probs[offset] == 0.0
+    assert informs.probs[offset + 1:index.slot_ends[constraintA['slot']]].sum() == 0.0
+
+
+def test_copies_are_independent(domain, constraintB):
+    """
+    Tests whether modifying a copy does not change the original informs and requests.
+
+    Args:
+        domain: Domain Object (given in conftest.py)
+        constraintB (dict): an existing slot-value pair in the domain (given in
+        conftest_<domain>.py)
+    """
+    index = BeliefIndex(domain)
+    informs = ArrayInforms(index, {constraintB['slot']: {constraintB['value']: 1.0}})
+    requests = ArrayRequests(index, {index.requestable_slots[0]: 1.0})
+    informs_copy, requests_copy = informs.copy(), requests.copy()
+    del informs_copy[constraintB['slot']]
+    del requests_copy[index.requestable_slots[0]]
+    assert constraintB['slot'] in informs
+    assert index.requestable_slots[0] in requests
@@ -1,4 +1,5 @@
 import os
+import pickle
 import sys
 from copy import deepcopy
 
@@ -9,6 +10,7 @@ def get_root_dir():
 sys.path.append(get_root_dir())
 from services.bst import HandcraftedBST
 from utils import UserActionType, UserAct
+from utils.beliefstate import BeliefStateReceiver
 
 
 def test_initialize_bst_without_domain():
@@ -233,3 +235,164 @@ def test_handle_user_acts_for_user_request_alternatives(bst, primkey_constraint)
     user_acts = [UserAct(act_type=UserActionType.RequestAlternatives)]
     bst._handle_user_acts(user_acts)
     assert bst.domain.get_primary_key() not in bst.bs['informs']
+
+
+def test_update_bst_keeps_previous_turn_unchanged(bst, constraintA, constraintA_alt):
+    """
+    Tests whether changing the informs of the current turn does not modify the informs shared
+    with the previous turn.
+
+    Args:
+        bst: BST Object (given in conftest.py)
+        constraintA (dict): an existing slot-value pair in the domain (given in
+        conftest_<domain>.py)
+        constraintA_alt (dict): same slot as constraintA, but a different value (given in
+        conftest_<domain>.py)
+    """
+    bst.update_bst([UserAct(act_type=UserActionType.Inform, slot=constraintA['slot'],
+                            value=constraintA['value'])])
+    bst.update_bst([UserAct(act_type=UserActionType.NegativeInform, slot=constraintA['slot'],
+                            value=constraintA['value'])])
+    assert constraintA['value'] in bst.bs[-2]['informs'][constraintA['slot']]
+    assert constraintA['value'] not in bst.bs['informs'][constraintA['slot']]
+
+
+def test_history_size_limits_stored_turns(domain):
+    """
+    Tests whether the belief state only keeps the configured number of turns.
+
+    Args:
+        domain: Domain Object (given in conftest.py)
+    """
+    bst = HandcraftedBST(domain, history_size=3)
+    for _ in range(5):
+        bst.update_bst(None)
+    assert len(bst.bs) == 3
+
+
+def test_published_deltas_reconstruct_beliefstate(domain, constraintA, constraintA_alt):
+    """
+    Tests whether a receiver reconstructs the tracked belief state from the published
+    (pickled) deltas, starting with a snapshot on the first turn of the dialog.
+
+    Args:
+        domain: Domain Object (given in conftest.py)
+        constraintA (dict): an existing slot-value pair in the domain (given in
+        conftest_<domain>.py)
+        constraintA_alt (dict): same slot as constraintA, but a different value (given in
+        conftest_<domain>.py)
+    """
+    bst = HandcraftedBST(domain, publish_deltas=True)
+    receiver = BeliefStateReceiver()
+    turns = [None,
+             [UserAct(act_type=UserActionType.Inform, slot=constraintA['slot'],
+                      value=constraintA['value'])],
+             [UserAct(act_type=UserActionType.Inform, slot=constraintA['slot'],
+                      value=constraintA_alt['value'])],
+             [UserAct(act_type=UserActionType.Request, slot=constraintA['slot'])]]
+    for idx, user_acts in enumerate(turns):
+        delta = pickle.loads(pickle.dumps(bst.update_bst(user_acts)['beliefstate']))
+        assert delta.is_snapshot == (idx == 0)
+        beliefstate = receiver.receive(delta)
+        assert dict(beliefstate['informs']) == dict(bst.bs['informs'])
+        assert beliefstate['requests'] == bst.bs['requests']
+        assert beliefstate['user_acts'] == bst.bs['user_acts']
+        assert beliefstate['num_matches'] == bst.bs['num_matches']
+        assert len(beliefstate) == len(bst.bs)
+
+
+def test_late_receiver_waits_for_snapshot(domain):
+    """
+    Tests whether a receiver which missed the previous turns ignores deltas until the next
+    snapshot is published.
+
+    Args:
+        domain: Domain Object (given in conftest.py)
+    """
+    bst = HandcraftedBST(domain, publish_deltas=True, snapshot_interval=4)
+    bst.update_bst(None)
+    receiver = BeliefStateReceiver()
+    assert receiver.receive(bst.update_bst(None)['beliefstate']) is None
+    snapshot = bst.update_bst(None)['beliefstate']
+    assert snapshot.is_snapshot
+    assert receiver.receive(snapshot) is not None
+    assert receiver.receive(bst.update_bst(None)['beliefstate']) is not None
+
+
+def test_requested_snapshot_is_published_with_next_turn(domain):
+    """
+    Tests whether the BST publishes the complete belief state with the turn after a subscriber
+    requested a snapshot, instead of waiting for the snapshot interval.
+
+    Args:
+        domain: Domain Object (given in conftest.py)
+    """
+    bst = HandcraftedBST(domain, publish_deltas=True, snapshot_interval=10)
+    bst.update_bst(None)
+    receiver = BeliefStateReceiver()
+    assert receiver.receive(bst.update_bst(None)['beliefstate']) is None
+    bst.request_snapshot(snapshot_request=True)
+    snapshot = bst.update_bst(None)['beliefstate']
+    assert snapshot.is_snapshot
+    assert receiver.receive(snapshot) is not None
+    delta = bst.update_bst(None)['beliefstate']
+    assert not delta.is_snapshot
+    assert receiver.receive(delta) is not None
+
+
+def test_reloaded_database_is_used_from_next_turn(tmp_path):
+    """
+    Tests whether a database reloaded during a turn is only put into use by the BST at the
+    begin of the next turn, so that the services answering a turn see the same data.
+    """
+    import shutil
+    import sqlite3
+    from utils.domain.jsonlookupdomain import JSONLookupDomain
+    root_dir = os.path.dirname(get_root_dir())
+    db_file = tmp_path / 'superhero.db'
+    shutil.copy(os.path.join(root_dir, 'resources', 'databases', 'superhero.db'), db_file)
+    domain = JSONLookupDomain('superhero', sqllite_db_file=os.path.relpath(db_file, root_dir))
+    bst = HandcraftedBST(domain)
+    bst.dialog_start()
+    inform = [UserAct(act_type=UserActionType.Inform, slot='main_superpower', value='Magic')]
+    num_matches = bst.update_bst(inform)['beliefstate']['num_matches']
+
+    file_db = sqlite3.connect(str(db_file))
+    file_db.execute("DELETE FROM superhero WHERE name = 'Dr. Strange'")
+    file_db.commit()
+    file_db.close()
+    domain.reload(wait=True)
+    # the policy of the current turn still sees the matches counted by the BST
+    assert len(domain.find_entities({'main_superpower': 'Magic'})) == num_matches
+    assert bst.update_bst(inform)['beliefstate']['num_matches'] == num_matches - 1
+    assert len(domain.find_entities({'main_superpower': 'Magic'})) == num_matches - 1
+
+
+def test_compact_beliefstate_matches_dict_beliefstate(domain, constraintA, constraintB):
+    """
+    Tests whether a belief state backed by arrays is updated like the dictionary based one.
+
+    Args:
+        domain: Domain Object (given in conftest.py)
+        constraintA (dict): an existing slot-value pair in the domain (given in
+        conftest_<domain>.py)
+        constraintB (dict): another existing slot-value pair in the domain (given in
+        conftest_<domain>.py)
+    """
+    turns = [[UserAct(act_type=UserActionType.Inform, slot=constraintA['slot'],
+                      value=constraintA['value'], score=0.8),
+              UserAct(act_type=UserActionType.Request, slot=constraintB['slot'])],
+             [UserAct(act_type=UserActionType.Inform, slot=constraintB['slot'],
+                      value=constraintB['value'])],
+             [UserAct(act_type=UserActionType.NegativeInform, slot=constraintA['slot'],
+                      value=constraintA['value'])]]
+    dict_bst = HandcraftedBST(domain)
+    compact_bst = HandcraftedBST(domain, compact_beliefstate=True)
+    for user_acts in turns:
+        dict_bst.update_bst(user_acts)
+        compact_bst.update_bst(user_acts)
+        assert {slot: dict(values) for slot, values in compact_bst.bs['informs'].items()} \
+            == dict(dict_bst.bs['informs'])
+        assert dict(compact_bst.bs['requests']) == dict_bst.bs['requests']
+        assert compact_bst.bs['num_matches'] == dict_bst.bs['num_matches']
+    assert constraintA['value'] in compact_bst.bs[-2]['informs'][constraintA['slot']]
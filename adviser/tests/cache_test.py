@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.append(get_root_dir())
+from utils.cache import LRUCache
+
+
+def test_least_recently_used_entry_is_evicted():
+    """
+    Tests whether the least recently used entry is removed once the cache is full.
+    """
+    cache = LRUCache(max_size=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert 'b' not in cache
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_entries_expire():
+    """
+    Tests whether entries are no longer returned after their time to live.
+    """
+    cache = LRUCache(ttl=0.01)
+    cache.put('a', 1)
+    time.sleep(0.02)
+    assert cache.get('a') is None
+
+
+def test_hit_rate():
+    """
+    Tests whether hits and misses are counted.
+    """
+    cache = LRUCache()
+    cache.put('a', 1)
+    cache.get('a')
+    cache.get('b')
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+    assert cache.hit_rate == 0.5
@@ -0,0 +1,118 @@
+import os
+import sys
+import time
+from concurrent.futures import TimeoutError
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.append(get_root_dir())
+import pytest
+from utils.campus_api import CampusApi
+
+
+REGISTRATION_XPATH = "resource/content/cpCourseDetailDto/cpCourseDto/registrationInfoStatus"
+
+
+def registration(course) -> str:
+    return course.xpath(REGISTRATION_XPATH)[0].text
+
+
+def test_course_is_cached(campus_stand_in):
+    """ Test functionality: a course is downloaded only once within the cache ttl """
+    api = CampusApi(base_url=campus_stand_in.url)
+    assert registration(api.get_course_by_id(3)) == 'RUNNING'
+    campus_stand_in.registration[3] = 'NONE'
+    assert registration(api.get_course_by_id(3)) == 'RUNNING'
+    assert campus_stand_in.course_requests(3) == 1
+
+
+def test_stale_course_is_returned_while_revalidated(campus_stand_in):
+    """ Test functionality: after the cache ttl, the cached course is returned immediately and
+        replaced by the refreshed one in the background """
+    api = CampusApi(base_url=campus_stand_in.url, cache_ttl=0.05)
+    api.get_course_by_id(3)
+    campus_stand_in.registration[3] = 'NONE'
+    campus_stand_in.delay = 0.2
+    time.sleep(0.1)
+    start = time.monotonic()
+    assert registration(api.get_course_by_id(3)) == 'RUNNING'
+    assert time.monotonic() - start < 0.1
+    time.sleep(0.4)
+    assert registration(api.get_course_by_id(3)) == 'NONE'
+
+
+def test_slow_backend_does_not_stall_caller(campus_stand_in):
+    """ Test functionality: the caller waits at most max_wait for a course; the course is
+        cached once it arrives, and concurrent requests for it are coalesced """
+    api = CampusApi(base_url=campus_stand_in.url, max_wait=0.05)
+    campus_stand_in.delay = 0.3
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        api.get_course_by_id(5)
+    with pytest.raises(TimeoutError):
+        api.get_course_by_id(5)
+    assert time.monotonic() - start < 0.3
+    time.sleep(0.5)
+    assert registration(api.get_course_by_id(5)) == 'RUNNING'
+    assert campus_stand_in.course_requests(5) == 1
+
+
+def test_requests_time_out(campus_stand_in):
+    """ Test functionality: requests to an unresponsive backend fail after the timeout """
+    api = CampusApi(base_url=campus_stand_in.url, timeout=0.05, retries=0)
+    campus_stand_in.delay = 0.5
+    with pytest.raises(Exception):
+        api.fetch_course(1)
+
+
+def test_batches_return_all_courses(campus_stand_in):
+    """ Test functionality: the batches contain every course exactly once """
+    api = CampusApi(3, base_url=campus_stand_in.url)
+    ids = []
+    batch = api.get_next_batch_of_courses()
+    while batch is not None:
+        ids += [int(course.xpath('resource/content/cpCourseDetailDto/cpCourseDto/id')[0].text)
+                for course in batch]
+        batch = api.get_next_batch_of_courses()
+    assert ids == campus_stand_in.course_ids
+
+
+def course_id(course) -> int:
+    return int(course.xpath('resource/content/cpCourseDetailDto/cpCourseDto/id')[0].text)
+
+
+def test_iter_courses_downloads_concurrently(campus_stand_in):
+    """ Test functionality: all courses are yielded (parsed by the workers), and they are
+        downloaded concurrently """
+    api = CampusApi(3, base_url=campus_stand_in.url)
+    campus_stand_in.course_ids = list(range(1, 21))
+    campus_stand_in.delay = 0.1
+    start = time.monotonic()
+    ids = list(api.iter_courses(parse=course_id, workers=10))
+    assert sorted(ids) == campus_stand_in.course_ids
+    # 7 pages and 20 courses would take 2.7s one after the other
+    assert time.monotonic() - start < 1.5
+
+
+def test_iter_courses_retries_failed_downloads(campus_stand_in):
+    """ Test functionality: failed downloads are retried with backoff; courses failing on
+        every attempt are skipped """
+    api = CampusApi(base_url=campus_stand_in.url, retries=2, backoff=0.01)
+    campus_stand_in.failures = {2: 2, 4: 3}
+    ids = sorted(api.iter_courses(parse=course_id))
+    assert ids == [1, 2, 3, 5, 6, 7]
+    assert campus_stand_in.course_requests(2) == 3
+    assert campus_stand_in.course_requests(4) == 3
+
+
+def test_connection_dropped_in_body_is_retried(campus_stand_in):
+    """ Test functionality: a connection which breaks off while the body is downloaded is
+        retried like a failed request; it fails once the retries are used up """
+    api = CampusApi(base_url=campus_stand_in.url, retries=2, backoff=0.01)
+    campus_stand_in.truncated = {3: 2, 6: 3}
+    assert course_id(api.fetch_course(3)) == 3
+    assert campus_stand_in.course_requests(3) == 3
+    with pytest.raises(Exception):
+        api.fetch_course(6)
+    assert campus_stand_in.course_requests(6) == 3
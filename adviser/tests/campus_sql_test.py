@@ -0,0 +1,90 @@
+import os
+import sys
+import sqlite3
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.append(get_root_dir())
+import pytest
+from utils.campus_sql import Course, build_database
+
+
+def make_course(id: int, title: str, description: str = None) -> Course:
+    course = Course()
+    course.id = str(id)
+    course.title = title
+    course.description = description
+    course.institution = 'Institute for Natural Language Processing'
+    course.lecturers = ['Ada Lovelace']
+    return course
+
+
+@pytest.fixture
+def courses():
+    return [make_course(1, 'Machine Learning', 'neural networks and more'),
+            make_course(2, 'Databases', 'query languages'),
+            make_course(3, 'Computational Linguistics')]
+
+
+def test_build_database(tmp_path, courses):
+    """ Test functionality: each course is one row with its fields and topic flags; invalid
+        topics are skipped """
+    db_path = str(tmp_path / 'campus_courses.db')
+    build_database(db_path, courses, ['machine_learning', 'neural', 'select', 'linguistics'])
+    db = sqlite3.connect(db_path)
+    db.row_factory = sqlite3.Row
+    rows = db.execute('SELECT * FROM campus_courses ORDER BY id').fetchall()
+    assert [row['title'] for row in rows] == ['Machine Learning', 'Databases',
+                                             'Computational Linguistics']
+    assert rows[1]['lecturers'] == 'Ada Lovelace' and rows[2]['description'] == 'na'
+    assert [row['neural'] for row in rows] == ['true', 'false', 'false']
+    assert [row['machine_learning'] for row in rows] == ['true', 'false', 'false']
+    assert [row['linguistics'] for row in rows] == ['false', 'false', 'true']
+    assert 'select' not in rows[0].keys()
+    assert not os.path.exists(db_path + '.tmp')
+
+
+def test_rebuild_replaces_database(tmp_path, courses):
+    """ Test functionality: a rebuild replaces the database file, while connections to the
+        old database keep reading the old data """
+    db_path = str(tmp_path / 'campus_courses.db')
+    build_database(db_path, courses, ['neural'])
+    old = sqlite3.connect(db_path)
+    old.execute('SELECT 1 FROM campus_courses').fetchall()
+    build_database(db_path, courses[:1], ['neural'])
+    assert sqlite3.connect(db_path).execute('SELECT COUNT(*) FROM campus_courses').fetchone() \
+        == (1,)
+    assert old.execute('SELECT COUNT(*) FROM campus_courses').fetchone() == (3,)
+
+
+def test_sync_applies_only_changes(tmp_path, campus_stand_in):
+    """ Test functionality: a sync adds new courses, updates changed ones, deletes removed
+        ones and records the changes; unchanged courses are answered with 304 Not Modified """
+    from utils.campus_api import CampusApi
+    from utils.campus_sql import sync_database
+    db_path = str(tmp_path / 'campus_courses.db')
+    campus_stand_in.course_ids = [1, 2, 3]
+    courses = [Course(), Course()]
+    for course, id, title in zip(courses, ['1', '2'], ['Course 1', 'Old title']):
+        course.id, course.title = id, title
+    build_database(db_path, courses, ['course'])
+    api = CampusApi(base_url=campus_stand_in.url)
+
+    assert sync_database(db_path, api) == [('updated', 2), ('added', 3)]
+    db = sqlite3.connect(db_path)
+    assert db.execute('SELECT id, title FROM campus_courses ORDER BY id').fetchall() == \
+        [(1, 'Course 1'), (2, 'Course 2'), (3, 'Course 3')]
+    assert db.execute('SELECT course FROM campus_courses WHERE id = 3').fetchone() == ('true',)
+
+    campus_stand_in.course_ids = [1, 3]
+    campus_stand_in.titles[3] = 'Title of course 3'
+    assert sync_database(db_path, api) == [('deleted', 2), ('updated', 3)]
+    assert db.execute('SELECT id, title FROM campus_courses ORDER BY id').fetchall() == \
+        [(1, 'Course 1'), (3, 'Title of course 3')]
+    assert db.execute('SELECT change FROM campus_courses_changelog').fetchall() == \
+        [('updated',), ('added',), ('deleted',), ('updated',)]
+
+    not_modified = campus_stand_in.not_modified
+    assert sync_database(db_path, api) == []
+    assert campus_stand_in.not_modified == not_modified + 2
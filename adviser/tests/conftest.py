@@ -19,7 +19,7 @@ from services.nlg.affective_nlg import HandcraftedEmotionNLG
 from services.simulator.simulator import HandcraftedUserSimulator, Agenda
 
 
-pytest_plugins = ['conftest_superhero']
+pytest_plugins = ['conftest_superhero', 'conftest_campus_api', 'conftest_weather_api']
 
 
 @pytest.fixture
@@ -0,0 +1,140 @@
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+
+COURSE_XML = """<resources><resource>
+<link name="CpCourseRegistrationDto" href="{url}/{id}/registration"/>
+<content><cpCourseDetailDto><cpCourseDto>
+<id>{id}</id>
+<courseTitle><value><translations><translation lang="en">{title}</translation>
+<translation lang="de">Kurs {id}</translation></translations></value></courseTitle>
+<registrationInfoStatus>{status}</registrationInfoStatus>
+</cpCourseDto></cpCourseDetailDto></content>
+</resource></resources>"""
+
+BATCH_XML = """<resources><totalCount>{total}</totalCount>{resources}</resources>"""
+
+BATCH_RESOURCE_XML = """<resource><content><cpCourseDto><id>{id}</id></cpCourseDto></content>
+</resource>"""
+
+
+class CampusStandIn:
+    """ State of the local stand-in for the campus REST API
+
+    Attributes:
+        url (str): URL of the courses resource
+        course_ids (list): ids of the courses listed in the batches
+        registration (dict): registration status per course id (default: RUNNING)
+        titles (dict): english title per course id (default: 'Course <id>')
+        etags (bool): whether responses carry an ETag and conditional requests are answered
+                      with 304 Not Modified
+        delay (float): seconds each response is delayed
+        failures (dict): number of error responses sent for a course id before it succeeds
+        truncated (dict): number of responses for a course id whose connection is dropped in
+                          the middle of the body before it succeeds
+        requests (list): paths of all received requests
+        not_modified (int): number of conditional requests answered with 304 Not Modified
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.course_ids = list(range(1, 8))
+        self.registration = {}
+        self.titles = {}
+        self.etags = True
+        self.delay = 0.0
+        self.failures = {}
+        self.truncated = {}
+        self.requests = []
+        self.not_modified = 0
+        self.lock = threading.Lock()
+
+    def course_requests(self, id) -> int:
+        """ Returns how often the course with the given id was requested """
+        return sum(1 for path in self.requests if path.endswith('/{}'.format(id)))
+
+
+def _handler(stand_in: CampusStandIn):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            with stand_in.lock:
+                stand_in.requests.append(self.path)
+            time.sleep(stand_in.delay)
+            url = urlparse(self.path)
+            course_id = url.path.rsplit('/', 1)[-1]
+            if course_id.isdigit():
+                course_id = int(course_id)
+                with stand_in.lock:
+                    failures = stand_in.failures.get(course_id, 0)
+                    stand_in.failures[course_id] = max(failures - 1, 0)
+                    truncated = stand_in.truncated.get(course_id, 0)
+                    if not failures:
+                        stand_in.truncated[course_id] = max(truncated - 1, 0)
+                if failures:
+                    return self._respond(503, '')
+                body = COURSE_XML.format(
+                    url=stand_in.url, id=course_id,
+                    title=stand_in.titles.get(course_id, 'Course {}'.format(course_id)),
+                    status=stand_in.registration.get(course_id, 'RUNNING'))
+                if truncated:
+                    return self._respond(200, body, truncate=True)
+                if not stand_in.etags:
+                    return self._respond(200, body)
+                etag = '"{}"'.format(hashlib.md5(body.encode('utf-8')).hexdigest())
+                if self.headers.get('If-None-Match') == etag:
+                    with stand_in.lock:
+                        stand_in.not_modified += 1
+                    return self._respond(304, None, etag)
+                return self._respond(200, body, etag)
+            query = parse_qs(url.query)
+            skip, top = int(query['$skip'][0]), int(query['$top'][0])
+            resources = ''.join(BATCH_RESOURCE_XML.format(id=id)
+                                for id in stand_in.course_ids[skip:skip + top])
+            self._respond(200, BATCH_XML.format(total=len(stand_in.course_ids),
+                                                resources=resources))
+
+        def _respond(self, status: int, body: str, etag: str = None, truncate: bool = False):
+            self.send_response(status)
+            if etag:
+                self.send_header('ETag', etag)
+            if body is None:
+                self.end_headers()
+                return
+            body = body.encode('utf-8')
+            self.send_header('Content-Type', 'application/xml')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if truncate:
+                # announce the whole body, but drop the connection after half of it
+                self.wfile.write(body[:len(body) // 2])
+                self.wfile.flush()
+                self.close_connection = True
+                return
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+@pytest.fixture
+def campus_stand_in():
+    """ Runs a local stand-in for the campus REST API during a test """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), None)
+    stand_in = CampusStandIn('http://127.0.0.1:{}/courses'.format(server.server_address[1]))
+    server.RequestHandlerClass = _handler(stand_in)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05},
+                              daemon=True)
+    thread.start()
+    yield stand_in
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,80 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+
+# seconds between two forecasts, as in the OpenWeatherMap API
+FORECAST_INTERVAL = 3 * 60 * 60
+
+
+class WeatherStandIn:
+    """ State of the local stand-in for the OpenWeatherMap forecast API
+
+    Each known location has 40 forecasts, one every 3 hours from the last full interval; the
+    n-th forecast has a temperature of (10 + n) degrees Celsius.
+
+    Attributes:
+        url (str): URL of the forecast endpoint
+        locations (list): names of the known locations (case-insensitive)
+        delay (float): seconds each response is delayed
+        requests (list): the location queried by each received request
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.locations = ['stuttgart', 'berlin']
+        self.delay = 0.0
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def forecasts(self) -> list:
+        start = int(time.time()) // FORECAST_INTERVAL * FORECAST_INTERVAL
+        return [{'dt': start + n * FORECAST_INTERVAL, 'main': {'temp': 283.15 + n},
+                 'weather': [{'description': 'clear sky'}]} for n in range(40)]
+
+
+def _handler(stand_in: WeatherStandIn):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            location = parse_qs(urlparse(self.path).query)['q'][0]
+            with stand_in.lock:
+                stand_in.requests.append(location)
+            time.sleep(stand_in.delay)
+            if location.lower() in stand_in.locations:
+                self._respond(200, {'cod': '200', 'list': stand_in.forecasts()})
+            else:
+                self._respond(404, {'cod': '404', 'message': 'city not found'})
+
+        def _respond(self, status: int, content: dict):
+            body = json.dumps(content).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+@pytest.fixture
+def weather_stand_in():
+    """ Runs a local stand-in for the OpenWeatherMap forecast API during a test """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), None)
+    stand_in = WeatherStandIn('http://127.0.0.1:{}/forecast'.format(server.server_address[1]))
+    server.RequestHandlerClass = _handler(stand_in)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05},
+                              daemon=True)
+    thread.start()
+    yield stand_in
+    server.shutdown()
+    server.server_close()
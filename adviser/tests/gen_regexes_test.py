@@ -0,0 +1,158 @@
+import json
+import os
+import sys
+import shutil
+import sqlite3
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.append(get_root_dir())
+import pytest
+from tools.regextemplates import gen_regexes
+from tools.regextemplates.gen_regexes import create_json_from_template
+from utils.domain.jsonlookupdomain_large import JSONLookupDomainLarge
+
+
+RULE_FILES = ['superheroRequestRules.json', 'superheroInformRules.json']
+
+
+@pytest.fixture
+def superhero_files(tmp_path):
+    """ A copy of the superhero database and a template whose name rule reads the real name of
+        each hero from the database """
+    db_file = tmp_path / 'superhero.db'
+    shutil.copy(os.path.join(get_root_dir(), 'resources', 'databases', 'superhero.db'), db_file)
+    with open(os.path.join(get_root_dir(), 'resources', 'nlu_regexes', 'superhero.nlu')) as file:
+        template = file.read()
+    template = template.replace('''    "I want {synonyms("name", name)}"''',
+                                '''    "I want {synonyms("name", name)}"
+    "I want {name.real_name}"''')
+    template_file = tmp_path / 'superhero.nlu'
+    template_file.write_text(template)
+    output_dir = tmp_path / 'rules'
+    output_dir.mkdir()
+    return str(db_file), str(template_file), str(output_dir)
+
+
+@pytest.fixture
+def rendered_rules(monkeypatch):
+    """ Records the slots (and values) whose rules are created (in this process) """
+    rendered = {'requests': [], 'informs': []}
+    create_request_regex = gen_regexes._create_request_regex
+    create_inform_regexes = gen_regexes._create_inform_regexes
+
+    def recording_request_regex(template, slot):
+        rendered['requests'].append(slot)
+        return create_request_regex(template, slot)
+
+    def recording_inform_regexes(template, slot, values):
+        rendered['informs'].append((slot, list(values)))
+        return create_inform_regexes(template, slot, values)
+
+    monkeypatch.setattr(gen_regexes, '_create_request_regex', recording_request_regex)
+    monkeypatch.setattr(gen_regexes, '_create_inform_regexes', recording_inform_regexes)
+    return rendered
+
+
+@pytest.fixture
+def parsed_templates(monkeypatch):
+    """ Records the templates parsed by the rule generation (in this process) """
+    parsed = []
+
+    class RecordingRegexFile(gen_regexes.RegexFile):
+        def __init__(self, filename, domain):
+            parsed.append(filename)
+            super(RecordingRegexFile, self).__init__(filename, domain)
+
+    monkeypatch.setattr(gen_regexes, 'RegexFile', RecordingRegexFile)
+    return parsed
+
+
+def generate(db_file: str, template_file: str, output_dir: str, ontology_file: str = None,
+             **kwargs) -> dict:
+    """ Generates the rules and returns the contents of the rule files """
+    if ontology_file is not None:
+        ontology_file = os.path.relpath(ontology_file, get_root_dir())
+    domain = JSONLookupDomainLarge('superhero', json_ontology_file=ontology_file,
+                                   sqllite_db_file=os.path.relpath(db_file, get_root_dir()))
+    create_json_from_template(domain, template_file, output_dir=output_dir, **kwargs)
+    contents = {}
+    for filename in RULE_FILES:
+        with open(os.path.join(output_dir, filename), 'rb') as file:
+            contents[filename] = file.read()
+    return contents
+
+
+def test_unchanged_rules_are_reused(superhero_files, parsed_templates):
+    """ Tests whether a second run reuses the rules without parsing the template """
+    first = generate(*superhero_files)
+    assert b'Bruce Wane' in first['superheroInformRules.json']
+    assert len(parsed_templates) == 1
+    assert generate(*superhero_files) == first
+    assert len(parsed_templates) == 1
+
+
+def test_new_ontology_value_is_the_only_rule_created(superhero_files, rendered_rules,
+                                                     tmp_path):
+    """ Tests whether adding a value to the ontology only creates the rule of that value """
+    db_file, template_file, output_dir = superhero_files
+    with open(os.path.join(get_root_dir(), 'resources', 'ontologies', 'superhero.json')) as file:
+        ontology = json.load(file)
+    ontology_file = tmp_path / 'superhero.json'
+    ontology_file.write_text(json.dumps(ontology))
+    generate(db_file, template_file, output_dir, str(ontology_file))
+
+    ontology['informable']['primary_uniform_color'].append('Green')
+    ontology_file.write_text(json.dumps(ontology))
+    rendered_rules['requests'].clear()
+    rendered_rules['informs'].clear()
+    updated = generate(db_file, template_file, output_dir, str(ontology_file))
+    assert rendered_rules == {'requests': [], 'informs': [('primary_uniform_color', ['Green'])]}
+
+    full_dir = tmp_path / 'full'
+    full_dir.mkdir()
+    assert generate(db_file, template_file, str(full_dir), str(ontology_file),
+                    incremental=False) == updated
+
+
+def test_changed_template_or_database_rebuilds_rules(superhero_files, parsed_templates,
+                                                     rendered_rules):
+    """ Tests whether editing the template regenerates all rules and editing the database only
+        those of the slots reading the edited column """
+    db_file, template_file, output_dir = superhero_files
+    first = generate(*superhero_files)
+
+    with open(template_file, 'a') as file:
+        file.write('\n# edited\n')
+    assert generate(*superhero_files) == first
+    assert len(parsed_templates) == 2
+
+    db = sqlite3.connect(db_file)
+    db.execute("UPDATE superhero SET description = 'edited' WHERE name = 'Batman'")
+    db.commit()
+    rendered_rules['requests'].clear()
+    rendered_rules['informs'].clear()
+    assert generate(*superhero_files) == first
+    assert len(parsed_templates) == 2
+
+    db.execute("UPDATE superhero SET real_name = 'Terry McGinnis' WHERE name = 'Batman'")
+    db.commit()
+    db.close()
+    rebuilt = generate(*superhero_files)
+    assert len(parsed_templates) == 3
+    assert rendered_rules['requests'] == []
+    assert [slot for slot, _ in rendered_rules['informs']] == ['name']
+    assert b'Terry McGinnis' in rebuilt['superheroInformRules.json']
+    assert b'Bruce Wane' not in rebuilt['superheroInformRules.json']
+
+
+def test_parallel_generation_equals_serial_generation(superhero_files, tmp_path):
+    """ Tests whether the rule files generated by worker processes are byte-identical to
+        those generated in one process """
+    db_file, template_file, output_dir = superhero_files
+    parallel_dir = tmp_path / 'parallel'
+    parallel_dir.mkdir()
+    serial = generate(db_file, template_file, output_dir, workers=1, incremental=False)
+    parallel = generate(db_file, template_file, str(parallel_dir), workers=3, incremental=False)
+    assert parallel == serial
@@ -1,6 +1,7 @@
 import os
 import sys
 import argparse
+import sqlite3
 
 def get_root_dir():
     return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -8,10 +9,17 @@ def get_root_dir():
 sys.path.append(get_root_dir())
 import pytest
 from utils.domain.jsonlookupdomain import JSONLookupDomain
+from utils.domain.columnardomain import ColumnarDomain
 
 
 # Test case using pytest.fixture
 
+@pytest.fixture(scope="module", params=[JSONLookupDomain, ColumnarDomain])
+def domain_class(request):
+    """ The domain classes which must behave the same in the following tests """
+    return request.param
+
+
 @pytest.fixture(scope="module")
 def load_superhero_domain():
     """ Try loading the restaurant domain shared by all following tests in this file. """
@@ -23,13 +31,13 @@ def load_superhero_domain():
     return domain
 
 
-def test_query_db(load_supehero_domain : JSONLookupDomain):
+def test_query_db(load_superhero_domain : JSONLookupDomain):
     """
         Test functionality: query_db executes SQL SELECT query
         
         Note, a better test would have a fixed testing db rather than one which could change
     """
-    query_str = "SELECT * FROM supehero"
+    query_str = "SELECT * FROM superhero"
     domain = load_superhero_domain
     entities = domain.query_db(query_str)
 
@@ -41,3 +49,283 @@ def test_query_db(load_supehero_domain : JSONLookupDomain):
     # print(entities[0])
 
 
+
+
+def test_read_only_domain_finds_same_entities(load_superhero_domain: JSONLookupDomain):
+    """
+        Test functionality: a domain opening its database read-only and memory-mapped returns
+        the same entities as a domain copying the database to memory
+    """
+    read_only_domain = JSONLookupDomain('superhero', read_only=True)
+    constraints = {'main_superpower': 'magic'}
+    assert read_only_domain.find_entities(constraints) == \
+        load_superhero_domain.find_entities(constraints)
+
+
+def test_read_only_domain_rejects_writes():
+    """ Test functionality: the database of a read-only domain cannot be modified """
+    read_only_domain = JSONLookupDomain('superhero', read_only=True)
+    with pytest.raises(sqlite3.OperationalError):
+        read_only_domain.query_db("DELETE FROM superhero")
+
+
+def test_find_entities_treats_values_as_data(load_superhero_domain: JSONLookupDomain):
+    """ Test functionality: constraint values are passed as parameters, not as SQL """
+    constraints = {'main_superpower': "magic' OR '1'='1"}
+    assert load_superhero_domain.find_entities(constraints) == []
+
+
+def test_primary_key_lookup_uses_index(load_superhero_domain: JSONLookupDomain):
+    """ Test functionality: the queries of find_info_about_entity and of case-insensitive
+        lookups of the primary key search an index instead of scanning the table """
+    domain = load_superhero_domain
+    for slots in [(), ('description',)]:
+        plan = domain.query_db('EXPLAIN QUERY PLAN ' + domain._entity_info_query(slots),
+                               ('Batman',))
+        assert all(row['detail'].startswith('SEARCH') for row in plan), plan
+    plan = domain.query_db(
+        'EXPLAIN QUERY PLAN SELECT * FROM superhero WHERE name=? COLLATE NOCASE', ('batman',))
+    assert any('USING INDEX' in row['detail'] for row in plan)
+    assert domain.find_info_about_entity('batman', ['name']) == []
+
+
+def test_repeated_lookups_are_cached():
+    """ Test functionality: repeated queries are answered from the result cache, which
+        returns copies and is invalidated with a new generation """
+    domain = JSONLookupDomain('superhero')
+    first = domain.find_entities({'main_superpower': 'Magic'})
+    first[0]['name'] = 'modified'
+    second = domain.find_entities({'main_superpower': 'magic'})
+    assert domain.result_cache.hits == 1
+    assert second[0]['name'] != 'modified'
+
+    domain.invalidate_caches()
+    domain.find_entities({'main_superpower': 'Magic'})
+    assert domain.result_cache.hits == 1
+    assert domain.generation == 1
+
+
+def test_pickled_domain_keeps_no_cache():
+    """ Test functionality: caches are not pickled with the domain """
+    domain = JSONLookupDomain('superhero')
+    domain.find_info_about_entity('Batman', ['description'])
+    domain.get_match_index()
+    state = domain.__getstate__()
+    assert '_result_cache' not in state and '_match_index' not in state
+
+
+def test_count_entities_and_value_histogram():
+    """ Test functionality: counts and value histograms agree with the fetched entities, when
+        answered by the match index, by SQL aggregates and by the columns """
+    constraints = {'main_superpower': 'Magic'}
+    for domain in [JSONLookupDomain('superhero', use_match_index=True),
+                   JSONLookupDomain('superhero', use_match_index=False),
+                   ColumnarDomain('superhero')]:
+        entities = domain.find_entities(constraints, ['primary_uniform_color'])
+        assert domain.count_entities(constraints) == len(entities)
+        histogram = domain.value_histogram(constraints, ['primary_uniform_color'])
+        assert sum(histogram['primary_uniform_color'].values()) == len(entities)
+        for entity in entities:
+            assert histogram['primary_uniform_color'][entity['primary_uniform_color']] > 0
+
+
+def test_threads_query_through_own_connections():
+    """ Test functionality: concurrent threads get their own read-only connections to the
+        shared in-memory database and see the same data """
+    import threading
+    domain = JSONLookupDomain('superhero', cache_size=0)
+    expected = domain.find_entities({'main_superpower': 'Magic'})
+    barrier = threading.Barrier(4)
+    results = []
+
+    def query():
+        barrier.wait()
+        results.append((domain._reader(), domain.find_entities({'main_superpower': 'Magic'})))
+
+    threads = [threading.Thread(target=query) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [entities for _, entities in results] == [expected] * 4
+    connections = {id(connection) for connection, _ in results}
+    assert len(connections) == 4 and id(domain.db) not in connections
+    with pytest.raises(sqlite3.OperationalError):
+        domain.query_db("DELETE FROM superhero")
+
+
+def test_readers_see_writes_of_owner_connection():
+    """ Test functionality: changes made through the domain's own connection are visible to
+        the connections of the reading threads """
+    domain = JSONLookupDomain('superhero', use_match_index=False, cache_size=0)
+    domain.db.execute("DELETE FROM superhero WHERE name = 'Batman'")
+    domain.db.commit()
+    assert domain.find_info_about_entity('Batman', ['description']) == []
+
+
+def test_columnar_domain_returns_same_results():
+    """ Test functionality: the columnar domain returns the same entities and entity infos as
+        the SQL queries, for every value of every informable slot """
+    domain = JSONLookupDomain('superhero', use_match_index=False, cache_size=0)
+    columnar = ColumnarDomain('superhero')
+    for slot in domain.get_informable_slots():
+        for value in domain.get_possible_values(slot):
+            constraints = {slot: value.upper()}
+            assert columnar.find_entities(constraints, ['description']) == \
+                domain.find_entities(constraints, ['description'])
+    for name in ['Batman', 'batman', 'nobody']:
+        assert columnar.find_info_about_entity(name, []) == \
+            domain.find_info_about_entity(name, [])
+    with pytest.raises(sqlite3.OperationalError):
+        columnar.find_entities({'no_such_slot': 'x'})
+
+
+def test_columnar_domain_keeps_only_columns():
+    """ Test functionality: the columnar domain holds no database connection, except for the
+        read-only one query_db opens on first use """
+    domain = ColumnarDomain('superhero')
+    assert len(domain.find_entities({})) == domain.count_entities({}) > 0
+    assert 'db' not in domain.__dict__ and getattr(domain._readers, 'db', None) is None
+    assert domain.query_db('SELECT COUNT(*) AS num FROM superhero')[0]['num'] == \
+        domain.count_entities({})
+    with pytest.raises(sqlite3.OperationalError):
+        domain.query_db("DELETE FROM superhero")
+
+
+def test_columnar_domain_loads_columns_once_across_threads():
+    """ Test functionality: threads starting to query at the same time wait for one of them
+        to load the columns, and all of them get the complete results """
+    import threading
+    domain = ColumnarDomain('superhero')
+    expected = ColumnarDomain('superhero').find_entities({})
+    num_threads = 4
+    barrier = threading.Barrier(num_threads)
+    reads, results = [], []
+    read_table = domain._read_table
+
+    def counting_read_table():
+        reads.append(threading.current_thread())
+        return read_table()
+
+    domain._read_table = counting_read_table
+
+    def query():
+        barrier.wait()
+        results.append(domain.find_entities({}))
+
+    threads = [threading.Thread(target=query) for _ in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(reads) == 1
+    assert results == [expected] * num_threads
+
+
+def test_reload_swaps_in_new_database(tmp_path, domain_class):
+    """ Test functionality: reload loads the changed database file, which replaces the data
+        and caches at once with a new generation when it is committed; the cache is warm for
+        recent queries """
+    import shutil
+    db_file = tmp_path / 'superhero.db'
+    shutil.copy(os.path.join(get_root_dir(), 'resources', 'databases', 'superhero.db'), db_file)
+    domain = domain_class('superhero', sqllite_db_file=os.path.relpath(db_file, get_root_dir()))
+    constraints = {'main_superpower': 'Magic'}
+    before = domain.find_entities(constraints)
+    assert any(entity['name'] == 'Dr. Strange' for entity in before)
+
+    file_db = sqlite3.connect(str(db_file))
+    file_db.execute("DELETE FROM superhero WHERE name = 'Dr. Strange'")
+    file_db.commit()
+    file_db.close()
+    # unchanged until the reload
+    assert domain.find_entities(constraints) == before
+
+    # the reloaded database is staged until it is committed between turns
+    assert domain.reload().result() == 1
+    assert domain.has_staged_reload()
+    assert domain.generation == 0
+    assert domain.find_entities(constraints) == before
+
+    # dialogs querying during the swap get either the old or the new entities
+    import threading
+    results, done = [], threading.Event()
+
+    def query():
+        while not done.is_set():
+            results.append(domain.find_entities(constraints, ['description']))
+
+    threads = [threading.Thread(target=query) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    assert domain.commit_reload() == 1
+    assert not domain.has_staged_reload()
+    done.set()
+    for thread in threads:
+        thread.join()
+    assert domain.generation == 1
+    assert {len(result) for result in results} <= {len(before), len(before) - 1}
+    if isinstance(domain, JSONLookupDomain):
+        # the recent queries were repeated on the new database
+        hits = domain.result_cache.hits
+        after = domain.find_entities(constraints)
+        assert domain.result_cache.hits == hits + 1
+    else:
+        after = domain.find_entities(constraints)
+    assert len(after) == len(before) - 1
+    assert domain.count_entities(constraints) == len(after)
+
+
+def test_search_ranks_matching_descriptions():
+    """ Test functionality: search finds entities by words (and word prefixes) of their
+        descriptions, best match first, restricted by constraints """
+    domain = JSONLookupDomain('superhero')
+    assert domain.get_search_slots() == ['description']
+    names = [entity['name'] for entity in domain.search('fast')]
+    assert names[0] == 'The Flash'
+    assert set(domain.search('fast')[0]) == set(domain.find_entities({})[0])
+    assert [entity['name'] for entity in domain.search('telepath')] == ['Phoenix']
+    assert domain.search('telepath', prefix=False) == []
+    assert domain.search('TELEPATHY')[0]['name'] == 'Phoenix'
+    assert [entity['name'] for entity in domain.search('soldier fights', match_all=True)] \
+        == ['Captain America']
+    assert all(entity['loyalty'] == 'Justice League' for entity in
+               domain.search('fight', {'loyalty': 'justice league'},
+                             requested_slots=['loyalty']))
+    assert len(domain.search('the', limit=2)) == 2
+    # the arguments of the Domain interface, in its order
+    assert len(domain.search('the', {}, 3)) == 3
+    # FTS5 operators and SQL are searched for as words
+    assert 'The Flash' in [entity['name'] for entity in domain.search('NOT fast* "; DROP --')]
+    with pytest.raises(sqlite3.OperationalError):
+        domain.search('fast', slots=['name'])
+
+    unindexed = JSONLookupDomain('superhero', search_slots=[])
+    assert not unindexed.has_search_index() and domain.has_search_index()
+    with pytest.raises(sqlite3.OperationalError):
+        unindexed.search('fast')
+
+
+def test_search_index_of_read_only_and_reloaded_database(tmp_path):
+    """ Test functionality: the full-text index is built for read-only databases and again
+        on reload, and every thread can query it """
+    import shutil
+    import threading
+    db_file = tmp_path / 'superhero.db'
+    shutil.copy(os.path.join(get_root_dir(), 'resources', 'databases', 'superhero.db'), db_file)
+    domain = JSONLookupDomain('superhero', read_only=True,
+                              sqllite_db_file=os.path.relpath(db_file, get_root_dir()))
+    results = []
+    thread = threading.Thread(target=lambda: results.append(domain.search('surgeon')))
+    thread.start()
+    thread.join()
+    assert [entity['name'] for entity in results[0]] == ['Dr. Strange']
+
+    file_db = sqlite3.connect(str(db_file))
+    file_db.execute("UPDATE superhero SET description = 'A retired surgeon' "
+                    "WHERE name = 'Batman'")
+    file_db.commit()
+    file_db.close()
+    domain.reload(wait=True)
+    domain.commit_reload()
+    assert {entity['name'] for entity in domain.search('surgeon')} == {'Dr. Strange', 'Batman'}
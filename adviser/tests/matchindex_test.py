@@ -0,0 +1,142 @@
+import os
+import sys
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.append(get_root_dir())
+import shutil
+import sqlite3
+from utils.beliefstate import BeliefState
+from utils.domain.jsonlookupdomain import JSONLookupDomain
+from utils.domain.matchindex import EntityMatchIndex
+
+
+def test_count_matches_agrees_with_database(domain, constraintA):
+    """
+    Tests whether the index counts the same entities as a database query, ignoring the case
+    of the constrained value like the database does.
+
+    Args:
+        domain: Domain Object (given in conftest.py)
+        constraintA (dict): an existing slot-value pair in the domain (given in
+        conftest_<domain>.py)
+    """
+    index = EntityMatchIndex(domain)
+    constraints = {constraintA['slot']: constraintA['value'].upper()}
+    num_matches, _ = index.count_matches(constraints)
+    assert num_matches == len(domain.find_entities(constraints))
+    assert index.count_matches({})[0] == len(domain.find_entities({}))
+
+
+def test_added_constraint_narrows_cached_match(domain, constraintA, constraintB):
+    """
+    Tests whether the bitmap for an additional constraint is a subset of the cached bitmap
+    without it.
+
+    Args:
+        domain: Domain Object (given in conftest.py)
+        constraintA (dict): an existing slot-value pair in the domain (given in
+        conftest_<domain>.py)
+        constraintB (dict): another existing slot-value pair in the domain (given in
+        conftest_<domain>.py)
+    """
+    index = EntityMatchIndex(domain)
+    first = index.match({constraintA['slot']: constraintA['value']})
+    both = index.match({constraintA['slot']: constraintA['value'],
+                        constraintB['slot']: constraintB['value']})
+    assert ((both & first) == both).all()
+    assert index.count(both) == len(domain.find_entities(
+        {constraintA['slot']: constraintA['value'], constraintB['slot']: constraintB['value']}))
+
+
+def test_value_counts_of_matches(domain, constraintA, constraintB):
+    """
+    Tests whether the value distribution of a slot among the matches is counted correctly.
+
+    Args:
+        domain: Domain Object (given in conftest.py)
+        constraintA (dict): an existing slot-value pair in the domain (given in
+        conftest_<domain>.py)
+        constraintB (dict): another existing slot-value pair in the domain (given in
+        conftest_<domain>.py)
+    """
+    index = EntityMatchIndex(domain)
+    constraints = {constraintA['slot']: constraintA['value']}
+    counts = index.value_counts(index.match(constraints), constraintB['slot'])
+    entities = domain.find_entities(constraints, [constraintB['slot']])
+    assert sum(counts.values()) == len(entities)
+    for entity in entities:
+        assert counts[entity[constraintB['slot']]] > 0
+
+
+def test_find_entities_with_and_without_index_agree(constraintA, constraintB):
+    """
+    Tests whether find_entities returns the same entities with and without the bitmap index.
+
+    Args:
+        constraintA (dict): an existing slot-value pair in the domain (given in
+        conftest_<domain>.py)
+        constraintB (dict): another existing slot-value pair in the domain (given in
+        conftest_<domain>.py)
+    """
+    constraints = {constraintA['slot']: constraintA['value'].lower(),
+                   constraintB['slot']: constraintB['value']}
+    indexed = JSONLookupDomain('superhero', use_match_index=True).find_entities(constraints)
+    scanned = JSONLookupDomain('superhero', use_match_index=False).find_entities(constraints)
+    assert sorted(entity['name'] for entity in indexed) == \
+        sorted(entity['name'] for entity in scanned)
+
+
+def test_single_match_is_not_discriminable(domain, primkey_constraint):
+    """
+    Tests whether a constraint on the primary key results in one non-discriminable match.
+
+    Args:
+        domain: Domain Object (given in conftest.py)
+        primkey_constraint (dict): primary key of an existing entity (given in
+        conftest_<domain>.py)
+    """
+    index = EntityMatchIndex(domain)
+    assert index.count_matches({primkey_constraint['slot']: primkey_constraint['value']}) \
+        == (1, False)
+
+
+class ScanningDomain(JSONLookupDomain):
+    """ A domain overriding find_entities, for which the belief state counts the matches with
+        the database instead of the match index """
+
+    def find_entities(self, constraints: dict, requested_slots=iter(())):
+        return super(ScanningDomain, self).find_entities(constraints, requested_slots)
+
+
+def test_index_and_database_agree_on_discriminable_matches(tmp_path):
+    """
+    Tests whether the belief state gets the same number of matches and discriminable flag from
+    the match index and from the database, which both consider the primary key: entities only
+    differing in their primary key are discriminable.
+    """
+    db_file = tmp_path / 'superhero.db'
+    shutil.copy(os.path.join(get_root_dir(), 'resources', 'databases', 'superhero.db'), db_file)
+    db = sqlite3.connect(str(db_file))
+    db.execute("INSERT INTO superhero SELECT 'Batman Beyond', primary_uniform_color, "
+               "main_superpower, last_known_location, loyalty, description, real_name "
+               "FROM superhero WHERE name = 'Batman'")
+    db.commit()
+    db.close()
+    db_file = os.path.relpath(db_file, get_root_dir())
+    batman = {'loyalty': 'He works best alone', 'main_superpower': 'Gadgets',
+              'primary_uniform_color': 'Black'}
+    for informs, expected in [(batman, (2, True)),
+                              ({'loyalty': 'He works best alone'}, None),
+                              ({}, None)]:
+        results = []
+        for domain in [JSONLookupDomain('superhero', sqllite_db_file=db_file),
+                       ScanningDomain('superhero', sqllite_db_file=db_file)]:
+            beliefstate = BeliefState(domain)
+            for slot, value in informs.items():
+                beliefstate['informs'][slot] = {value: 1.0}
+            results.append(beliefstate.get_num_dbmatches())
+        assert results[0] == results[1]
+        if expected:
+            assert results[0] == expected
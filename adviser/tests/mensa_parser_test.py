@@ -0,0 +1,122 @@
+import os
+import sys
+import datetime
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.append(get_root_dir())
+import pytest
+import requests
+from examples.webapi.mensa.parser import MensaParser, DishType
+
+
+MENU_HTML = """<html><body><div>
+<div class="gruppenkopf"><div class="gruppenname">MAIN DISH</div></div>
+<div class="splMeal">
+<div><span>Pasta of {date}</span></div><div></div><div><div></div></div>
+<div><div>2,50 &#8364; | 4,50 &#8364;<br/></div><div><img title="vegan"/></div></div>
+</div>
+</div></body></html>"""
+
+
+@pytest.fixture
+def mensa_stand_in():
+    """ Runs a local stand-in for the mensa website during a test; yields its URL, the list
+        of dates requested from it and the HTTP status it responds with """
+    requested = []
+    stand_in = SimpleNamespace(url=None, requested=requested, status=200)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            data = parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode())
+            requested.append(data['date'][0])
+            if stand_in.status == 200:
+                body = MENU_HTML.format(date=data['date'][0]).encode('utf-8')
+            else:
+                body = b'<html><body>Maintenance</body></html>'
+            self.send_response(stand_in.status)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05},
+                              daemon=True)
+    thread.start()
+    stand_in.url = 'http://127.0.0.1:{}/'.format(server.server_address[1])
+    yield stand_in
+    server.shutdown()
+    server.server_close()
+
+
+def test_meals_are_cached_until_ttl(mensa_stand_in):
+    """ Test functionality: the meals of a date are parsed once within the ttl """
+    url, requested = mensa_stand_in.url, mensa_stand_in.requested
+    parser = MensaParser(ttl=0.2, url=url)
+    meals = parser.get_meals('2020-01-06')
+    assert meals[0].name == 'Pasta of 2020-01-06' and meals[0].vegan
+    assert meals[0].dish_type == DishType.MainDish and meals[0].prices == (2.5, 4.5)
+    assert parser.get_meals('2020-01-06') is meals
+    assert requested == ['2020-01-06']
+    parser.get_meals('2020-01-06', use_cache=False)
+    time.sleep(0.25)
+    parser.get_meals('2020-01-06')
+    assert requested == ['2020-01-06'] * 3
+
+
+def test_cache_is_persisted(mensa_stand_in, tmp_path):
+    """ Test functionality: a parser loads the unexpired meals cached by a previous one """
+    url, requested = mensa_stand_in.url, mensa_stand_in.requested
+    cache_file = str(tmp_path / 'mensa.pickle')
+    MensaParser(url=url, cache_file=cache_file).get_meals('2020-01-06')
+    meals = MensaParser(url=url, cache_file=cache_file).get_meals('2020-01-06')
+    assert meals[0].name == 'Pasta of 2020-01-06'
+    assert requested == ['2020-01-06']
+    time.sleep(0.1)
+    MensaParser(url=url, cache_file=cache_file, ttl=0.05).get_meals('2020-01-06')
+    assert requested == ['2020-01-06'] * 2
+
+
+def test_prefetch_caches_current_and_next_week(mensa_stand_in):
+    """ Test functionality: the background prefetch parses the menus from today until the end
+        of next week, so that they are answered from the cache """
+    url, requested = mensa_stand_in.url, mensa_stand_in.requested
+    parser = MensaParser(url=url, prefetch=True)
+    today = datetime.date.today()
+    num_days = 14 - today.weekday()
+    deadline = time.monotonic() + 5
+    while len(requested) < num_days and time.monotonic() < deadline:
+        time.sleep(0.01)
+    parser.stop_prefetch()
+    assert sorted(requested) == [str(today + datetime.timedelta(days=day))
+                                 for day in range(num_days)]
+    assert parser.get_meals('tomorrow')[0].name == 'Pasta of {}'.format(
+        today + datetime.timedelta(days=1))
+    assert len(requested) == num_days
+
+
+def test_failed_responses_are_not_cached(mensa_stand_in, tmp_path):
+    """ Test functionality: an error response raises an error and is neither cached nor
+        persisted, so the menu is requested again """
+    url, requested = mensa_stand_in.url, mensa_stand_in.requested
+    cache_file = str(tmp_path / 'mensa.pickle')
+    parser = MensaParser(url=url, cache_file=cache_file)
+    mensa_stand_in.status = 500
+    with pytest.raises(requests.HTTPError):
+        parser.get_meals('2020-01-06')
+    parser.prefetch([datetime.date(2020, 1, 6)])
+    assert not os.path.exists(cache_file)
+    mensa_stand_in.status = 200
+    assert parser.get_meals('2020-01-06')[0].name == 'Pasta of 2020-01-06'
+    assert requested == ['2020-01-06'] * 3
@@ -234,4 +234,73 @@ def test_initializing_language_is_english_by_default(nlu):
 	"""
 	nlu._initialize()
 	assert nlu.language == Language.ENGLISH
-	assert nlu.language != Language.GERMAN
\ No newline at end of file
+	assert nlu.language != Language.GERMAN
+
+
+def test_rule_sets_are_shared(domain):
+	"""
+
+	Tests whether two NLU instances of the same domain use the same loaded rules
+
+	Args:
+		domain: Domain Object (given in conftest.py)
+
+	"""
+	nlu_a = HandcraftedNLU(domain)
+	nlu_b = HandcraftedNLU(domain)
+	assert nlu_a.rule_set is nlu_b.rule_set
+
+
+
+def test_switch_language():
+	"""
+
+	Tests whether the language can be switched between turns without reloading rules
+
+	"""
+	lecturers = JSONLookupDomain('ImsLecturers')
+	nlu = HandcraftedNLU(lecturers, languages=[Language.ENGLISH, Language.GERMAN])
+	english_rules = nlu.rule_sets[Language.ENGLISH]
+	german_rules = nlu.rule_sets[Language.GERMAN]
+
+	nlu.set_language(Language.GERMAN)
+	assert nlu.language == Language.GERMAN
+	assert nlu.rule_set is german_rules
+	nlu.set_language(Language.ENGLISH)
+	assert nlu.rule_set is english_rules
+	assert nlu.general_regex is english_rules.general_regex
+
+
+
+def test_repeated_utterance_is_memoized(nlu):
+	"""
+
+	Tests whether a repeated utterance is answered from the cache with equal user acts
+
+	Args:
+		nlu: NLU Object (given in conftest.py)
+
+	"""
+	first = nlu.extract_user_acts(user_utterance="thanks")['user_acts']
+	second = nlu.extract_user_acts(user_utterance="thanks ")['user_acts']
+	assert first == second
+	assert first[0] is not second[0]
+	assert nlu.cache.hits == 1
+
+
+
+def test_memoization_depends_on_last_sys_act(nlu):
+	"""
+
+	Tests whether the same utterance is evaluated again after a different system act
+
+	Args:
+		nlu: NLU Object (given in conftest.py)
+
+	"""
+	nlu.extract_user_acts(user_utterance="yes")
+	nlu.sys_act_info['last_act'] = SysAct(act_type=SysActionType.Confirm,
+	                                      slot_values={"primary_uniform_color": ["Red"]})
+	user_acts = nlu.extract_user_acts(user_utterance="yes")['user_acts']
+	assert nlu.cache.hits == 0
+	assert user_acts[0].slot == "primary_uniform_color"
@@ -0,0 +1,54 @@
+import os
+import sys
+import pytest
+
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.append(get_root_dir())
+from services.nlu.regex_guard import RegexGuard, is_suspicious
+
+
+def test_suspicious_patterns():
+    """
+    Tests whether nested quantifiers and wildcard lookaheads are considered suspicious.
+    """
+    assert is_suspicious("((a|aa)+)+$")
+    assert is_suspicious("(?=.*(thank))(?=^(?:(?!bye).)*$).*$")
+    assert not is_suspicious("(\\b|^| )(hi|hello|howdy|hey)(\\b|$| )")
+
+
+def test_profiling_records_rules():
+    """
+    Tests whether the match time of every searched rule is recorded in profiling mode.
+    """
+    guard = RegexGuard(profile=True)
+    assert guard.search(('general', 'hello'), "(hi|hello)", "Hello there")
+    assert guard.search(('general', 'bye'), "(bye)", "Hello there") is None
+    assert set(guard.stats) == {('general', 'hello'), ('general', 'bye')}
+    assert guard.stats[('general', 'hello')].calls == 1
+    assert 'general/hello' in guard.report()
+
+
+def test_time_budget_interrupts_rule():
+    """
+    Tests whether a catastrophically backtracking rule is interrupted, flagged and treated as
+    not matching.
+    """
+    pytest.importorskip("regex")
+    guard = RegexGuard(time_budget=0.01)
+    rule_id = ('inform', 'slot', 'value')
+    guard.register(rule_id, "((a|aa)+)+$")
+    assert rule_id in guard.guarded_rules
+    assert guard.search(rule_id, "((a|aa)+)+$", "a" * 40 + "!") is None
+    assert rule_id in guard.flagged_rules
+
+
+def test_nlu_without_guard_matches(nlu):
+    """
+    Tests whether the NLU still matches rules when neither profiling nor a budget is set.
+    """
+    assert not nlu.regex_guard.active
+    usr_utt = nlu.extract_user_acts(user_utterance="hello")
+    assert len(usr_utt['user_acts']) == 1
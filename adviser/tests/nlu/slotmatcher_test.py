@@ -0,0 +1,61 @@
+import os
+import sys
+import pytest
+
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.append(get_root_dir())
+from utils.useract import UserActionType, UserAct
+from utils.domain.jsonlookupdomain import JSONLookupDomain
+from services.nlu.nlu import HandcraftedNLU
+from services.nlu.slotmatcher import SlotValueMatcher
+
+
+@pytest.fixture
+def courses_matcher():
+    return SlotValueMatcher(JSONLookupDomain('ImsCourses'))
+
+
+def test_binary_slot_mention(courses_matcher):
+    """
+    Tests whether the name of a binary slot is recognized as value 'true'.
+    """
+    mentions = courses_matcher.find_mentions("I am interested in Machine Learning")
+    assert ('machine_learning', 'true', False) in mentions
+
+
+def test_negated_binary_slot_mention(courses_matcher):
+    """
+    Tests whether a negated mention of a binary slot is recognized as value 'false' and the
+    negation does not carry over to the next clause.
+    """
+    mentions = courses_matcher.find_mentions("I don't want statistics but deep learning")
+    assert ('statistics', 'false', True) in mentions
+    assert ('deep_learning', 'true', False) in mentions
+
+
+def test_longest_phrase_wins(domain):
+    """
+    Tests whether a multi word value is matched as a whole.
+
+    Args:
+        domain: Domain Object (given in conftest.py)
+    """
+    matcher = SlotValueMatcher(domain)
+    mentions = matcher.find_mentions("is it someone from the guardians of the galaxy")
+    assert mentions == [('loyalty', 'Guardians of the Galaxy', False)]
+
+
+def test_nlu_with_index_matcher(domain):
+    """
+    Tests whether the NLU creates inform acts from the index matcher.
+
+    Args:
+        domain: Domain Object (given in conftest.py)
+    """
+    nlu = HandcraftedNLU(domain, inform_matcher='index')
+    user_acts = nlu.extract_user_acts(user_utterance="I want a hero with a red uniform")['user_acts']
+    assert UserAct(act_type=UserActionType.Inform, slot='primary_uniform_color',
+                   value='Red') in user_acts
@@ -7,6 +7,7 @@ def get_root_dir():
 
 
 sys.path.append(get_root_dir())
+from services.bst import HandcraftedBST
 from utils import SysAct, SysActionType, UserActionType
 
 
@@ -991,4 +992,23 @@ def test_convert_inform_by_constraints_without_results(policy, beliefstate):
     sys_act = SysAct()
     policy._convert_inform_by_constraints([], sys_act, beliefstate)
     assert sys_act.type == SysActionType.InformByName
-    assert 'none' in sys_act.slot_values[primkey]
\ No newline at end of file
+    assert 'none' in sys_act.slot_values[primkey]
+
+def test_delta_without_base_is_answered(policy, domain):
+    """
+    Tests whether a policy receiving a belief state delta without knowing the previous turn
+    asks the user to repeat and requests a snapshot from the BST, instead of not answering.
+
+    Args:
+        policy: Policy Object (given in conftest.py)
+        domain: Domain Object (given in conftest.py)
+    """
+    bst = HandcraftedBST(domain, publish_deltas=True)
+    bst.update_bst(None)
+    result = policy.choose_sys_act(bst.update_bst(None)['beliefstate'])
+    assert result['sys_act'].type == SysActionType.Bad
+    assert result['sys_state']['last_act'] == result['sys_act']
+    assert result['snapshot_request']
+    bst.request_snapshot(result['snapshot_request'])
+    result = execute_choose_sys_act(policy, bst.update_bst(None)['beliefstate'])
+    assert result['sys_act'].type == SysActionType.Welcome
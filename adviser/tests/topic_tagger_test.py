@@ -0,0 +1,45 @@
+import os
+import sys
+import re
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.append(get_root_dir())
+from utils.topic_tagger import TopicTagger, tag_texts
+
+
+TOPICS = ['machine', 'machine_learning', 'learning', 'earn', 'language', 'neural_networks']
+
+
+def regex_flags(fields, topics):
+    """ The flags as found by searching for each topic in each field """
+    return ['true' if any(field and re.search(topic.replace('_', ' ').lower(), field.lower())
+                          for field in fields) else 'false'
+            for topic in topics]
+
+
+def test_overlapping_topics_are_found():
+    """ Test functionality: topics overlapping or contained in each other are all found """
+    tagger = TopicTagger(TOPICS)
+    assert tagger.tag(['Introduction to Machine Learning']) == \
+        ['true', 'true', 'true', 'true', 'false', 'false']
+
+
+def test_topics_do_not_span_fields():
+    """ Test functionality: a topic has to occur within one field """
+    tagger = TopicTagger(TOPICS)
+    assert tagger.tag(['Neural', 'networks']) == ['false'] * len(TOPICS)
+    assert tagger.tag([None, 'neural networks']) == regex_flags([None, 'neural networks'],
+                                                                TOPICS)
+
+
+def test_tagging_agrees_with_regex_search():
+    """ Test functionality: the flags equal those of a regex search per topic and field,
+        whether the texts are tagged in the calling process or in a pool """
+    texts = [['Deep Learning', 'Neural networks for language', None],
+             ['Machine translation', '', 'learnings'],
+             ['Databases', 'SQL', 'Query languages']] * 5
+    expected = [regex_flags(fields, TOPICS) for fields in texts]
+    assert tag_texts(texts, TOPICS, processes=1) == expected
+    assert tag_texts(texts, TOPICS, processes=2, chunksize=4) == expected
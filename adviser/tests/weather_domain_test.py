@@ -0,0 +1,64 @@
+import os
+import sys
+import locale
+import threading
+import time
+from datetime import datetime, timedelta
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.append(get_root_dir())
+import pytest
+import requests
+try:
+    from examples.webapi.weather.domain import WeatherDomain
+except locale.Error:
+    # the weather NLG imported with the example sets the en_GB.UTF-8 locale
+    pytest.skip("the weather example needs the en_GB.UTF-8 locale", allow_module_level=True)
+
+
+def temperature(domain: WeatherDomain, location: str, date: datetime) -> int:
+    return domain.find_entities({'location': location, 'date': date})[0]['temperature']
+
+
+def test_forecasts_are_cached_per_location(weather_stand_in):
+    """ Test functionality: one request caches the forecasts of a location for all dates;
+        each date gets the forecast closest to it """
+    domain = WeatherDomain(base_url=weather_stand_in.url)
+    now = datetime.now()
+    assert temperature(domain, 'Stuttgart', now + timedelta(hours=7)) in (12, 13)
+    assert temperature(domain, 'stuttgart ', now + timedelta(days=1)) in (18, 19)
+    # after the last forecast, the last one is the closest
+    assert temperature(domain, 'Stuttgart', now + timedelta(days=30)) == 49
+    assert weather_stand_in.requests == ['Stuttgart']
+    assert temperature(domain, 'Berlin', now) in (10, 11)
+    assert weather_stand_in.requests == ['Stuttgart', 'Berlin']
+
+
+def test_cached_forecasts_expire(weather_stand_in):
+    """ Test functionality: forecasts are requested again after the cache ttl; unknown
+        locations raise an error """
+    domain = WeatherDomain(base_url=weather_stand_in.url, cache_ttl=0.05)
+    temperature(domain, 'Stuttgart', datetime.now())
+    time.sleep(0.1)
+    temperature(domain, 'Stuttgart', datetime.now())
+    assert weather_stand_in.requests == ['Stuttgart'] * 2
+    with pytest.raises(requests.HTTPError):
+        domain.find_entities({'location': 'Atlantis', 'date': datetime.now()})
+
+
+def test_concurrent_lookups_are_coalesced(weather_stand_in):
+    """ Test functionality: concurrent lookups of the same location wait for one request """
+    domain = WeatherDomain(base_url=weather_stand_in.url)
+    weather_stand_in.delay = 0.2
+    results = []
+    threads = [threading.Thread(target=lambda hours=hours: results.append(
+        temperature(domain, 'Stuttgart', datetime.now() + timedelta(hours=hours))))
+        for hours in range(0, 30, 3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 10
+    assert weather_stand_in.requests == ['Stuttgart']
@@ -0,0 +1,80 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""
+This script compares the lookup times of the SQLite backed JSONLookupDomain and the NumPy
+backed ColumnarDomain on the database of a domain.
+
+For every value of every informable slot, the entities with this value are searched
+(find_entities) and the information about the first of them is looked up
+(find_info_about_entity). The result cache of the JSONLookupDomain is disabled (the
+ColumnarDomain has none).
+
+Usage:
+python benchmark_domains.py ImsCourses --repeat 3
+"""
+
+import argparse
+import os
+import sys
+import time
+
+head_location = os.path.abspath(os.path.join(os.path.abspath(__file__), '..', '..'))  # main folder of adviser
+sys.path.append(head_location)
+
+from utils.domain.columnardomain import ColumnarDomain
+from utils.domain.jsonlookupdomain import JSONLookupDomain
+
+
+def run_lookups(domain: JSONLookupDomain, queries: list) -> float:
+    """ Runs the lookups for the queries and returns the elapsed time in seconds """
+    start = time.perf_counter()
+    for slot, value in queries:
+        entities = domain.find_entities({slot: value})
+        if entities:
+            domain.find_info_about_entity(entities[0][domain.get_primary_key()], [])
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("domain", help="name of the domain")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs per domain class")
+    args = parser.parse_args()
+
+    domains = {}
+    for create_domain in (lambda: JSONLookupDomain(args.domain, use_match_index=False,
+                                                   cache_size=0),
+                          lambda: ColumnarDomain(args.domain)):
+        start = time.perf_counter()
+        domain = create_domain()
+        # the columns of the columnar domain are loaded on first use
+        domain.count_entities({})
+        name = type(domain).__name__
+        print("{:<18} loaded in {:8.3f}s".format(name, time.perf_counter() - start))
+        domains[name] = domain
+
+    reference = domains[JSONLookupDomain.__name__]
+    queries = [(slot, value) for slot in reference.get_informable_slots()
+               for value in reference.get_possible_values(slot)]
+    print("{} lookups".format(len(queries)))
+    for name, domain in domains.items():
+        elapsed = min(run_lookups(domain, queries) for _ in range(args.repeat))
+        print("{:<18} {:8.3f}s ({:.1f} µs per lookup)".format(
+            name, elapsed, elapsed / max(len(queries), 1) * 1e6))
@@ -0,0 +1,56 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""
+This script runs a corpus of user utterances through the handcrafted NLU of a domain and
+reports the regular expressions with the highest match times.
+
+Usage:
+python profile_nlu_regexes.py superhero corpus.txt --top 20
+
+The corpus file contains one user utterance per line.
+"""
+
+import argparse
+import os
+import sys
+
+head_location = os.path.abspath(os.path.join(os.path.abspath(__file__), '..', '..'))  # main folder of adviser
+sys.path.append(head_location)
+
+from services.nlu.nlu import HandcraftedNLU
+from utils.domain.jsonlookupdomain import JSONLookupDomain
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("domain", help="name of the domain")
+    parser.add_argument("corpus", help="path to a text file with one user utterance per line")
+    parser.add_argument("--top", type=int, default=10, help="number of rules to report")
+    parser.add_argument("--budget", type=float, default=None,
+                        help="time budget per rule in seconds; rules exceeding it are flagged")
+    args = parser.parse_args()
+
+    nlu = HandcraftedNLU(JSONLookupDomain(args.domain), profile_regexes=True,
+                         regex_time_budget=args.budget)
+    with open(args.corpus, 'r', encoding='utf-8') as corpus:
+        for line in corpus:
+            if line.strip():
+                nlu.extract_user_acts(user_utterance=line)
+    print(nlu.regex_report(args.top))
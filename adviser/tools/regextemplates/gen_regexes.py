@@ -18,8 +18,12 @@
 ###############################################################################
 
 import argparse
+import hashlib
 import os
+import sqlite3
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Tuple
 
 head_location = os.path.abspath(os.path.join(os.path.abspath(__file__), '..', '..', '..')) # main folder of adviser
 sys.path.append(head_location)
@@ -32,35 +36,243 @@ from utils.useract import UserAct, UserActionType
 from tools.regextemplates.rules.regexfile import RegexFile
 
 
-def _write_dict_to_file(dict_object: dict, filename: str):
-    file_path = os.path.join(head_location, 'resources', 'nlu_regexes', filename)
-    with open(file_path, 'w', encoding='utf-8') as file:
+# template of the worker process (see _init_worker)
+_worker_template: RegexFile = None
+
+
+def _get_file_path(filename: str, output_dir: str = None) -> str:
+    return os.path.join(output_dir or os.path.join(head_location, 'resources', 'nlu_regexes'),
+                        filename)
+
+
+def _write_dict_to_file(dict_object: dict, filename: str, output_dir: str = None):
+    with open(_get_file_path(filename, output_dir), 'w', encoding='utf-8') as file:
         json.dump(dict_object, file, sort_keys=True)
 
 
-def _create_request_json(domain: JSONLookupDomainLarge, template: RegexFile):
-    request_regex_json = {}
-    for slot in domain.get_requestable_slots():
-        request_act = UserAct(act_type=UserActionType.Request, slot=slot)
-        request_regex_json[slot] = template.create_regex(request_act)
-    return request_regex_json
+def _stream_entries_to_file(entries: Iterable[Tuple[str, object]], filename: str,
+                            output_dir: str = None):
+    """ Writes (key, value) pairs as a JSON object one entry at a time, so the generated rules
+        never have to be held in memory all at once. The result is identical to json.dump
+        with sort_keys=True if the entries are sorted by key.
+        The file is only replaced after all entries were written. """
+    file_path = _get_file_path(filename, output_dir)
+    with open(file_path + '.tmp', 'w', encoding='utf-8') as file:
+        file.write('{')
+        for idx, (key, value) in enumerate(entries):
+            if idx > 0:
+                file.write(', ')
+            file.write(json.dumps(key) + ': ' + json.dumps(value, sort_keys=True))
+        file.write('}')
+    os.replace(file_path + '.tmp', file_path)
+
+
+def _load_previous_rules(filename: str, output_dir: str = None) -> dict:
+    file_path = _get_file_path(filename, output_dir)
+    if not os.path.isfile(file_path):
+        return {}
+    with open(file_path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def _hash_file(filename: str) -> str:
+    sha = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _hash_values(values: Iterable[str]) -> str:
+    """ Returns the hash of the possible values of a slot """
+    return hashlib.sha256(json.dumps(sorted(values)).encode('utf-8')).hexdigest()
+
+
+def _hash_column(domain: JSONLookupDomain, column: str) -> str:
+    """ Returns the hash of a database column (the value of each entity, with its primary key),
+        or None if the database has no such column """
+    try:
+        if column not in domain.get_table_columns():
+            return None
+        query = 'SELECT {}, {} FROM {} ORDER BY rowid'.format(
+            JSONLookupDomain._quote(domain.get_primary_key()), JSONLookupDomain._quote(column),
+            JSONLookupDomain._quote(domain.get_domain_name()))
+        rows = domain.query_db(query)
+    except sqlite3.OperationalError:
+        return None
+    sha = hashlib.sha256()
+    for row in rows:
+        sha.update(json.dumps(list(row.values())).encode('utf-8'))
+    return sha.hexdigest()
+
+
+def _create_request_regex(template: RegexFile, slot: str) -> str:
+    request_act = UserAct(act_type=UserActionType.Request, slot=slot)
+    return template.create_regex(request_act)
+
+
+def _create_inform_regexes(template: RegexFile, slot: str,
+                           values: Iterable[str]) -> Dict[str, str]:
+    inform_regexes = {}
+    for value in values:
+        inform_act = UserAct(act_type=UserActionType.Inform, slot=slot, value=value)
+        inform_regexes[value] = template.create_regex(inform_act)
+    return inform_regexes
+
+
+def _render(template: RegexFile, create_rules, *args) -> Tuple[object, List[str]]:
+    """ Creates rules with create_rules(template, *args) and returns them together with the
+        names of the database columns the template read for them (member expressions like
+        {name.real_name}) """
+    template.global_memory.accessed_attributes = set()
+    rules = create_rules(template, *args)
+    return rules, sorted(template.global_memory.accessed_attributes)
 
 
-def _create_inform_json(domain: JSONLookupDomainLarge, template: RegexFile):
-    inform_regex_json = {}
-    for slot in domain.get_informable_slots():
-        inform_regex_json[slot] = {}
-        for value in domain.get_possible_values(slot):
-            inform_act = UserAct(act_type=UserActionType.Inform, slot=slot, value=value)
-            inform_regex_json[slot][value] = template.create_regex(inform_act)
-    return inform_regex_json
+def _init_worker(domain: JSONLookupDomain, template_filename: str):
+    # every worker process parses the template on its own; the domain reloads its database
+    # lazily on the first query since the connection is not pickled
+    global _worker_template
+    _worker_template = RegexFile(template_filename, domain)
 
 
-def create_json_from_template(domain: JSONLookupDomainLarge, template_filename: str):
-    template = RegexFile(template_filename, domain)
+def _worker_request(slot: str) -> Tuple[str, List[str]]:
+    return _render(_worker_template, _create_request_regex, slot)
+
+
+def _worker_inform(slot: str, values: Iterable[str]) -> Tuple[Dict[str, str], List[str]]:
+    return _render(_worker_template, _create_inform_regexes, slot, values)
+
+
+class _Deferred:
+    """ Stand-in for a future when generating without worker processes: the rules are only
+        created when the result is written, so they never pile up in memory. """
+
+    def __init__(self, function, *args):
+        self._function = function
+        self._args = args
+
+    def result(self):
+        return self._function(*self._args)
+
+
+def create_json_from_template(domain: JSONLookupDomainLarge, template_filename: str,
+                              workers: int = 1, incremental: bool = True,
+                              output_dir: str = None):
+    """ Generates the request and inform rule files of a domain from a regex template.
+
+    Args:
+        domain (JSONLookupDomainLarge): the domain to create the rules for
+        template_filename (str): path to the .nlu template
+        workers (int): number of processes generating the rules of different slots in parallel
+        incremental (bool): if True and the template did not change since the last run, the
+                            rules of each slot are copied from the existing files unless the
+                            database columns they read changed, and only rules for new slots
+                            and values are created
+        output_dir (str): folder of the rule files (default: resources/nlu_regexes)
+    """
     domain_name = domain.get_domain_name()
-    _write_dict_to_file(_create_request_json(domain, template), f'{domain_name}RequestRules.json')
-    _write_dict_to_file(_create_inform_json(domain, template), f'{domain_name}InformRules.json')
+    request_filename = f'{domain_name}RequestRules.json'
+    inform_filename = f'{domain_name}InformRules.json'
+    manifest_filename = f'{domain_name}RulesManifest.json'
+
+    # the manifest of the existing rules records what the rules of each slot were generated
+    # from: the template, the values of the slot and the database columns the rules read
+    template_hash = _hash_file(template_filename)
+    previous = _load_previous_rules(manifest_filename, output_dir) if incremental else {}
+    if previous.get('template') != template_hash or 'informs' not in previous:
+        # another template (or a manifest of an older version): nothing can be reused
+        previous = {}
+    previous_requests = _load_previous_rules(request_filename, output_dir) if previous else {}
+    previous_informs = _load_previous_rules(inform_filename, output_dir) if previous else {}
+    column_hashes = {}
+
+    def column_hash(column: str) -> str:
+        if column not in column_hashes:
+            column_hashes[column] = _hash_column(domain, column)
+        return column_hashes[column]
+
+    def reusable(entry: dict) -> bool:
+        # the rules of a slot are reusable if the database columns they read did not change
+        return entry is not None and all(previous['columns'].get(column) == column_hash(column)
+                                          for column in entry['columns'])
+
+    # database columns read by the rules of each slot
+    request_columns: Dict[str, List[str]] = {}
+    missing_requests = []
+    for slot in sorted(domain.get_requestable_slots()):
+        entry = previous.get('requests', {}).get(slot)
+        if slot in previous_requests and reusable(entry):
+            request_columns[slot] = entry['columns']
+        else:
+            missing_requests.append(slot)
+    inform_columns: Dict[str, List[str]] = {}
+    known_informs, missing_informs = {}, {}
+    for slot in sorted(domain.get_informable_slots()):
+        values = domain.get_possible_values(slot)
+        entry = previous.get('informs', {}).get(slot)
+        known = previous_informs.get(slot, {}) if reusable(entry) else {}
+        known_informs[slot] = known
+        inform_columns[slot] = entry['columns'] if known else []
+        if known and entry['values'] == _hash_values(values):
+            # same values as before, all rules exist
+            missing_informs[slot] = []
+        else:
+            missing_informs[slot] = [value for value in values if value not in known]
+
+    executor = None
+    if not missing_requests and not any(missing_informs.values()):
+        # nothing changed, not even the template has to be parsed
+        submit = None
+    elif workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                       initargs=(domain, template_filename))
+        submit = executor.submit
+    else:
+        _init_worker(domain, template_filename)
+        submit = _Deferred
+
+    try:
+        # submit all jobs first, so the workers are busy while the results are written in order
+        request_jobs = {slot: submit(_worker_request, slot) for slot in missing_requests}
+        inform_jobs = {slot: submit(_worker_inform, slot, missing) if missing else None
+                       for slot, missing in missing_informs.items()}
+
+        def request_entries():
+            for slot in sorted(domain.get_requestable_slots()):
+                if slot in request_jobs:
+                    regex, request_columns[slot] = request_jobs[slot].result()
+                    yield slot, regex
+                else:
+                    yield slot, previous_requests[slot]
+
+        def inform_entries():
+            for slot, job in inform_jobs.items():
+                known = known_informs[slot]
+                regexes = {value: known[value] for value in domain.get_possible_values(slot)
+                           if value in known}
+                if job is not None:
+                    new_regexes, columns = job.result()
+                    regexes.update(new_regexes)
+                    inform_columns[slot] = sorted(set(inform_columns[slot]) | set(columns))
+                yield slot, regexes
+
+        _stream_entries_to_file(request_entries(), request_filename, output_dir)
+        _stream_entries_to_file(inform_entries(), inform_filename, output_dir)
+        columns = {column for slot_columns in list(request_columns.values()) +
+                   list(inform_columns.values()) for column in slot_columns}
+        manifest = {
+            'template': template_hash,
+            'columns': {column: column_hash(column) for column in sorted(columns)},
+            'requests': {slot: {'columns': columns}
+                         for slot, columns in sorted(request_columns.items())},
+            'informs': {slot: {'values': _hash_values(domain.get_possible_values(slot)),
+                               'columns': columns}
+                        for slot, columns in sorted(inform_columns.items())}}
+        _write_dict_to_file(manifest, manifest_filename, output_dir)
+    finally:
+        if executor is not None:
+            executor.shutdown()
 
 
 if __name__ == '__main__':
@@ -68,7 +280,12 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("domain", help="name of the domain")
     parser.add_argument("filename", help="name of your .nlu file without the .nlu ending (e.g.: resources/nlu_regexes/YOURNLUFILE.nlu -> provide YOURFILE)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes generating rules in parallel")
+    parser.add_argument("--full", action="store_true",
+                        help="regenerate all rules, even those whose template, values and "
+                             "database columns are unchanged")
     args = parser.parse_args()
     nlu_file = os.path.join(head_location, 'resources', 'nlu_regexes', f"{args.filename}.nlu")
     dom = JSONLookupDomainLarge(args.domain)
-    create_json_from_template(dom, nlu_file)
+    create_json_from_template(dom, nlu_file, workers=args.workers, incremental=not args.full)
@@ -75,13 +75,15 @@ class GlobalMemory(Memory):
     def __init__(self, domain: JSONLookupDomain):
         Memory.__init__(self, None)
         self.domain = domain
+        # names of the entity attributes read from the database, i.e. the columns the created
+        # rules depend on (reset by the caller)
+        self.accessed_attributes = set()
     
     def get_member(self, primary_key_value: str, attribute_name: str) -> str:
-        primary_key_name = self.domain.get_primary_key()
-        table_name = self.domain.get_domain_name()
-        query_result = self.domain.query_db(
-            f'SELECT {attribute_name} FROM {table_name} '
-            f'WHERE {primary_key_name} = \'{primary_key_value}\'')
+        self.accessed_attributes.add(attribute_name)
+        # the domain caches the results of repeated lookups
+        query_result = self.domain.find_info_about_entity(primary_key_value,
+                                                          {attribute_name: None})
         if not query_result:
             raise ValueError(f"Couldn't find an entry for primary key {primary_key_value}.")
         return query_result[0][attribute_name]
@@ -0,0 +1,279 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+""" This module provides NumPy array backed stores for the informs and requests of a belief
+    state, which can be used like the dictionaries they replace. """
+
+import threading
+from collections.abc import MutableMapping
+from typing import Dict
+
+import numpy as np
+
+from utils.domain.jsonlookupdomain import JSONLookupDomain
+
+
+class BeliefIndex:
+    """
+    Fixed positions of the informable slots and values and of the requestable slots of a
+    domain, in the order used for the state vector of the RL policies.
+
+    The informs are stored in one array with a segment for each informable slot (sorted by
+    name). A segment starts with the **NONE** entry, which is 1.0 while the slot has not been
+    mentioned, followed by the possible values of the slot and 'dontcare'.
+    """
+
+    def __init__(self, domain: JSONLookupDomain):
+        """
+        Args:
+            domain (JSONLookupDomain): the domain whose ontology is indexed
+        """
+        self.informable_slots = sorted(domain.get_informable_slots())
+        self.slot_offsets: Dict[str, int] = {}
+        self.slot_ends: Dict[str, int] = {}
+        self.value_positions: Dict[str, Dict[str, int]] = {}
+        size = 0
+        for slot in self.informable_slots:
+            self.slot_offsets[slot] = size
+            positions = {}
+            for value in list(domain.get_possible_values(slot)) + ['dontcare']:
+                size += 1
+                positions.setdefault(value, size)
+            self.value_positions[slot] = positions
+            size += 1
+            self.slot_ends[slot] = size
+        self.informs_size = size
+        self.requestable_slots = sorted(domain.get_requestable_slots())
+        self.request_positions = {slot: idx for idx, slot in enumerate(self.requestable_slots)}
+
+
+_indices: Dict[str, BeliefIndex] = {}
+_indices_lock = threading.Lock()
+
+
+def load_belief_index(domain: JSONLookupDomain) -> BeliefIndex:
+    """ Returns the belief index of a domain, creating it only once per process
+
+    Args:
+        domain (JSONLookupDomain): the domain whose ontology is indexed
+    """
+    with _indices_lock:
+        if domain.get_domain_name() not in _indices:
+            _indices[domain.get_domain_name()] = BeliefIndex(domain)
+        return _indices[domain.get_domain_name()]
+
+
+class _SlotBeliefs(MutableMapping):
+    """ Dict-style view {value: probability} on the beliefs of one slot in an ArrayInforms """
+
+    def __init__(self, informs: 'ArrayInforms', slot: str):
+        self._informs = informs
+        self._slot = slot
+        self._positions = informs.index.value_positions[slot]
+
+    def __getitem__(self, value):
+        pos = self._positions.get(value)
+        if pos is None:
+            return self._informs.extra_values[self._slot][value]
+        if not self._informs.value_mask[pos]:
+            raise KeyError(value)
+        return float(self._informs.probs[pos])
+
+    def __setitem__(self, value, prob):
+        pos = self._positions.get(value)
+        if pos is None:
+            self._informs.extra_values.setdefault(self._slot, {})[value] = prob
+        else:
+            self._informs.probs[pos] = prob
+            self._informs.value_mask[pos] = True
+
+    def __delitem__(self, value):
+        pos = self._positions.get(value)
+        if pos is None:
+            del self._informs.extra_values[self._slot][value]
+        elif self._informs.value_mask[pos]:
+            self._informs.probs[pos] = 0.0
+            self._informs.value_mask[pos] = False
+        else:
+            raise KeyError(value)
+
+    def __iter__(self):
+        for value, pos in self._positions.items():
+            if self._informs.value_mask[pos]:
+                yield value
+        yield from self._informs.extra_values.get(self._slot, {})
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class ArrayInforms(MutableMapping):
+    """
+    The informs of a turn ({slot: {value: probability}}) stored in a NumPy array at the
+    positions given by a BeliefIndex.
+
+    Slots and values unknown to the ontology are kept in plain dictionaries and are not part of
+    the state vector, just like they are ignored when vectorizing the dictionary informs.
+    """
+
+    def __init__(self, index: BeliefIndex, informs: dict = None):
+        """
+        Args:
+            index (BeliefIndex): positions of the slots and values
+            informs (dict): initial {slot: {value: probability}}
+        """
+        self.index = index
+        self.probs = np.zeros(index.informs_size)
+        self.value_mask = np.zeros(index.informs_size, dtype=bool)
+        # the **NONE** entry of every slot is set while the slot is not mentioned
+        self.probs[list(index.slot_offsets.values())] = 1.0
+        self.extra_values: Dict[str, dict] = {}
+        self.extra_slots: Dict[str, dict] = {}
+        for slot, values in (informs or {}).items():
+            self[slot] = values
+
+    def __getitem__(self, slot):
+        if slot in self.index.slot_offsets:
+            if self.probs[self.index.slot_offsets[slot]]:
+                raise KeyError(slot)
+            return _SlotBeliefs(self, slot)
+        return self.extra_slots[slot]
+
+    def __setitem__(self, slot, values):
+        if slot not in self.index.slot_offsets:
+            self.extra_slots[slot] = values
+            return
+        values = dict(values)
+        self._clear(slot)
+        self.probs[self.index.slot_offsets[slot]] = 0.0
+        beliefs = _SlotBeliefs(self, slot)
+        for value, prob in values.items():
+            beliefs[value] = prob
+
+    def __delitem__(self, slot):
+        if slot not in self.index.slot_offsets:
+            del self.extra_slots[slot]
+        elif self.probs[self.index.slot_offsets[slot]]:
+            raise KeyError(slot)
+        else:
+            self._clear(slot)
+            self.probs[self.index.slot_offsets[slot]] = 1.0
+
+    def _clear(self, slot):
+        start, end = self.index.slot_offsets[slot] + 1, self.index.slot_ends[slot]
+        self.probs[start:end] = 0.0
+        self.value_mask[start:end] = False
+        self.extra_values.pop(slot, None)
+
+    def __contains__(self, slot):
+        if slot in self.index.slot_offsets:
+            return not self.probs[self.index.slot_offsets[slot]]
+        return slot in self.extra_slots
+
+    def __iter__(self):
+        for slot, offset in self.index.slot_offsets.items():
+            if not self.probs[offset]:
+                yield slot
+        yield from self.extra_slots
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr({slot: dict(values) for slot, values in self.items()})
+
+    def copy(self) -> 'ArrayInforms':
+        """ Returns an independent copy (copying the arrays, not the index) """
+        informs = ArrayInforms.__new__(ArrayInforms)
+        informs.index = self.index
+        informs.probs = self.probs.copy()
+        informs.value_mask = self.value_mask.copy()
+        informs.extra_values = {slot: dict(values) for slot, values in self.extra_values.items()}
+        informs.extra_slots = {slot: dict(values) for slot, values in self.extra_slots.items()}
+        return informs
+
+
+class ArrayRequests(MutableMapping):
+    """
+    The requests of a turn ({slot: score}) stored in NumPy arrays at the positions of the
+    requestable slots given by a BeliefIndex; `flags` holds 1.0 for each requested slot.
+    """
+
+    def __init__(self, index: BeliefIndex, requests: dict = None):
+        """
+        Args:
+            index (BeliefIndex): positions of the requestable slots
+            requests (dict): initial {slot: score}
+        """
+        self.index = index
+        self.flags = np.zeros(len(index.requestable_slots))
+        self.scores = np.zeros(len(index.requestable_slots))
+        self.extra_slots = {}
+        for slot, score in (requests or {}).items():
+            self[slot] = score
+
+    def __getitem__(self, slot):
+        pos = self.index.request_positions.get(slot)
+        if pos is None:
+            return self.extra_slots[slot]
+        if not self.flags[pos]:
+            raise KeyError(slot)
+        return float(self.scores[pos])
+
+    def __setitem__(self, slot, score):
+        pos = self.index.request_positions.get(slot)
+        if pos is None:
+            self.extra_slots[slot] = score
+        else:
+            self.flags[pos] = 1.0
+            self.scores[pos] = score
+
+    def __delitem__(self, slot):
+        pos = self.index.request_positions.get(slot)
+        if pos is None:
+            del self.extra_slots[slot]
+        elif not self.flags[pos]:
+            raise KeyError(slot)
+        else:
+            self.flags[pos] = 0.0
+            self.scores[pos] = 0.0
+
+    def __iter__(self):
+        for slot, pos in self.index.request_positions.items():
+            if self.flags[pos]:
+                yield slot
+        yield from self.extra_slots
+
+    def __len__(self):
+        return int(self.flags.sum()) + len(self.extra_slots)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def copy(self) -> 'ArrayRequests':
+        """ Returns an independent copy (copying the arrays, not the index) """
+        requests = ArrayRequests.__new__(ArrayRequests)
+        requests.index = self.index
+        requests.flags = self.flags.copy()
+        requests.scores = self.scores.copy()
+        requests.extra_slots = dict(self.extra_slots)
+        return requests
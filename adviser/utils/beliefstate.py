@@ -19,9 +19,63 @@
 
 """ This module provides the BeliefState class. """
 
-import copy
+import uuid
+from typing import Dict
 
+from utils.beliefarrays import ArrayInforms, ArrayRequests, load_belief_index
 from utils.domain.jsonlookupdomain import JSONLookupDomain
+from utils.domain.matchindex import load_match_index
+
+
+class _CopyOnWriteInforms(dict):
+    """
+    The informs of a turn: {slot: {value: probability}}.
+
+    A new turn starts with the value dicts of the previous turn instead of copies of them.
+    A value dict is only copied once it is accessed by index in the new turn (which all
+    modifications like `informs[slot][value] = prob` do), so unchanged slots are shared between
+    the turns of the history. Pickling the whole history thus stores each shared dict once.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._private = set()
+
+    def __getitem__(self, slot):
+        values = super().__getitem__(slot)
+        if slot not in self._private:
+            # first access in this turn: detach from the previous turns
+            values = dict(values)
+            super().__setitem__(slot, values)
+            self._private.add(slot)
+        return values
+
+    def get(self, slot, default=None):
+        return self[slot] if slot in self else default
+
+    def __setitem__(self, slot, values):
+        super().__setitem__(slot, values)
+        self._private.add(slot)
+
+    def __delitem__(self, slot):
+        super().__delitem__(slot)
+        self._private.discard(slot)
+
+    def __reduce__(self):
+        # after unpickling/copying, the value dicts are treated as shared again
+        return type(self), (dict(self),)
+
+
+def _peek(informs, slot):
+    """ Returns the beliefs of a slot without detaching them from the previous turns """
+    return dict.get(informs, slot) if isinstance(informs, dict) else informs.get(slot)
+
+
+def _next_turn_informs(informs):
+    """ Returns the informs a new turn starts with """
+    if isinstance(informs, ArrayInforms):
+        return informs.copy()
+    return _CopyOnWriteInforms(informs)
 
 
 class BeliefState:
@@ -35,10 +89,30 @@ class BeliefState:
         * number of db matches for given constraints
         * if the db matches can further be split
 
+    Unchanged informs are shared between the turns of the history instead of being copied.
+    If `history_size` is set, only the most recent turns are kept, so memory usage and the
+    size of the published belief state do not grow with the length of the dialog.
+    If `compact` is set, the informs and requests of each turn are stored in NumPy arrays at
+    fixed positions of the domain's ontology (see utils/beliefarrays.py); they can still be
+    used like dictionaries, and the RL policies slice their state vector directly from them.
+
     """
-    def __init__(self, domain: JSONLookupDomain):
+    def __init__(self, domain: JSONLookupDomain, history_size: int = None,
+                 compact: bool = False):
+        """
+        Args:
+            domain (JSONLookupDomain): the domain of the dialog
+            history_size (int): maximum number of turns kept in the history, including the
+                                current one (None: keep all turns)
+            compact (bool): store informs and requests in arrays indexed by the ontology
+        """
         self.domain = domain
+        self.history_size = history_size
+        self.compact = compact
         self._history = [self._init_beliefstate()]
+        # identifies this belief state (i.e. dialog) and counts its turns for delta publication
+        self.stream_id = uuid.uuid4().hex
+        self.num_turns = 1
 
     def __getitem__(self, val):  # for indexing
         # if used with numbers: int (e.g. state[-2]) or slice (e.g. state[3:6])
@@ -54,6 +128,10 @@ class BeliefState:
 
     def __setitem__(self, key, val):
         # e.g. state['beliefs']['area']['west'] = 1.0
+        if self.compact and key == 'informs' and not isinstance(val, ArrayInforms):
+            val = ArrayInforms(load_belief_index(self.domain), val)
+        elif self.compact and key == 'requests' and not isinstance(val, ArrayRequests):
+            val = ArrayRequests(load_belief_index(self.domain), val)
         self._history[-1][key] = val
 
     def __len__(self):
@@ -88,8 +166,78 @@ class BeliefState:
         to ensure the correct history can be accessed correctly by other modules
         """
 
-        # copy last turn's dict
-        self._history.append(copy.deepcopy(self._history[-1]))
+        # copy last turn's dict, sharing everything that has not been changed yet
+        last_turn = self._history[-1]
+        turn = dict(last_turn)
+        turn['informs'] = _next_turn_informs(last_turn['informs'])
+        turn['requests'] = last_turn['requests'].copy()
+        turn['user_acts'] = set(last_turn['user_acts'])
+        self._history.append(turn)
+        self.num_turns += 1
+        if self.history_size is not None and len(self._history) > self.history_size:
+            del self._history[:len(self._history) - self.history_size]
+
+    def make_delta(self, snapshot: bool = False) -> 'BeliefStateDelta':
+        """ Returns the changes of the current turn compared to the previous one
+
+        Args:
+            snapshot (bool): if True (or if the previous turn is no longer in the history), the
+                             delta carries the complete belief state instead of the changes
+
+        Returns:
+            (BeliefStateDelta): message to be published instead of the full belief state
+        """
+        if snapshot or len(self._history) < 2:
+            # the tracker keeps extending its history, the snapshot must not change with it
+            return BeliefStateDelta(self.stream_id, self.num_turns,
+                                    snapshot=self._with_history(list(self._history),
+                                                                self.num_turns))
+
+        previous, current = self._history[-2], self._history[-1]
+        changes = {key: value for key, value in current.items()
+                   if key != 'informs' and previous.get(key) != value}
+        prev_informs, informs = previous['informs'], current['informs']
+        # _peek/items do not detach the value dicts shared with the previous turn
+        changed_informs = {slot: dict(values) for slot, values in informs.items()
+                           if _peek(prev_informs, slot) != values}
+        removed_informs = [slot for slot in prev_informs if slot not in informs]
+        return BeliefStateDelta(self.stream_id, self.num_turns, changes=changes,
+                                informs=changed_informs, removed_informs=removed_informs)
+
+    def apply_delta(self, delta: 'BeliefStateDelta') -> 'BeliefState':
+        """ Returns a new belief state with the turn described by delta appended to the history
+
+        The history of this belief state is not modified, unchanged parts are shared between
+        both belief states.
+
+        Args:
+            delta (BeliefStateDelta): the changes of the turn following the current one
+        """
+        turn = dict(self._history[-1])
+        turn.update(delta.changes)
+        informs = _next_turn_informs(self._history[-1]['informs'])
+        for slot in delta.removed_informs:
+            if slot in informs:
+                del informs[slot]
+        for slot, values in delta.informs.items():
+            informs[slot] = values
+        turn['informs'] = informs
+
+        history = self._history + [turn]
+        if self.history_size is not None and len(history) > self.history_size:
+            del history[:len(history) - self.history_size]
+        return self._with_history(history, delta.turn)
+
+    def _with_history(self, history: list, num_turns: int) -> 'BeliefState':
+        """ Returns a belief state of the same dialog with the given history """
+        state = BeliefState.__new__(BeliefState)
+        state.domain = self.domain
+        state.history_size = self.history_size
+        state.compact = self.compact
+        state.stream_id = self.stream_id
+        state.num_turns = num_turns
+        state._history = history
+        return state
 
     def _init_beliefstate(self):
         """Initializes the belief state based on the currently active domain
@@ -101,9 +249,14 @@ class BeliefState:
         """
 
         # TODO: revist when we include probabilites, sets should become dictionaries
+        if self.compact:
+            index = load_belief_index(self.domain)
+            informs, requests = ArrayInforms(index), ArrayRequests(index)
+        else:
+            informs, requests = _CopyOnWriteInforms(), {}
         belief_state = {"user_acts": set(),
-                        "informs": {},
-                        "requests": {},
+                        "informs": informs,
+                        "requests": requests,
                         "num_matches": 0,
                         "discriminable": True}
 
@@ -171,9 +324,10 @@ class BeliefState:
 
         candidates = {}
         informs = self._history[turn_idx]["informs"]
-        for slot in informs:
+        # iterating over the items does not detach the value dicts from the previous turns
+        for slot, slot_beliefs in informs.items():
             # sort by belief
-            sorted_slot_cands = sorted(informs[slot].items(), key=lambda kv: kv[1], reverse=True)
+            sorted_slot_cands = sorted(slot_beliefs.items(), key=lambda kv: kv[1], reverse=True)
             # restrict result count to specified maximum
             filtered_slot_cands = sorted_slot_cands[:max_results]
             # threshold by probabilities
@@ -216,6 +370,14 @@ class BeliefState:
         candidates = self.get_most_probable_inf_beliefs(consider_NONE=True, threshold=0.7,
                                                         max_results=1)
         constraints = self._remove_dontcare_slots(candidates)
+        if isinstance(self.domain, JSONLookupDomain) and \
+                type(self.domain).find_entities is JSONLookupDomain.find_entities:
+            # count with the domain's in-memory index instead of fetching all matching rows
+            match_index = load_match_index(self.domain)
+            if match_index.can_answer(constraints):
+                dontcare_slots = set(candidates.keys()) - set(constraints.keys())
+                return match_index.count_matches(constraints, ignore_slots=dontcare_slots)
+
         db_matches = self.domain.find_entities(constraints, self.domain.get_informable_slots())
         num_matches = len(db_matches)
 
@@ -237,3 +399,90 @@ class BeliefState:
                         discriminable = True
                         break
         return num_matches, discriminable
+
+
+class BeliefStateDelta:
+    """
+    The changes of one turn of a belief state, published by the belief state tracker instead of
+    the whole BeliefState object with its history.
+
+    A delta either carries the complete belief state (a snapshot, published at the begin of a
+    dialog and periodically so that services joining late can catch up) or only the top-level
+    entries and inform slots that changed since the previous turn.
+    Use a BeliefStateReceiver to turn the received deltas back into BeliefState objects.
+    """
+
+    def __init__(self, stream_id: str, turn: int, snapshot: BeliefState = None,
+                 changes: dict = None, informs: dict = None, removed_informs: list = None):
+        """
+        Args:
+            stream_id (str): id of the belief state the delta belongs to
+            turn (int): number of the turn the delta describes (counted from the dialog start)
+            snapshot (BeliefState): the complete belief state, if this delta is a snapshot
+            changes (dict): changed top-level entries except the informs, e.g. {'requests': {}}
+            informs (dict): slots whose beliefs changed, with their new {value: probability}
+            removed_informs (list): slots no longer contained in the informs
+        """
+        self.stream_id = stream_id
+        self.turn = turn
+        self.snapshot = snapshot
+        self.changes = changes or {}
+        self.informs = informs or {}
+        self.removed_informs = removed_informs or []
+
+    @property
+    def is_snapshot(self) -> bool:
+        return self.snapshot is not None
+
+    def __repr__(self):
+        if self.is_snapshot:
+            return "BeliefStateDelta(turn={}, snapshot)".format(self.turn)
+        return "BeliefStateDelta(turn={}, changes={}, informs={}, removed_informs={})".format(
+            self.turn, self.changes, self.informs, self.removed_informs)
+
+
+class BeliefStateReceiver:
+    """
+    Reconstructs the belief state from the messages published on the "beliefstate" topic.
+
+    Full BeliefState objects are passed through unchanged, so services using a receiver work
+    with belief state trackers publishing either deltas or full belief states.
+    """
+
+    def __init__(self, logger=None):
+        """
+        Args:
+            logger (DiasysLogger): logger used to report deltas that could not be applied
+        """
+        self.logger = logger
+        self._states: Dict[str, BeliefState] = {}
+
+    def receive(self, message) -> BeliefState:
+        """ Returns the belief state described by a message on the "beliefstate" topic
+
+        Args:
+            message (Union[BeliefState, BeliefStateDelta]): the received message
+
+        Returns:
+            (BeliefState): the current belief state, or None if message is a delta whose
+                           preceding turn was not received (e.g. after joining a running
+                           dialog); in this case the receiver waits for the next snapshot,
+                           which the subscriber can request from the BST by publishing on
+                           the "snapshot_request" topic
+        """
+        if not isinstance(message, BeliefStateDelta):
+            return message
+        if message.is_snapshot:
+            state = message.snapshot
+        else:
+            base = self._states.get(message.stream_id)
+            if base is None or base.num_turns != message.turn - 1:
+                if self.logger:
+                    self.logger.warning("Missing base for belief state delta of turn {}, "
+                                        "waiting for snapshot".format(message.turn))
+                self._states.pop(message.stream_id, None)
+                return None
+            state = base.apply_delta(message)
+        # only the current dialog is kept
+        self._states = {message.stream_id: state}
+        return state
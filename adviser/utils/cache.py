@@ -0,0 +1,107 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+""" This module provides a thread-safe LRU cache with optional expiry of entries. """
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class LRUCache:
+    """
+    A size-bounded cache which evicts the least recently used entry first.
+
+    Entries can additionally expire after a fixed time to live. Hits and misses are counted,
+    so the effectiveness of the cache can be monitored via `hit_rate` or `stats()`.
+    All operations are safe to be called from the receiver threads of several services.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = None):
+        """
+        Args:
+            max_size (int): maximum number of entries (0 disables the cache)
+            ttl (float): time to live of an entry in seconds (None: entries never expire)
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """ Returns the value cached for key, or default if there is no (unexpired) entry """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any):
+        """ Stores value for key, evicting the least recently used entry if the cache is full """
+        if self.max_size <= 0:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        """ Removes the entry for key, if present """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """ Removes all entries (the hit and miss counters are kept) """
+        with self._lock:
+            self._entries.clear()
+
+    def keys(self) -> list:
+        """ Returns the keys of all entries, from the least to the most recently used """
+        with self._lock:
+            return list(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and (entry[1] is None or entry[1] > time.monotonic())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        """ Fraction of lookups that were answered from the cache """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        """ Returns size, hit and miss counts and the hit rate of the cache """
+        return {'size': len(self._entries), 'max_size': self.max_size, 'hits': self.hits,
+                'misses': self.misses, 'hit_rate': self.hit_rate}
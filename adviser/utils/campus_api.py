@@ -1,10 +1,29 @@
-from typing import Union
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
 import requests
+import urllib3
+from requests.adapters import HTTPAdapter
 from lxml import etree
 from loguru import logger
 
+from utils.cache import LRUCache
+
 
 BASE_URL = "https://campus.uni-stuttgart.de/cusonline/ee/rest/slc.tm.cp/student/courses"
+# seconds to wait for the connection and for the response
+DEFAULT_TIMEOUT = (3.05, 5.0)
+# responses with these status codes are retried (rate limit and temporary server errors)
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+# errors of a request which are retried: failed connections, timeouts and connections which
+# break off while the body is downloaded (the body is read from the raw stream, so the errors
+# are raised by urllib3, and a cut off document can also end in an XML syntax error)
+_TRANSIENT_ERRORS = (requests.ConnectionError, requests.Timeout,
+                     requests.exceptions.ChunkedEncodingError, urllib3.exceptions.HTTPError,
+                     etree.XMLSyntaxError)
+# number of pages of the course list downloaded concurrently by iter_courses
+_PAGE_WORKERS = 4
 
 
 class CampusApi:
@@ -17,9 +36,39 @@ class CampusApi:
     can just keep calling get_next_batch_of_courses()-method until it returns None.
 
     The API returns parsed lxml types (https://lxml.de/tutorial.html#the-parse-function).
+
+    All requests share one HTTP session, so connections are kept alive and reused, and time
+    out after `timeout`; failed requests are retried with exponential backoff. Responses are
+    parsed while they are downloaded, within the retried request, so a connection which
+    breaks off in the middle of a response is retried as well. Courses queried by id are
+    cached: within `cache_ttl` seconds the cached course is returned, within further
+    `stale_ttl` seconds the cached course is returned while it is fetched again in the
+    background (stale-while-revalidate).
+
+    To download the whole catalog, `iter_courses` downloads the courses concurrently and
+    yields them as they arrive.
     """
 
-    def __init__(self, step=25) -> None:
+    def __init__(self, step=25, base_url: str = BASE_URL, timeout=DEFAULT_TIMEOUT,
+                 pool_size: int = 10, cache_ttl: float = 300, stale_ttl: float = 3600,
+                 cache_size: int = 1024, max_wait: float = 2.0, retries: int = 2,
+                 backoff: float = 0.5) -> None:
+        """
+        Args:
+            step (int): number of courses per batch
+            base_url (str): URL of the courses resource
+            timeout (float or tuple): timeout of a request in seconds, or a tuple of the
+                                      connect and the read timeout
+            pool_size (int): maximum number of kept-alive connections and of requests running
+                             in the background
+            cache_ttl (float): seconds a course is returned from the cache without refreshing
+            stale_ttl (float): further seconds a cached course is returned while it is refreshed
+            cache_size (int): maximum number of cached courses
+            max_wait (float): seconds get_course_by_id waits for a course which is not cached
+            retries (int): number of times a failed request is repeated
+            backoff (float): seconds to wait before the first repetition, doubled for each
+                             further one
+        """
         if step >= 100:
             logger.info("Step size must be < 100. Reducing it to 50. Continuing...")
             step = 50
@@ -29,11 +78,184 @@ class CampusApi:
         self.top = step
         self.total_courses = None
         self.finished = False
-    
-    @classmethod
-    def get_course_by_id(cls, id) -> etree._Element:
-        r = requests.get(BASE_URL + f"/{id}")
-        return etree.fromstring(r.content)
+
+        self.base_url = base_url
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.cache_ttl = cache_ttl
+        self.stale_ttl = stale_ttl
+        self.cache_size = cache_size
+        self.max_wait = max_wait
+        self.retries = retries
+        self.backoff = backoff
+        self._init_connections()
+
+    def _init_connections(self):
+        """ Creates the HTTP session, the background workers and the course cache """
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=self.pool_size,
+                                            thread_name_prefix='campus-api')
+        # entries are (time of download, course), kept until they are too old to be served
+        self._courses = LRUCache(max_size=self.cache_size, ttl=self.cache_ttl + self.stale_ttl)
+        self._pending: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # sessions, threads and locks cannot be pickled; they are created anew on unpickling
+        state = self.__dict__.copy()
+        for attribute in ('session', '_executor', '_courses', '_pending', '_lock'):
+            state.pop(attribute, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_connections()
+
+    def close(self):
+        """ Closes the kept-alive connections and stops the background workers """
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+    def _get(self, url: str, read: Callable[[requests.Response], Any], headers: dict = None):
+        """ Sends a GET request and reads the streamed body of the response with read,
+            retrying both on connection errors, timeouts (also while the body is downloaded)
+            and temporary server errors
+
+        Args:
+            url (str): URL to request
+            read (Callable): function reading the response, called once per attempt
+            headers (dict): additional request headers
+
+        Returns:
+            the result of read for the first successful attempt
+
+        Raises:
+            requests.RequestException: if the request of the last attempt fails
+            urllib3.exceptions.HTTPError, lxml.etree.XMLSyntaxError: if the body of the last
+                                                                    attempt is cut off
+        """
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            try:
+                with self.session.get(url, timeout=self.timeout, stream=True,
+                                      headers=headers) as response:
+                    if response.status_code not in _RETRY_STATUS or last_attempt:
+                        response.raise_for_status()
+                        return read(response)
+            except _TRANSIENT_ERRORS as error:
+                if last_attempt:
+                    raise
+                logger.debug(f"Request of {url} failed: {error!r}. Retrying...")
+            time.sleep(self.backoff * 2 ** attempt)
+
+    @staticmethod
+    def _iterparse(response: requests.Response):
+        """ Parses a streamed response while it is downloaded
+
+        Returns:
+            the root element and an iterator over the ('end', element) events
+        """
+        response.raw.decode_content = True
+        events = etree.iterparse(response.raw, events=('start', 'end'))
+        _, root = next(events)
+        return root, ((event, element) for event, element in events if event == 'end')
+
+    def download_course(self, id) -> etree._Element:
+        """ Downloads a course, without using the cache """
+        return self.download_course_if_modified(id)[0]
+
+    def download_course_if_modified(self, id, etag: str = None, last_modified: str = None) \
+            -> Tuple[Optional[etree._Element], Optional[str], Optional[str]]:
+        """ Downloads a course unless it was not modified since the download which returned
+            etag and last_modified (HTTP conditional request)
+
+        Returns:
+            the course (None if it was not modified) and the ETag and Last-Modified markers
+            of its current version (None if the server does not send them)
+        """
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        def read(response):
+            if response.status_code == 304:
+                return None, etag, last_modified
+            root, events = self._iterparse(response)
+            for _ in events:
+                pass
+            return root, response.headers.get('ETag'), response.headers.get('Last-Modified')
+
+        return self._get(self.base_url + f"/{id}", read, headers)
+
+    def download_course_ids(self, skip: int, top: int) -> Tuple[List[int], int]:
+        """ Downloads a page of the course list
+
+        The list is parsed while it is downloaded, and each entry is discarded once its id
+        is read.
+
+        Returns:
+            the ids of the courses on the page and the total number of courses
+        """
+
+        def read(response):
+            ids, total = [], None
+            root, events = self._iterparse(response)
+            for _, element in events:
+                if element.getparent() is not root:
+                    continue
+                if total is None and element is root[0]:
+                    total = self._get_total_number_of_courses(root)
+                elif element.tag == "resource":
+                    ids += self._get_course_ids_from_batch([element])
+                    root.remove(element)
+            return ids, total
+
+        return self._get(self.base_url + f"?$skip={skip}&$top={top}", read)
+
+    def fetch_course(self, id) -> etree._Element:
+        """ Downloads a course (bypassing the cache, but updating it) """
+        course = self.download_course(id)
+        self._courses.put(id, (time.monotonic(), course))
+        return course
+
+    def _refresh(self, id) -> Future:
+        """ Downloads a course in the background, unless it is already being downloaded """
+        with self._lock:
+            future = self._pending.get(id)
+            if future is not None:
+                return future
+            future = self._executor.submit(self.fetch_course, id)
+            self._pending[id] = future
+        # outside of the lock, since the callback runs immediately if the future is done
+        future.add_done_callback(lambda _: self._done(id))
+        return future
+
+    def _done(self, id):
+        with self._lock:
+            future = self._pending.pop(id, None)
+        if future is not None and future.exception() is not None:
+            logger.debug(f"Refreshing course {id} failed: {future.exception()}")
+
+    def get_course_by_id(self, id) -> etree._Element:
+        """
+        Returns a course, from the cache if possible (see class description).
+
+        A course which is not cached is downloaded in the background; if it does not arrive
+        within `max_wait` seconds, a concurrent.futures.TimeoutError is raised and the course
+        is cached as soon as it arrives.
+        """
+        entry = self._courses.get(id)
+        if entry is not None:
+            fetched, course = entry
+            if time.monotonic() - fetched > self.cache_ttl:
+                self._refresh(id)
+            return course
+        return self._refresh(id).result(timeout=self.max_wait)
 
     def get_next_batch_of_courses(self) -> Union[list, None]:
         """
@@ -44,16 +266,12 @@ class CampusApi:
         if self.finished:
             return None
 
-        rval = []
-
-        r = requests.get(BASE_URL + f"?$skip={self.skip}&$top={self.top}")
-        root = etree.fromstring(r.content)
-        ids = self._get_course_ids_from_batch(root.findall("resource"))
-        for id in ids:
-            rval.append(self.get_course_by_id(id))
+        ids, total = self.download_course_ids(self.skip, self.top)
+        # download the courses of the batch concurrently
+        rval = list(self._executor.map(self.download_course, ids))
 
         if not self.total_courses:
-            self.total_courses = self._get_total_number_of_courses(root)
+            self.total_courses = total
 
         self.skip += self.step
         if self.skip > self.total_courses and self.total_courses is not None:
@@ -61,6 +279,68 @@ class CampusApi:
 
         return rval
 
+    def iter_courses(self, parse: Callable[[etree._Element], Any] = None,
+                     workers: int = None) -> Iterator[Any]:
+        """
+        Downloads all courses concurrently and yields them as they arrive (not in the order
+        of the catalog).
+
+        The pages of the course list are downloaded in the background while the courses are
+        downloaded (and parsed) by a pool of workers; the pages are only processed as far as
+        the workers keep up. Courses which cannot be downloaded are logged and skipped.
+
+        Args:
+            parse (Callable): function applied to each downloaded course by the worker, e.g.
+                              `campus_sql.get_course_info` (default: yield the lxml elements)
+            workers (int): number of concurrent downloads (default: pool_size)
+
+        Returns:
+            (Iterator): the parsed courses
+        """
+        workers = workers or self.pool_size
+
+        def download(id):
+            course = self.download_course(id)
+            return parse(course) if parse is not None else course
+
+        def finished(futures):
+            for future in futures:
+                if future.exception() is not None:
+                    logger.warning(f"Downloading course {futures[future]} failed: "
+                                   f"{future.exception()}. Continuing...")
+                else:
+                    yield future.result()
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='campus-api-ingest') \
+                as pool, ThreadPoolExecutor(max_workers=_PAGE_WORKERS) as page_pool:
+            pending = {}
+            for page_ids in self._course_id_pages(page_pool):
+                for id in page_ids:
+                    pending[pool.submit(download, id)] = id
+                # yield the courses which have arrived, waiting while the pool is busy
+                while pending:
+                    done, _ = wait(pending, timeout=None if len(pending) > 2 * workers else 0,
+                                   return_when=FIRST_COMPLETED)
+                    if not done:
+                        break
+                    yield from finished({future: pending.pop(future) for future in done})
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from finished({future: pending.pop(future) for future in done})
+
+    def _course_id_pages(self, page_pool: ThreadPoolExecutor) -> Iterator[List[int]]:
+        """ Yields the course ids of each page of the course list; the pages after the first
+            one are downloaded in the background by page_pool """
+        ids, total = self.download_course_ids(0, self.step)
+        yield ids
+        yield from page_pool.map(lambda skip: self.download_course_ids(skip, self.step)[0],
+                                 range(self.step, total or 0, self.step))
+
+    def download_all_course_ids(self) -> List[int]:
+        """ Returns the ids of all courses in the catalog """
+        with ThreadPoolExecutor(max_workers=_PAGE_WORKERS) as page_pool:
+            return [id for ids in self._course_id_pages(page_pool) for id in ids]
+
     def _get_total_number_of_courses(self, root) -> int:
         return int(root[0].text)
 
@@ -78,7 +358,7 @@ class CampusApi:
 # example of how to use the api
 if __name__ == "__main__":
     # get a specific course by id
-    course_xml = CampusApi.get_course_by_id(266549)
+    course_xml = CampusApi().fetch_course(266549)
 
     # get all courses in batches
     api = CampusApi(5)
@@ -1,12 +1,20 @@
+import hashlib
+import json
 import os
 import re
 import pickle
-from typing import List
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import List, Tuple
 from tqdm import tqdm
 
 import sqlite3
 from lxml.etree import Element
-from campus_api import CampusApi
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # main folder of adviser
+from utils.campus_api import CampusApi
+from utils.topic_tagger import tag_texts
 from nltk.corpus import stopwords
 from collections import Counter
 
@@ -140,24 +148,19 @@ def get_course_info(xml: Element) -> Course:
     return course
 
 
-def get_topics_for_course(course: Course, topics: list) -> list:
-    values = []
-    for topic in topics:
-        values.append('true') if check_topic_exists(course, topic) else values.append('false')
-    assert len(topics) == len(values)
-    return values
-
+def search_fields(course: Course) -> list:
+    """ Returns the texts of a course which are searched for topics """
+    return [course.title, course.description, course.objective, course.prerequisite,
+            course.further_info, course.institution]
 
-def check_topic_exists(course: Course, topic: str) -> bool:
-    search_fields = [course.title, course.description, course.objective, course.prerequisite,
-                     course.further_info, course.institution]
-    for field in search_fields:
-        if field and re.search(topic.replace('_', ' ').lower(), field.lower()):
-            return True
-    return False
 
+def create_table(cursor, topics: list) -> list:
+    """ Creates the courses table with a column for each topic
 
-def create_table(topics: list):
+    Returns:
+        the topics for which a column could be added (topics which are no valid column
+        names are reported and skipped)
+    """
     sql = """CREATE TABLE IF NOT EXISTS campus_courses ( id INTEGER PRIMARY KEY,
                                                         title TEXT NOT NULL,
                                                         lecturers TEXT,
@@ -176,57 +179,177 @@ def create_table(topics: list):
                                                         )"""
 
     cursor.execute(sql)
-    connection.commit()  # commit changes
 
     # add topic columns into table
-    topic_count = 0
+    added_topics = []
     for topic in topics:
         try:
             cursor.execute('''ALTER TABLE campus_courses ADD COLUMN ''' + topic.lower() + ''' TEXT''')
-            connection.commit()  # commit changes
-            topic_count += 1
+            added_topics.append(topic)
         except sqlite3.OperationalError as e:
             print('Topic ERROR:', topic.lower())
-            print("count", topic_count)
+            print("count", len(added_topics))
             print(e)
-            pass
-
-
-def insert_course_to_db(course: Course) -> int:
-    columns = []  # list of column names with values to insert into the table
-    info = ()  # a set of corresponding values of the fields
-
-    course = course.to_dict()
-    for key, value in course.items():
-        if not value:  # if no info, then fill in with 'na'
-            value = 'na'
-
-        columns.append(key)
-        info += (value,)
+    return added_topics
 
-    data = ['?'] * len(info)  # placeholders in the sql string
-    sql = 'INSERT OR IGNORE INTO campus_courses (' + ','.join(columns) + ') VALUES (' + ','.join(data) + ')'
-    cursor.execute(sql, info)  # finally add values into the table
-    connection.commit()  # commit the changes
-    return cursor.lastrowid
 
-
-def insert_topics_to_course(course, topics, course_id):
-    values = get_topics_for_course(course, topics)
+def course_to_row(course: Course, topics: list, values: list) -> tuple:
+    """ Returns the values of a course for the columns of the table: its fields (see
+        Course.to_dict, 'na' if missing) followed by its topic flags """
     course.topics = topics
     course.values = values
-
-    mapping = course.topics_to_dict()
-    for topic, value in mapping.items():
-        sql = 'UPDATE campus_courses SET ' + topic + ' = ? WHERE id = ?'
-        cursor.execute(sql, (value, course_id))
-        connection.commit()
-
-
-def insert_data_to_db(courses: List[Course], topics):
-    for course in tqdm(courses):
-        course_id = insert_course_to_db(course)
-        insert_topics_to_course(course, topics, course_id)
+    return tuple(value if value else 'na' for value in course.to_dict().values()) + tuple(values)
+
+
+def write_courses(connection, courses: List[Course], topics: list, markers: dict = None,
+                  conflict: str = 'IGNORE'):
+    """ Writes the courses (with their topic flags) and their sync state, without committing
+
+    Args:
+        connection: connection to the courses database
+        courses (List[Course]): the courses to write
+        topics (list): the topics of the topic columns
+        markers (dict): ETag and Last-Modified markers per course id (see `sync_database`)
+        conflict (str): conflict resolution for courses which are already stored
+                        ('IGNORE' or 'REPLACE')
+    """
+    markers = markers or {}
+    # find the topics of all courses at once, in a pool of processes
+    flags = tag_texts([search_fields(course) for course in courses], topics)
+    columns = list(Course().to_dict()) + [topic.lower() for topic in topics]
+    sql = 'INSERT OR ' + conflict + ' INTO campus_courses (' + ','.join(columns) + \
+          ') VALUES (' + ','.join(['?'] * len(columns)) + ')'
+    connection.executemany(sql, (course_to_row(course, topics, values)
+                                 for course, values in zip(tqdm(courses), flags)))
+    connection.executemany(
+        'INSERT OR ' + conflict + ' INTO campus_courses_sync VALUES (?, ?, ?, ?)',
+        [(int(course.id), content_hash(course)) + markers.get(int(course.id), (None, None))
+         for course in courses])
+
+
+def insert_data_to_db(connection, courses: List[Course], topics: list):
+    """ Inserts the courses (with their topic flags) in a single transaction """
+    with connection:
+        write_courses(connection, courses, topics)
+
+
+def content_hash(course: Course) -> str:
+    """ Returns a hash of the stored fields of a course, to detect changes """
+    return hashlib.sha1(json.dumps(course.to_dict(), sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def create_sync_tables(cursor):
+    """ Creates the tables with the sync state of each course and with the changelog """
+    cursor.execute("""CREATE TABLE IF NOT EXISTS campus_courses_sync ( id INTEGER PRIMARY KEY,
+                                                                      content_hash TEXT,
+                                                                      etag TEXT,
+                                                                      last_modified TEXT
+                                                                      )""")
+    cursor.execute("""CREATE TABLE IF NOT EXISTS campus_courses_changelog ( synced_at TEXT,
+                                                                           course_id INTEGER,
+                                                                           change TEXT
+                                                                           )""")
+
+
+def sync_database(db_path: str, api: CampusApi, workers: int = 16) -> List[Tuple[str, int]]:
+    """ Brings an existing courses database up to date with the Campus API
+
+    Only new and changed courses are tagged and written: each course is requested with the
+    ETag/Last-Modified markers of its last download (so the server can answer that it was not
+    modified), and otherwise the hash of its fields is compared with the stored one. Courses
+    which are no longer listed are deleted; courses which cannot be downloaded are left as
+    they are. All changes are applied in a single transaction and recorded in the
+    campus_courses_changelog table.
+
+    Args:
+        db_path (str): path of the database file (see `build_database`)
+        api (CampusApi): client of the Campus API
+        workers (int): number of concurrent downloads
+
+    Returns:
+        (List[Tuple[str, int]]): the changelog, ('added' / 'updated' / 'deleted', course id)
+    """
+    connection = sqlite3.connect(db_path)
+    try:
+        with connection:
+            create_sync_tables(connection.cursor())
+        columns = [row[1] for row in connection.execute('PRAGMA table_info(campus_courses)')]
+        topics = [column for column in columns if column not in Course().to_dict()]
+        stored = {row[0]: row[1:] for row in connection.execute(
+            'SELECT id, content_hash, etag, last_modified FROM campus_courses_sync')}
+        existing = {row[0] for row in connection.execute('SELECT id FROM campus_courses')}
+
+        listed = api.download_all_course_ids()
+
+        def download(id):
+            _, etag, last_modified = stored.get(id, (None, None, None))
+            course_xml, etag, last_modified = api.download_course_if_modified(
+                id, etag, last_modified)
+            return (get_course_info(course_xml) if course_xml is not None else None), \
+                (etag, last_modified)
+
+        changed, markers = [], {}
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(download, id): id for id in listed}
+            for future in as_completed(futures):
+                id = futures[future]
+                if future.exception() is not None:
+                    print('Downloading course {} failed: {}'.format(id, future.exception()))
+                    continue
+                course, markers[id] = future.result()
+                if course is None:
+                    continue
+                if id not in existing or stored.get(id, (None,))[0] != content_hash(course):
+                    changed.append(course)
+
+        changelog = [('updated' if int(course.id) in existing else 'added', int(course.id))
+                     for course in changed]
+        changelog += [('deleted', id) for id in existing - set(listed)]
+        changelog.sort(key=lambda change: change[1])
+        synced_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        with connection:
+            write_courses(connection, changed, topics, markers, conflict='REPLACE')
+            deleted = [(id,) for change, id in changelog if change == 'deleted']
+            connection.executemany('DELETE FROM campus_courses WHERE id = ?', deleted)
+            connection.executemany('DELETE FROM campus_courses_sync WHERE id = ?', deleted)
+            # unchanged courses may have new markers
+            connection.executemany(
+                'UPDATE campus_courses_sync SET etag = ?, last_modified = ? WHERE id = ?',
+                [marker + (id,) for id, marker in markers.items()])
+            connection.executemany('INSERT INTO campus_courses_changelog VALUES (?, ?, ?)',
+                                   [(synced_at, id, change) for change, id in changelog])
+    finally:
+        connection.close()
+    return changelog
+
+
+def build_database(db_path: str, courses: List[Course], topics: list):
+    """ Builds the courses database from scratch and replaces the file at db_path with it
+
+    The database is written to a temporary file next to db_path, without journal and syncs,
+    and then atomically moved to db_path, so that readers of the old database never see a
+    partially built one.
+
+    Args:
+        db_path (str): path of the database file
+        courses (List[Course]): the courses to insert
+        topics (list): the topics, each of which becomes a true/false column
+    """
+    tmp_path = db_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    connection = sqlite3.connect(tmp_path)
+    try:
+        # a crash only leaves a broken temporary file, so the safety measures are not needed
+        connection.execute('PRAGMA journal_mode=OFF')
+        connection.execute('PRAGMA synchronous=OFF')
+        with connection:
+            topics = create_table(connection.cursor(), topics)
+            create_sync_tables(connection.cursor())
+        insert_data_to_db(connection, courses, topics)
+    finally:
+        connection.close()
+    os.replace(tmp_path, db_path)
 
 
 def remove_stopwords(title: str, en_sw, de_sw) -> list:
@@ -291,27 +414,23 @@ def download_courses_and_topics():
     # retrieve courses from the api in batch
     print('Access to api for downloading courses ....')
     api = CampusApi(30)
-    batch = api.get_next_batch_of_courses()
 
     topics = Counter()
     en_sw = stopwords.words('english')
     de_sw = stopwords.words('german')
 
     courses: List[Course] = []
-    courses_count = 0
 
-    while batch is not None:
-        courses_count += len(batch)
-        print('Processed {} courses'.format(courses_count))
-        for course_xml in batch:
-            # turn course xml into Course object and insert into the sql db
-            course = get_course_info(xml=course_xml)
-            topics.update(get_ngrams(clean_ngrams(course.title, en_sw, de_sw)))  # from title
-            topics.update(get_ngrams(clean_ngrams(course.institution, en_sw, de_sw)))  # from institution
-            courses.append(course)
-
-            # insert_data_to_db(get_course_info(xml=course_xml))
-        batch = api.get_next_batch_of_courses()
+    # the courses are downloaded concurrently and turned into Course objects by the workers
+    for course in api.iter_courses(parse=get_course_info, workers=16):
+        topics.update(get_ngrams(clean_ngrams(course.title, en_sw, de_sw)))  # from title
+        topics.update(get_ngrams(clean_ngrams(course.institution, en_sw, de_sw)))  # from institution
+        courses.append(course)
+        if len(courses) % 100 == 0:
+            print('Processed {} courses'.format(len(courses)))
+    # the courses arrive in any order; store them in the order of the catalog
+    courses.sort(key=lambda course: int(course.id or 0))
+    courses_count = len(courses)
 
     if not os.path.exists(path_to_topic_file):
         write_topics(topics)
@@ -327,14 +446,17 @@ if __name__ == "__main__":
     path_to_courses_file = '../resources/databases/courses.pk'
     path_to_topic_file = '../resources/databases/topics_350.txt'
 
+    if '--sync' in sys.argv:
+        # only download, tag and write the courses which changed since the last build/sync
+        changes = sync_database(os.path.join(os.getcwd(), db_path), CampusApi(30))
+        for change, course_id in changes:
+            print(change, course_id)
+        print('Synced {} changes'.format(len(changes)))
+        sys.exit()
+
     all_courses = load_courses() if os.path.exists(path_to_courses_file) else download_courses_and_topics()
     final_topics = load_topics()  # get topics
     print("Total topics: ", len(final_topics))
 
-    # SQD database management
-    connection = sqlite3.connect(os.path.join(os.getcwd(), db_path))  # establish a connection
-    cursor = connection.cursor()  # create the cursor object
-
     print('Create and insert data into table...')
-    create_table(final_topics)
-    insert_data_to_db(all_courses, final_topics)
+    build_database(os.path.join(os.getcwd(), db_path), all_courses, final_topics)
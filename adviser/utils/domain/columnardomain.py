@@ -0,0 +1,411 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+""" This module provides a domain answering its lookups from NumPy columns instead of SQL. """
+
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, List
+from urllib.request import pathname2url
+
+import numpy as np
+
+from utils.domain.lookupdomain import LookupDomain
+from utils.domain.matchindex import fold_nocase
+
+
+# results with at most this many rows are decoded row by row instead of column by column,
+# which saves the overhead of the array operations
+_ROW_WISE_DECODING = 16
+# the columns of a domain are loaded (or replaced) by one thread at a time
+_load_lock = threading.Lock()
+
+
+def _quote(identifier: str) -> str:
+    """ Quotes a table or column name for use in an SQL statement """
+    return '"{}"'.format(str(identifier).replace('"', '""'))
+
+
+def _dict_factory(cursor, row) -> dict:
+    """ Converts a sqlite3 row into a dictionary """
+    return {col[0]: value for col, value in zip(cursor.description, row)}
+
+
+class _Column:
+    """ A dictionary-encoded column: the distinct values and one value code per row """
+
+    def __init__(self, values: Iterable):
+        value_codes = {}
+        self.codes = np.array([value_codes.setdefault(value, len(value_codes))
+                               for value in values], dtype=np.int32)
+        self.values = list(value_codes)
+        # the values as object array, to decode the codes of many rows at once
+        self.objects = np.empty(len(self.values), dtype=object)
+        self.objects[:] = self.values
+        # codes of the values equal to a case-folded value (as compared by SQLite's NOCASE)
+        self.folded_codes: Dict[str, List[int]] = {}
+        for value, code in value_codes.items():
+            if value is not None:
+                self.folded_codes.setdefault(fold_nocase(value), []).append(code)
+
+    def mask(self, value) -> np.ndarray:
+        """ Returns a boolean array marking the rows whose value equals value (ignoring case) """
+        codes = self.folded_codes.get(fold_nocase(value), [])
+        if len(codes) == 1:
+            return self.codes == codes[0]
+        return np.isin(self.codes, codes)
+
+
+class _Table:
+    """ The loaded columns of a table, published at once when they are complete
+
+    Attributes:
+        columns (Dict[str, _Column]): the columns by name
+        key_rows (Dict[str, List[int]]): row numbers per primary key value
+        num_rows (int): number of rows
+    """
+
+    def __init__(self, columns: Dict[str, _Column], key_rows: Dict[str, List[int]],
+                 num_rows: int):
+        self.columns = columns
+        self.key_rows = key_rows
+        self.num_rows = num_rows
+
+
+class ColumnarDomain(LookupDomain):
+    """
+    Domain for read-mostly catalogs, described like a JSONLookupDomain by a JSON ontology and
+    a SQLite database file. The table of the database is read once into dictionary-encoded
+    NumPy columns, and `find_entities`, `find_info_about_entity`, `count_entities` and
+    `value_histogram` are answered with vectorized comparisons on them.
+
+    Only the columns are kept in memory: the file is read column by column through a
+    temporary read-only connection, without copying the database or building SQL indexes.
+    Result rows are materialized as dictionaries only for the matching entities and the
+    requested slots. Results are the same as those of a JSONLookupDomain (rows in database
+    order, values compared case-insensitively).
+
+    `query_db` runs SQL on the database file, which it opens read-only on first use. After
+    the file was changed, call `reload` and, between turns, `commit_reload`.
+    """
+
+    def __init__(self, name: str, json_ontology_file: str = None, sqllite_db_file: str = None,
+                 display_name: str = None):
+        """
+        Args:
+            name (str): the domain's name used as an identifier
+            json_ontology_file (str): relative path to the ontology file
+                                (from the top-level adviser directory, e.g. resources/ontologies)
+            sqllite_db_file (str): relative path to the database file
+                                (from the top-level adviser directory, e.g. resources/databases)
+            display_name (str): the domain's name as it appears on the screen
+                                (e.g. containing whitespaces)
+        """
+        LookupDomain.__init__(self, name, display_name if display_name is not None else name)
+        self.sqllite_db_file = sqllite_db_file
+        json_ontology_file = json_ontology_file or os.path.join('resources', 'ontologies',
+                                                                name + '.json')
+        with open(self._get_root_dir() + '/' + json_ontology_file) as ontology_file:
+            self.ontology_json = json.load(ontology_file)
+        # incremented whenever other columns are put into use
+        self.generation = 0
+        self._readers = threading.local()
+
+    def __getstate__(self):
+        # the columns are read again after unpickling, connections cannot be pickled
+        state = self.__dict__.copy()
+        for attribute in ('_table', '_staged_table', '_readers'):
+            state.pop(attribute, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._readers = threading.local()
+
+    def _get_root_dir(self):
+        """ Returns the path to the root directory """
+        return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    def _get_db_file_path(self):
+        """ Returns the absolute path to the database file """
+        sqllite_db_file = self.sqllite_db_file or os.path.join('resources', 'databases',
+                                                               self.name + '.db')
+        return self._get_root_dir() + '/' + sqllite_db_file
+
+    def _open_db(self):
+        """ Opens the database file read-only """
+        db_file_path = self._get_db_file_path()
+        if not os.path.isfile(db_file_path):
+            raise FileNotFoundError("Database file {} not found".format(db_file_path))
+        uri = 'file:{}?mode=ro'.format(pathname2url(os.path.abspath(db_file_path)))
+        return sqlite3.connect(uri, uri=True)
+
+    def _load_table(self) -> _Table:
+        """ Returns the columns of the domain's table, loading them on first use
+
+        Each query works on the table returned once, so that it never mixes columns of
+        different loads; the table is only published when it is complete.
+        """
+        table = self.__dict__.get('_table')
+        if table is not None:
+            return table
+        with _load_lock:
+            table = self.__dict__.get('_table')
+            if table is None:
+                table = self._read_table()
+                self._table = table
+        return table
+
+    def _read_table(self) -> _Table:
+        """ Reads the table of the database file into columns """
+        db = self._open_db()
+        try:
+            # one read transaction, so that all columns come from the same version of the file
+            db.execute('BEGIN')
+            table_name = _quote(self.get_domain_name())
+            names = [row[1] for row in db.execute("PRAGMA table_info({})".format(table_name))]
+            # column by column, so that only the encoded columns are kept and not the rows
+            columns = {name: _Column(value for value, in db.execute(
+                "SELECT {} FROM {} ORDER BY rowid".format(_quote(name), table_name)))
+                for name in names}
+        finally:
+            db.close()
+        num_rows = len(next(iter(columns.values())).codes) if columns else 0
+        # row numbers per primary key value, for find_info_about_entity (which compares
+        # the primary key case-sensitively, like the SQL query of JSONLookupDomain)
+        key_rows = {}
+        primary_key = columns.get(self.get_primary_key())
+        if primary_key is not None:
+            for row, code in enumerate(primary_key.codes.tolist()):
+                key_rows.setdefault(primary_key.values[code], []).append(row)
+        return _Table(columns, key_rows, num_rows)
+
+    def get_table_columns(self) -> List[str]:
+        """ Returns the names of the columns of the domain's database table """
+        return list(self._load_table().columns)
+
+    def invalidate_caches(self):
+        """ Discards the loaded columns, e.g. after the database file was changed; they are
+            read again on next use """
+        # not while the columns are loaded, which could publish the old data afterwards
+        with _load_lock:
+            self._table = None
+            self.generation += 1
+
+    def reload(self, wait: bool = False) -> Future:
+        """ Reads the database file again (e.g. after the catalog was rebuilt) in a background
+            thread, while the dialogs keep using the old columns
+
+        The new columns are staged; they replace the old ones when `commit_reload` is called
+        between turns.
+
+        Args:
+            wait (bool): if True, returns only after the new columns are staged
+
+        Returns:
+            (Future): done when the new columns are staged (with their generation as result)
+        """
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='domain-reload')
+        future = executor.submit(self._reload)
+        executor.shutdown(wait=False)
+        if wait:
+            future.result()
+        return future
+
+    def _reload(self) -> int:
+        table = self._read_table()
+        with _load_lock:
+            self._staged_table = table
+            return self.generation + 1
+
+    def has_staged_reload(self) -> bool:
+        """ Returns whether reloaded columns wait for `commit_reload` """
+        return self.__dict__.get('_staged_table') is not None
+
+    def commit_reload(self) -> int:
+        """ Replaces the columns by those staged by `reload`, if any; call it between turns
+
+        Returns:
+            (int): the generation of the columns in use
+        """
+        with _load_lock:
+            table = self.__dict__.get('_staged_table')
+            if table is not None:
+                self._table, self._staged_table = table, None
+                self.generation += 1
+            return self.generation
+
+    def _normalize_constraints(self, constraints: dict) -> list:
+        """ Returns the constraints as (slot, value) pairs, without dontcare values """
+        return [(slot, str(value)) for slot, value in constraints.items()
+                if value is not None and str(value).lower() != 'dontcare']
+
+    def _match_rows(self, table: _Table, constraints: list) -> np.ndarray:
+        """ Returns the numbers of the rows matching normalized constraints """
+        mask = np.ones(table.num_rows, dtype=bool)
+        self._check_slots(table, (slot for slot, _ in constraints))
+        for slot, value in constraints:
+            mask &= table.columns[slot].mask(value)
+        return np.flatnonzero(mask)
+
+    def _check_slots(self, table: _Table, slots: Iterable[str]):
+        """ Raises an error for slots which are no columns of the table, like SQLite """
+        for slot in slots:
+            if slot not in table.columns:
+                raise sqlite3.OperationalError("no such column: {}".format(slot))
+
+    def _materialize(self, table: _Table, rows, slots: Iterable[str]) -> List[dict]:
+        """ Returns the values of the given slots of the given rows as dictionaries """
+        columns = table.columns
+        slots = list(slots)
+        self._check_slots(table, slots)
+        if len(rows) <= _ROW_WISE_DECODING:
+            selected = [(slot, columns[slot].values, columns[slot].codes) for slot in slots]
+            return [{slot: values[codes.item(row)] for slot, values, codes in selected}
+                    for row in rows]
+        rows = np.asarray(rows, dtype=np.intp)
+        if not slots:
+            return [{} for _ in range(len(rows))]
+        # decode each requested column for the selected rows at once, then assemble the rows
+        decoded = [columns[slot].objects[columns[slot].codes[rows]].tolist() for slot in slots]
+        return [dict(zip(slots, row)) for row in zip(*decoded)]
+
+    def find_entities(self, constraints: dict, requested_slots: Iterable = iter(())):
+        """ Returns all entities that meet the constraints, with values for the primary key and
+            the system requestable slots (and optional slots, specifyable via requested_slots).
+
+        Args:
+            constraints (dict): Slot-value mapping of constraints.
+                                If empty, all entities in the database will be returned.
+            requested_slots (Iterable): list of slots that should be returned in addition to the
+                                        system requestable slots and the primary key
+        """
+        slots = sorted(set([self.get_primary_key()]) |
+                       set(self.get_system_requestable_slots()) | set(requested_slots))
+        table = self._load_table()
+        rows = self._match_rows(table, self._normalize_constraints(constraints))
+        return self._materialize(table, rows, slots)
+
+    def find_info_about_entity(self, entity_id, requested_slots: Iterable):
+        """ Returns the values of the specified slots (all if none are specified) for the
+            specified entity.
+
+        Args:
+            entity_id (str): primary key value of the entity
+            requested_slots (Iterable): slots to return
+        """
+        table = self._load_table()
+        self._check_slots(table, [self.get_primary_key()])
+        rows = table.key_rows.get(entity_id, [])
+        slots = sorted(requested_slots) if requested_slots else list(table.columns)
+        return self._materialize(table, rows, slots)
+
+    def count_entities(self, constraints: dict) -> int:
+        """ Returns the number of entities meeting the constraints, without fetching them
+
+        Args:
+            constraints (dict): Slot-value mapping of constraints.
+                                If empty, all entities in the database are counted.
+        """
+        return len(self._match_rows(self._load_table(), self._normalize_constraints(constraints)))
+
+    def value_histogram(self, constraints: dict, slots: Iterable[str]) \
+            -> Dict[str, Dict[str, int]]:
+        """ Returns how often each value of the given slots occurs among the entities meeting
+            the constraints, without fetching the entities
+
+        Args:
+            constraints (dict): Slot-value mapping of constraints.
+                                If empty, all entities in the database are considered.
+            slots (Iterable[str]): slots whose values are counted
+
+        Returns:
+            (dict): {slot: {value: number of entities}}
+        """
+        table = self._load_table()
+        rows = self._match_rows(table, self._normalize_constraints(constraints))
+        slots = sorted(set(slots))
+        self._check_slots(table, slots)
+        result = {}
+        for slot in slots:
+            column = table.columns[slot]
+            counts = np.bincount(column.codes[rows], minlength=len(column.values))
+            result[slot] = {value: int(count)
+                            for value, count in zip(column.values, counts) if count}
+        return result
+
+    def query_db(self, query_str, params: Iterable = ()):
+        """ Runs an SQL query on the database file, e.g. for data the columns do not answer
+
+        Each calling thread opens the file read-only on first use, so domains which do not
+        use query_db hold no database connection.
+
+        Args:
+            query_str (string): sqlite3 query style string, may contain ? placeholders
+            params (Iterable): values of the placeholders in query_str
+
+        Return:
+            (iterable): rows of the query response set
+        """
+        db = getattr(self._readers, 'db', None)
+        if db is None:
+            db = self._open_db()
+            db.row_factory = _dict_factory
+            self._readers.db = db
+        cursor = db.cursor()
+        cursor.execute(query_str, tuple(params))
+        return cursor.fetchall()
+
+    def get_requestable_slots(self) -> List[str]:
+        """ Returns a list of all slots requestable by the user. """
+        return self.ontology_json['requestable']
+
+    def get_system_requestable_slots(self) -> List[str]:
+        """ Returns a list of all slots requestable by the system. """
+        return self.ontology_json['system_requestable']
+
+    def get_informable_slots(self) -> List[str]:
+        """ Returns a list of all informable slots. """
+        return self.ontology_json['informable'].keys()
+
+    def get_possible_values(self, slot: str) -> List[str]:
+        """ Returns all possible values for an informable slot
+
+        Args:
+            slot (str): name of the slot
+
+        Returns:
+            a list of strings, each string representing one possible value for
+            the specified slot.
+         """
+        return self.ontology_json['informable'][slot]
+
+    def get_primary_key(self):
+        """ Returns the name of a column in the associated database which can be used to uniquely
+            distinguish between database entities. """
+        return self.ontology_json['key']
+
+    def get_pronouns(self, slot):
+        return self.ontology_json['pronoun_map'].get(slot, [])
+
+    def get_keyword(self):
+        return self.ontology_json.get('keyword')
@@ -17,6 +17,9 @@
 #
 ###############################################################################
 
+from collections import Counter
+from typing import Dict, Iterable, List
+
 
 class Domain(object):
     """ Abstract class for linking a domain with a data access method.
@@ -44,3 +47,56 @@ class Domain(object):
         IMPORTANT: This function must be overridden!
         """
         raise NotImplementedError
+
+    def count_entities(self, constraints: dict) -> int:
+        """ Returns the number of entities from the data backend that meet the constraints.
+
+        Override this function if the data backend can count without returning the entities.
+
+        Args:
+            constraints (dict): slot-value mapping of constraints
+        """
+        return len(self.find_entities(constraints))
+
+    def value_histogram(self, constraints: dict, slots: Iterable[str]) \
+            -> Dict[str, Dict[str, int]]:
+        """ Returns how often each value of the given slots occurs among the entities that meet
+            the constraints.
+
+        Override this function if the data backend can aggregate without returning the
+        entities.
+
+        Args:
+            constraints (dict): slot-value mapping of constraints
+            slots (Iterable[str]): slots whose values are counted
+
+        Returns:
+            (dict): {slot: {value: number of entities}}
+        """
+        histogram = {slot: Counter() for slot in slots}
+        for entity in self.find_entities(constraints):
+            for slot, counts in histogram.items():
+                if slot in entity:
+                    counts[entity[slot]] += 1
+        return {slot: dict(counts) for slot, counts in histogram.items()}
+
+    def search(self, text: str, constraints: dict = None, limit: int = 10) -> List[dict]:
+        """ Returns the entities whose texts best match a free-text query, best match first,
+            e.g. as candidates for a policy.
+
+        Override this function if the data backend has a full-text index.
+
+        Args:
+            text (str): the query
+            constraints (dict): slot-value mapping of constraints the entities must meet
+            limit (int): maximum number of entities returned
+        """
+        raise NotImplementedError
+
+    def commit_reload(self):
+        """ Puts data reloaded in the background into use; called between turns by the
+            belief state tracker, so that all services answer a turn with the same data.
+
+        Override this function if the data backend can be reloaded.
+        """
+        pass
@@ -20,11 +20,52 @@
 
 import json
 import os
+import re
 import sqlite3
-from io import StringIO
-from typing import List, Iterable
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Iterable
+from urllib.request import pathname2url
 
+from utils.cache import LRUCache
 from utils.domain import Domain
+from utils.domain.matchindex import EntityMatchIndex, fold_nocase
+
+
+# number of prepared statements kept per database connection
+_STATEMENT_CACHE_SIZE = 256
+# columns with fewer distinct values (e.g. true/false flags) are not indexed, since a lookup
+# would still return a large part of the table
+_INDEX_MIN_DISTINCT_VALUES = 3
+# rows matched via the bitmap index are fetched by rowid if there are at most this many
+_MAX_ROWID_LOOKUPS = 500
+# the memdb VFS (SQLite >= 3.36) lets several connections of a process share one in-memory
+# database with the usual file locking; older versions fall back to the shared cache
+_HAS_MEMDB = sqlite3.sqlite_version_info >= (3, 36, 0)
+# number of most recently cached queries repeated on a reloaded database before it is used
+_WARM_UP_QUERIES = 256
+# reloads of all domains of a process run one after the other
+_reload_lock = threading.Lock()
+# guards the reloaded data waiting for commit_reload
+_staged_lock = threading.Lock()
+# text slots indexed for full-text search, if the domain's table has them
+_SEARCH_SLOTS = ('description', 'objective', 'prerequisite', 'extra_info')
+
+
+def _has_fts5() -> bool:
+    """ Returns whether the SQLite library was compiled with the FTS5 extension """
+    db = sqlite3.connect(':memory:')
+    try:
+        db.execute('CREATE VIRTUAL TABLE fts5_check USING fts5(text)')
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        db.close()
+
+
+_HAS_FTS5 = _has_fts5()
 
 
 class JSONLookupDomain(Domain):
@@ -33,7 +74,9 @@ class JSONLookupDomain(Domain):
     """
 
     def __init__(self, name: str, json_ontology_file: str = None, sqllite_db_file: str = None, \
-                 display_name: str = None):
+                 display_name: str = None, read_only: bool = False,
+                 use_match_index: bool = True, cache_size: int = 1024,
+                 search_slots: Iterable[str] = None):
         """ Loads the ontology from a json file and the data from a sqllite
             database.
 
@@ -49,28 +92,51 @@ class JSONLookupDomain(Domain):
                                 (from the top-level adviser directory, e.g. resources/databases)
             display_name (str): the domain's name as it appears on the screen
                                 (e.g. containing whitespaces)
+            read_only (bool): if True, the database file is opened read-only and memory-mapped
+                              instead of being copied to memory, so that all processes using
+                              the domain share the operating system's cached pages of the
+                              file. The file must not be modified while it is in use.
+            use_match_index (bool): if True, find_entities answers constraints on informable
+                                    slots with an in-memory bitmap index (built on first use)
+                                    instead of scanning the table
+            cache_size (int): number of results of find_entities and find_info_about_entity
+                              kept in an LRU cache (0 disables the cache)
+            search_slots (Iterable[str]): text slots indexed for `search` when the database
+                                          is loaded (default: those of description, objective,
+                                          prerequisite and extra_info in the table)
         """
         super(JSONLookupDomain, self).__init__(name)
 
         root_dir = self._get_root_dir()
         self.sqllite_db_file = sqllite_db_file
+        self.read_only = read_only
+        self.use_match_index = use_match_index
+        self.cache_size = cache_size
+        self.search_slots = list(search_slots) if search_slots is not None else None
+        # incremented whenever the data may have changed; cached results of older
+        # generations are never returned
+        self.generation = 0
         # make sure to set default values in case of None
         json_ontology_file = json_ontology_file or os.path.join('resources', 'ontologies',
                                                                 name + '.json')
-        sqllite_db_file = sqllite_db_file or os.path.join('resources', 'databases',
-                                                          name + '.db')
 
         self.ontology_json = json.load(open(root_dir + '/' + json_ontology_file))
         # load database
-        self.db = self._load_db_to_memory(root_dir + '/' + sqllite_db_file)
+        self.db = self._connect_db()
 
         self.display_name = display_name if display_name is not None else name
 
     def __getstate__(self):
-        # remove sql connection from state dict so that pickling works
+        # remove sql connection (and the index derived from it) from state dict so that
+        # pickling works
         state = self.__dict__.copy()
-        if 'db' in state:
-            del state['db']
+        state.pop('db', None)
+        state.pop('_db_uri', None)
+        state.pop('_readers', None)
+        state.pop('_search_uri', None)
+        state.pop('_match_index', None)
+        state.pop('_result_cache', None)
+        state.pop('_staged_state', None)
         return state
 
     def _get_root_dir(self):
@@ -85,6 +151,313 @@ class JSONLookupDomain(Domain):
             row_dict[col[0]] = row[col_idx]
         return row_dict
 
+    def _get_db_file_path(self):
+        """ Returns the absolute path to the database file """
+        sqllite_db_file = self.sqllite_db_file or os.path.join('resources', 'databases',
+                                                               self.name + '.db')
+        return self._get_root_dir() + '/' + sqllite_db_file
+
+    def _connect_db(self):
+        """ Opens the database in the mode chosen for this domain """
+        # URI under which the reading threads open their own connections (see _reader);
+        # stays None if the database can only be accessed through self.db
+        self._db_uri = None
+        self._readers = threading.local()
+        if self.__dict__.get('read_only'):
+            db = self._open_db_read_only(self._get_db_file_path())
+        else:
+            db = self._load_db_to_memory(self._get_db_file_path())
+            self._create_indexes(db)
+        self._columns = self._get_table_columns(db)
+        self._create_search_index(db)
+        return db
+
+    def _raw_cursor(self, db):
+        """ Returns a cursor returning rows as tuples, independent of the row factory """
+        cursor = db.cursor()
+        cursor.row_factory = None
+        return cursor
+
+    def get_table_columns(self) -> List[str]:
+        """ Returns the names of the columns of the domain's database table """
+        if "db" not in self.__dict__:
+            self.db = self._connect_db()
+        return self._columns
+
+    def get_match_index(self):
+        """ Returns the in-memory bitmap index over the informable columns of the database,
+            building it on first use (see utils/domain/matchindex.py)
+
+        Returns:
+            (EntityMatchIndex): the index
+        """
+        if self.__dict__.get('_match_index') is None:
+            self._match_index = EntityMatchIndex(self)
+        return self._match_index
+
+    @property
+    def result_cache(self) -> LRUCache:
+        """ The cache of query results (hit rate etc. via `result_cache.stats()`) """
+        if self.__dict__.get('_result_cache') is None:
+            self._result_cache = LRUCache(max_size=self.__dict__.get('cache_size', 1024))
+        return self._result_cache
+
+    def invalidate_caches(self):
+        """ Discards all cached query results and the match index, e.g. after the data in the
+            database was changed """
+        self.generation = self.__dict__.get('generation', 0) + 1
+        self._match_index = None
+        self.result_cache.clear()
+
+    # attributes holding the database and everything derived from it, replaced by reload
+    _DATA_ATTRIBUTES = ('db', '_db_uri', '_readers', '_search_uri', '_columns', '_match_index',
+                        '_result_cache')
+
+    def reload(self, wait: bool = False) -> Future:
+        """ Loads the database file again (e.g. after the catalog was rebuilt) without
+            interrupting the dialogs using the domain
+
+        The new database is opened in a background thread, where its indexes are built and
+        the most recently cached queries are repeated on it. The new database and caches are
+        then staged; they replace the old ones only when `commit_reload` is called at a turn
+        boundary (the HandcraftedBST does so on `dialog_start` and before each turn), so that
+        all services see the same data during a turn. The swap happens at once, together
+        with a new `generation`, so that cached results of the old data are never returned;
+        queries running during the swap are repeated on the new data. If loading fails, the
+        old database stays in use.
+
+        Every process holding the domain has to call reload itself.
+
+        Args:
+            wait (bool): if True, returns only after the new database is staged
+
+        Returns:
+            (Future): done when the new database is staged (with its generation as result)
+        """
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='domain-reload')
+        future = executor.submit(self._reload)
+        executor.shutdown(wait=False)
+        if wait:
+            future.result()
+        return future
+
+    def _reload(self) -> int:
+        with _reload_lock:
+            if "db" not in self.__dict__:
+                self.db = self._connect_db()
+            # a copy of the domain, used to open and prepare the new database
+            staged = object.__new__(type(self))
+            staged.__dict__.update(self.__dict__)
+            for attribute in self._DATA_ATTRIBUTES + ('_staged_state',):
+                staged.__dict__.pop(attribute, None)
+            staged.generation = self.__dict__.get('generation', 0) + 1
+            staged.db = staged._connect_db()
+            staged._warm_up([key[1:] for key in self.result_cache.keys()[-_WARM_UP_QUERIES:]])
+
+            new_state = {attribute: staged.__dict__[attribute]
+                         for attribute in self._DATA_ATTRIBUTES + ('generation',)
+                         if attribute in staged.__dict__}
+            with _staged_lock:
+                # replaces the data of an earlier reload which was not committed yet
+                self._staged_state = new_state
+            return staged.generation
+
+    def has_staged_reload(self) -> bool:
+        """ Returns whether a reloaded database waits for `commit_reload` """
+        return self.__dict__.get('_staged_state') is not None
+
+    def commit_reload(self) -> int:
+        """ Replaces the database and caches by those staged by `reload`, if any; call it
+            between turns
+
+        Returns:
+            (int): the generation of the data in use
+        """
+        with _staged_lock:
+            new_state = self.__dict__.get('_staged_state')
+            if new_state is None:
+                return self.__dict__.get('generation', 0)
+            self._staged_state = None
+            generation = self.__dict__.get('generation', 0) + 1
+            if new_state['generation'] != generation:
+                # the caches were invalidated after the reload, its results are keyed wrongly
+                new_state = dict(new_state, generation=generation, _result_cache=None)
+            # keep the old data referenced until the swap is done, so that freeing it cannot
+            # interrupt the swap
+            old_state = {attribute: self.__dict__.get(attribute) for attribute in new_state}
+            self.__dict__.update(new_state)
+            del old_state
+            return generation
+
+    def _warm_up(self, queries: List[tuple]):
+        """ Builds the indexes of a newly loaded database and runs the given queries on it, so
+            that their results are cached
+
+        Args:
+            queries (List[tuple]): keys of the result cache (without the generation)
+        """
+        if self.__dict__.get('use_match_index'):
+            self.get_match_index()
+        for query, *args in queries:
+            if query == 'find_entities':
+                slots, constraints = args
+                JSONLookupDomain.find_entities(self, dict(constraints), slots)
+            elif query == 'find_info_about_entity':
+                entity_id, slots = args
+                JSONLookupDomain.find_info_about_entity(self, entity_id, slots)
+            elif query == 'count_entities':
+                self.count_entities(dict(args[0]))
+            elif query == 'value_histogram':
+                slots, constraints = args
+                self.value_histogram(dict(constraints), slots)
+            elif query == 'search':
+                match, slots, constraints, limit = args
+                self._cached_query((query, *args), lambda: self._query_search(
+                    match, slots, list(constraints), limit))
+
+    def _cached_query(self, key: tuple, run_query, copy=None):
+        """ Returns the result for key from the result cache, running the query on a miss
+
+        If the database is swapped by `reload` while the query runs, the query is repeated,
+        so that a result never mixes the old and the new data.
+
+        Args:
+            key (tuple): normalized description of the query
+            run_query (Callable): function returning the result
+            copy (Callable): function copying a result (default: copies a list of rows)
+        """
+        while True:
+            generation = self.__dict__.get('generation', 0)
+            result = self.result_cache.get((generation,) + key)
+            if result is not None:
+                break
+            result = run_query()
+            if self.__dict__.get('generation', 0) == generation:
+                self.result_cache.put((generation,) + key, result)
+                break
+        # copies, so that callers modifying the result do not modify the cache
+        if copy is None:
+            return [dict(row) if isinstance(row, dict) else row for row in result]
+        return copy(result)
+
+    def _normalize_constraints(self, constraints: dict) -> list:
+        """ Returns the constraints as sorted (slot, value) pairs, without dontcare values
+            (sorted, so that the same statement is prepared for the same constrained slots) """
+        return sorted((slot, str(value)) for slot, value in constraints.items()
+                      if value is not None and str(value).lower() != 'dontcare')
+
+    def _constraints_key(self, constraints: list) -> tuple:
+        """ Returns the cache key of normalized constraints; values are compared
+            case-insensitively, so they are case-folded """
+        return tuple((slot, fold_nocase(value)) for slot, value in constraints)
+
+    def _where_clause(self, constraints: list) -> str:
+        """ Returns the WHERE clause (with ? placeholders) for normalized constraints """
+        if not constraints:
+            return ''
+        return ' WHERE ' + ' AND '.join("{}=? COLLATE NOCASE".format(self._column(slot))
+                                        for slot, _ in constraints)
+
+    def _indexed(self, constraints: list, slots: Iterable = ()):
+        """ Returns the match index if it can answer a query on the constraints and slots,
+            else None """
+        if not self.__dict__.get('use_match_index'):
+            return None
+        match_index = self.get_match_index()
+        if match_index.can_answer(dict(constraints)) and match_index.can_answer(slots):
+            return match_index
+        return None
+
+    def _get_table_columns(self, db) -> List[str]:
+        """ Returns the names of the columns of the domain's table """
+        cursor = self._raw_cursor(db)
+        cursor.execute("PRAGMA table_info({})".format(self._quote(self.get_domain_name())))
+        return [row[1] for row in cursor.fetchall()]
+
+    def _create_indexes(self, db):
+        """ Creates case-insensitive indexes for the columns used as constraints
+
+        The primary key is always indexed, informable columns only if they have enough
+        distinct values for an index lookup to be more selective than a table scan. The
+        primary key gets a case-sensitive index as well, used by the exact lookups of
+        `find_info_about_entity`.
+
+        Args:
+            db: sqllite3 connection to a writable (in-memory) database
+        """
+        table = self.get_domain_name()
+        cursor = self._raw_cursor(db)
+        columns = set(self._get_table_columns(db))
+        if self.get_primary_key() in columns:
+            cursor.execute("CREATE INDEX IF NOT EXISTS {} ON {} ({})".format(
+                self._quote("idx_{}_{}".format(table, self.get_primary_key())),
+                self._quote(table), self._quote(self.get_primary_key())))
+        for slot in [self.get_primary_key()] + sorted(self.get_informable_slots()):
+            if slot not in columns:
+                continue
+            if slot != self.get_primary_key():
+                cursor.execute("SELECT COUNT(DISTINCT {} COLLATE NOCASE) FROM {}".format(
+                    self._quote(slot), self._quote(table)))
+                if cursor.fetchone()[0] < _INDEX_MIN_DISTINCT_VALUES:
+                    continue
+            cursor.execute("CREATE INDEX IF NOT EXISTS {} ON {} ({} COLLATE NOCASE)".format(
+                self._quote("idx_{}_{}_nocase".format(table, slot)), self._quote(table),
+                self._quote(slot)))
+        db.commit()
+
+    def get_search_slots(self) -> List[str]:
+        """ Returns the text slots indexed for full-text search (see `search`) """
+        if "db" not in self.__dict__:
+            self.db = self._connect_db()
+        return self._search_slots()
+
+    def _search_slots(self) -> List[str]:
+        if self.__dict__.get('search_slots') is not None:
+            return list(self.search_slots)
+        return [slot for slot in _SEARCH_SLOTS if slot in self._columns]
+
+    def _create_search_index(self, db):
+        """ Builds the full-text index over the search slots
+
+        The index is an FTS5 table in a separate in-memory database, so that it can be built
+        for read-only database files as well; every connection attaches it as `search`. Its
+        rowids are those of the domain's table. Each process builds its own copy whenever it
+        loads the database, i.e. on every load and `reload`, also for read-only domains. No
+        index is built if the table has no search slots or SQLite lacks the FTS5 extension.
+
+        Args:
+            db: sqllite3 connection to the domain's database
+        """
+        self._search_uri = None
+        slots = self._search_slots()
+        if not slots or not _HAS_FTS5:
+            return
+        uri = self._memory_uri('search')
+        db.execute('ATTACH DATABASE ? AS search', (uri,))
+        columns = ', '.join(self._column(slot) for slot in slots)
+        cursor = self._raw_cursor(db)
+        # case and diacritics are ignored; prefixes of 2 and 3 characters are indexed, so that
+        # short prefix queries do not scan the whole term list
+        cursor.execute("CREATE VIRTUAL TABLE search.fts USING fts5({}, "
+                       "tokenize='unicode61 remove_diacritics 2', prefix='2 3')".format(columns))
+        cursor.execute("INSERT INTO search.fts (rowid, {0}) SELECT rowid, {0} FROM main.{1}"
+                       .format(columns, self._quote(self.get_domain_name())))
+        cursor.execute("INSERT INTO search.fts (fts) VALUES ('optimize')")
+        db.commit()
+        self._search_uri = uri
+
+    @staticmethod
+    def _quote(identifier: str) -> str:
+        """ Quotes a table or column name for use in an SQL statement """
+        return '"{}"'.format(str(identifier).replace('"', '""'))
+
+    def _column(self, slot: str) -> str:
+        """ Returns the quoted column name of a slot; raises an error for unknown columns
+            (SQLite would interpret an unknown quoted column name as a string) """
+        if self.__dict__.get('_columns') and slot not in self._columns:
+            raise sqlite3.OperationalError("no such column: {}".format(slot))
+        return self._quote(slot)
+
     def _load_db_to_memory(self, db_file_path : str):
         """ Loads a sqllite3 database from file to memory in order to save
             I/O operations
@@ -95,23 +468,86 @@ class JSONLookupDomain(Domain):
         Returns:
             A sqllite3 connection
         """
-
-        # open and read db file to temporary file
+        # copy the file page by page instead of dumping and replaying it as SQL
+        uri = self._memory_uri('data')
         file_db = sqlite3.connect(db_file_path, check_same_thread=False)
-        tempfile = StringIO()
-        for line in file_db.iterdump():
-            tempfile.write('%s\n' % line)
+        db = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                             cached_statements=_STATEMENT_CACHE_SIZE)
+        file_db.backup(db)
         file_db.close()
-        tempfile.seek(0)
-        # Create a database in memory and import from temporary file
-        db = sqlite3.connect(':memory:', check_same_thread=False)
         db.row_factory = self._sqllite_dict_factory
-        db.cursor().executescript(tempfile.read())
-        db.commit()
-        # file_db.backup(databases[domain]) # works only in python >= 3.7
+        self._db_uri = uri
+        return db
+
+    def _memory_uri(self, kind: str) -> str:
+        """ Returns the URI of a new in-memory database
+
+        The database gets a unique name, so that each thread can open its own connection to
+        it; it lives as long as a connection to it is open.
+
+        Args:
+            kind (str): what the database holds (part of its name)
+        """
+        name = 'adviser-{}-{}-{}'.format(self.name, kind, uuid.uuid4().hex)
+        if _HAS_MEMDB:
+            return 'file:/{}?vfs=memdb'.format(name)
+        return 'file:{}?mode=memory&cache=shared'.format(name)
+
+    def _open_db_read_only(self, db_file_path: str):
+        """ Opens a sqllite3 database file read-only and memory-maps it
+
+        The file is declared immutable, so SQLite neither locks it nor checks it for changes;
+        opening it does not read the data, which is paged in from the (shared) page cache
+        of the operating system on first access.
+
+        Args:
+            db_file_path (str): absolute path to database file
 
+        Returns:
+            A sqllite3 connection
+        """
+        if not os.path.isfile(db_file_path):
+            raise FileNotFoundError("Database file {} not found".format(db_file_path))
+        uri = 'file:{}?mode=ro&immutable=1'.format(pathname2url(os.path.abspath(db_file_path)))
+        db = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                             cached_statements=_STATEMENT_CACHE_SIZE)
+        db.execute('PRAGMA mmap_size={}'.format(os.path.getsize(db_file_path)))
+        db.row_factory = self._sqllite_dict_factory
+        self._db_uri = uri
         return db
 
+    def _reader(self):
+        """ Returns the read-only connection of the calling thread, opening it on first use
+
+        Every thread queries the database through its own connection, so that concurrent
+        dialogs do not wait for each other (a sqlite3 connection serializes its calls). The
+        connections of a thread are closed when the thread ends.
+
+        Returns:
+            A sqllite3 connection
+        """
+        if "db" not in self.__dict__:
+            self.db = self._connect_db()
+        uri = self.__dict__.get('_db_uri')
+        if uri is None:
+            return self.db
+        readers = self._readers
+        # the URI changes when the database is opened again
+        if getattr(readers, 'uri', None) != uri:
+            db = sqlite3.connect(uri, uri=True, cached_statements=_STATEMENT_CACHE_SIZE)
+            if self.__dict__.get('_search_uri'):
+                db.execute('ATTACH DATABASE ? AS search', (self._search_uri,))
+            db.execute('PRAGMA query_only=1')
+            if self.__dict__.get('read_only'):
+                db.execute('PRAGMA mmap_size={}'.format(
+                    os.path.getsize(self._get_db_file_path())))
+            elif not _HAS_MEMDB:
+                # do not wait for the table locks of the shared cache
+                db.execute('PRAGMA read_uncommitted=1')
+            db.row_factory = self._sqllite_dict_factory
+            readers.db, readers.uri = db, uri
+        return readers.db
+
     def find_entities(self, constraints: dict, requested_slots: Iterable = iter(())):
         """ Returns all entities from the data backend that meet the constraints, with values for
             the primary key and the system requestable slots (and optional slots, specifyable
@@ -125,16 +561,167 @@ class JSONLookupDomain(Domain):
 
         """
         # values for name and all system requestable slots
-        select_clause = ", ".join(set([self.get_primary_key()]) |
-                                  set(self.get_system_requestable_slots()) |
-                                  set(requested_slots))
-        query = "SELECT {} FROM {}".format(select_clause, self.get_domain_name())
-        constraints = {slot: value.replace("'", "''") for slot, value in constraints.items()
-                       if value is not None and str(value).lower() != 'dontcare'}
-        if constraints:
-            query += ' WHERE ' + ' AND '.join("{}='{}' COLLATE NOCASE".format(key, str(val))
-                                              for key, val in constraints.items())
-        return self.query_db(query)
+        slots = tuple(sorted(set([self.get_primary_key()]) |
+                             set(self.get_system_requestable_slots()) | set(requested_slots)))
+        constraints = self._normalize_constraints(constraints)
+        key = ('find_entities', slots, self._constraints_key(constraints))
+        return self._cached_query(key, lambda: self._query_entities(slots, constraints))
+
+    def _query_entities(self, slots: tuple, constraints: list):
+        """ Queries the entities matching the constraints (see `find_entities`)
+
+        Args:
+            slots (tuple): slots to return
+            constraints (list): sorted (slot, value) pairs of the constraints
+        """
+        select_clause = ", ".join(self._column(slot) for slot in slots)
+        query = "SELECT {} FROM {}".format(select_clause, self._quote(self.get_domain_name()))
+        match_index = self._indexed(constraints) if constraints else None
+        if match_index:
+            # answer the conjunction with the bitmap index, then fetch the rows by rowid
+            rowids = match_index.entity_rowids(match_index.match(dict(constraints)))
+            if len(rowids) <= _MAX_ROWID_LOOKUPS:
+                if len(rowids) == 0:
+                    return []
+                query += ' WHERE rowid IN ({}) ORDER BY rowid'.format(
+                    ', '.join('?' * len(rowids)))
+                return self.query_db(query, rowids.tolist())
+        query += self._where_clause(constraints)
+        return self.query_db(query, [value for _, value in constraints])
+
+    def count_entities(self, constraints: dict) -> int:
+        """ Returns the number of entities meeting the constraints, without fetching them
+
+        Args:
+            constraints (dict): Slot-value mapping of constraints.
+                                If empty, all entities in the database are counted.
+        """
+        constraints = self._normalize_constraints(constraints)
+
+        def count():
+            match_index = self._indexed(constraints)
+            if match_index:
+                return match_index.count(match_index.match(dict(constraints)))
+            query = "SELECT COUNT(*) AS num FROM {}".format(self._quote(self.get_domain_name()))
+            query += self._where_clause(constraints)
+            return self.query_db(query, [value for _, value in constraints])[0]['num']
+
+        return self._cached_query(('count_entities', self._constraints_key(constraints)),
+                                  count, copy=lambda num: num)
+
+    def value_histogram(self, constraints: dict, slots: Iterable[str]) \
+            -> Dict[str, Dict[str, int]]:
+        """ Returns how often each value of the given slots occurs among the entities meeting
+            the constraints, without fetching the entities
+
+        Args:
+            constraints (dict): Slot-value mapping of constraints.
+                                If empty, all entities in the database are considered.
+            slots (Iterable[str]): slots whose values are counted
+
+        Returns:
+            (dict): {slot: {value: number of entities}}
+        """
+        constraints = self._normalize_constraints(constraints)
+        slots = tuple(sorted(set(slots)))
+
+        def histogram():
+            match_index = self._indexed(constraints, slots)
+            if match_index:
+                bitmap = match_index.match(dict(constraints))
+                return {slot: match_index.value_counts(bitmap, slot) for slot in slots}
+            result = {}
+            for slot in slots:
+                query = "SELECT {0} AS value, COUNT(*) AS num FROM {1}{2} GROUP BY {0}".format(
+                    self._column(slot), self._quote(self.get_domain_name()),
+                    self._where_clause(constraints))
+                rows = self.query_db(query, [value for _, value in constraints])
+                result[slot] = {row['value']: row['num'] for row in rows}
+            return result
+
+        return self._cached_query(
+            ('value_histogram', slots, self._constraints_key(constraints)), histogram,
+            copy=lambda result: {slot: dict(counts) for slot, counts in result.items()})
+
+    def search(self, text: str, constraints: dict = None, limit: int = 10,
+               requested_slots: Iterable = iter(()), slots: Iterable[str] = None,
+               prefix: bool = True, match_all: bool = False) -> List[dict]:
+        """ Returns the entities whose text slots (e.g. the description) best match a free-text
+            query, ranked by BM25, with the same slots as `find_entities`
+
+        Policies can use it to generate candidates from what the user said about an entity,
+        before or instead of constraining its informable slots. The full-text index is an
+        in-memory copy of the search slots, built by each process whenever it loads the
+        database (see `has_search_index`).
+
+        Args:
+            text (str): the query; its words are matched case-insensitively, ignoring
+                        punctuation and diacritics
+            constraints (dict): Slot-value mapping of constraints the entities must meet
+                                additionally
+            limit (int): maximum number of entities returned
+            requested_slots (Iterable): list of slots that should be returned in addition to the
+                                        system requestable slots and the primary key
+            slots (Iterable[str]): search slots to search in (default: all, see
+                                   `get_search_slots`)
+            prefix (bool): if True, a word also matches the words it is a prefix of (e.g.
+                           'network' matches 'networks')
+            match_all (bool): if True, only entities matching all words are returned, else
+                              those matching any word
+
+        Returns:
+            (List[dict]): the entities, best match first
+
+        Raises:
+            sqlite3.OperationalError: if the domain has no full-text index (no search slots,
+                                      or SQLite without FTS5) or slots are no search slots
+        """
+        if not self.has_search_index():
+            raise sqlite3.OperationalError("no full-text index for domain {}".format(self.name))
+        search_slots = self.get_search_slots()
+        slots = tuple(sorted(set(slots))) if slots else ()
+        for slot in slots:
+            if slot not in search_slots:
+                raise sqlite3.OperationalError("no full-text index on column: {}".format(slot))
+        words = re.findall(r'\w+', text)
+        if not words or limit <= 0:
+            return []
+        # every word is quoted, so that it cannot be read as an FTS5 operator
+        match = (' AND ' if match_all else ' OR ').join(
+            '"{}"{}'.format(word, '*' if prefix else '') for word in words)
+        if slots:
+            match = '{{{}}} : ({})'.format(' '.join(slots), match)
+        entity_slots = tuple(sorted(set([self.get_primary_key()]) |
+                                    set(self.get_system_requestable_slots()) |
+                                    set(requested_slots)))
+        constraints = self._normalize_constraints(constraints or {})
+        key = ('search', match, entity_slots, self._constraints_key(constraints), limit)
+        return self._cached_query(key, lambda: self._query_search(match, entity_slots,
+                                                                  constraints, limit))
+
+    def has_search_index(self) -> bool:
+        """ Returns whether the domain has a full-text index for `search` """
+        if "db" not in self.__dict__:
+            self.db = self._connect_db()
+        return self.__dict__.get('_search_uri') is not None
+
+    def _query_search(self, match: str, slots: tuple, constraints: list, limit: int):
+        """ Queries the entities best matching a full-text query (see `search`)
+
+        Args:
+            match (str): FTS5 query
+            slots (tuple): slots to return
+            constraints (list): sorted (slot, value) pairs of the constraints
+            limit (int): maximum number of entities
+        """
+        query = "SELECT {} FROM search.fts JOIN main.{} AS entity ON entity.rowid = fts.rowid " \
+                "WHERE fts MATCH ?".format(
+                    ", ".join('entity.' + self._column(slot) for slot in slots),
+                    self._quote(self.get_domain_name()))
+        for slot, _ in constraints:
+            query += " AND entity.{}=? COLLATE NOCASE".format(self._column(slot))
+        query += " ORDER BY bm25(fts) LIMIT ?"
+        return self.query_db(query, [match] + [value for _, value in constraints] + [limit])
 
     def find_info_about_entity(self, entity_id, requested_slots: Iterable):
         """ Returns the values (stored in the data backend) of the specified slots for the
@@ -145,31 +732,43 @@ class JSONLookupDomain(Domain):
             requested_slots (dict): slot-value mapping of constraints
 
         """
-        if requested_slots:
-            select_clause = ", ".join(sorted(requested_slots))
+        slots = tuple(sorted(requested_slots)) if requested_slots else ()
+        return self._cached_query(('find_info_about_entity', entity_id, slots),
+                                  lambda: self._query_entity_info(entity_id, slots))
+
+    def _entity_info_query(self, slots: tuple) -> str:
+        """ Returns the SQL query (with a ? placeholder for the primary key value) of
+            `_query_entity_info` """
+        if slots:
+            select_clause = ", ".join(self._column(slot) for slot in slots)
         # If the user hasn't specified any slots we don't know what they want so we give everything
         else:
             select_clause = "*"
-        query = 'SELECT {} FROM {} WHERE {}="{}";'.format(
-            select_clause, self.get_domain_name(), self.get_primary_key(), entity_id)
-        return self.query_db(query)
+        return 'SELECT {} FROM {} WHERE {}=?;'.format(
+            select_clause, self._quote(self.get_domain_name()),
+            self._column(self.get_primary_key()))
 
-    def query_db(self, query_str):
+    def _query_entity_info(self, entity_id, slots: tuple):
+        """ Queries the values of an entity (see `find_info_about_entity`)
+
+        Args:
+            entity_id (str): primary key value of the entity
+            slots (tuple): slots to return (all if empty)
+        """
+        return self.query_db(self._entity_info_query(slots), (entity_id,))
+
+    def query_db(self, query_str, params: Iterable = ()):
         """ Function for querying the sqlite3 db
 
         Args:
-            query_str (string): sqlite3 query style string
+            query_str (string): sqlite3 query style string, may contain ? placeholders
+            params (Iterable): values of the placeholders in query_str
 
         Return:
             (iterable): rows of the query response set
         """
-        if "db" not in self.__dict__:
-            root_dir = self._get_root_dir()
-            sqllite_db_file = self.sqllite_db_file or os.path.join(
-                'resources', 'databases', self.name + '.db')
-            self.db = self._load_db_to_memory(root_dir + '/' + sqllite_db_file)
-        cursor = self.db.cursor()
-        cursor.execute(query_str)
+        cursor = self._reader().cursor()
+        cursor.execute(query_str, tuple(params))
         res = cursor.fetchall()
         return res
 
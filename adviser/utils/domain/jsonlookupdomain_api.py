@@ -9,9 +9,14 @@ class JSONLookupDomainAPI(JSONLookupDomain):
     __slots__ = "campus_api", "_registration_info_xpath", "_registration_link_xpath"
 
     def __init__(self, name: str, json_ontology_file: str = None, sqllite_db_file: str = None, \
-                 display_name: str = None):
+                 display_name: str = None, campus_api: CampusApi = None):
+        """
+        Args:
+            campus_api (CampusApi): client for the live course data (default: a client for the
+                                    campus REST API); see JSONLookupDomain for the other arguments
+        """
         super(JSONLookupDomainAPI, self).__init__(name, json_ontology_file, sqllite_db_file, display_name)
-        self.campus_api = CampusApi()
+        self.campus_api = campus_api if campus_api is not None else CampusApi()
         self._registration_info_xpath = "resource/content/cpCourseDetailDto/cpCourseDto/registrationInfoStatus"
         self._registration_link_xpath = "resource/link[@name='CpCourseRegistrationDto']/@href"
         
@@ -21,13 +26,16 @@ class JSONLookupDomainAPI(JSONLookupDomain):
         For user questions about the registration of a course, live data is fetched from the Campus API,
         and used in the system response.
 
+        The courses are cached by the CampusApi, and a course which is not cached is waited
+        for at most `campus_api.max_wait` seconds, so a slow campus backend does not stall the
+        dialog.
+
         For other use cases the information is fetched from the DB as before.
         """
         if requested_slots and "registration" in requested_slots.keys():
             try:
-                query = 'SELECT id FROM {} WHERE {}="{}";'.format(
-                    self.get_domain_name(), self.get_primary_key(), entity_id)
-                res = self.query_db(query)
+                query = self._entity_info_query(('id',))
+                res = self.query_db(query, (entity_id,))
                 course_id = res[0]["id"]
                 course_xml = self.campus_api.get_course_by_id(course_id)
                 registration_infos = course_xml.xpath(self._registration_info_xpath)
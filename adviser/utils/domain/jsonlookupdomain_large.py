@@ -18,4 +18,6 @@ class JSONLookupDomainLarge(JSONLookupDomain):
         file_db = sqlite3.connect(db_file_path, check_same_thread=False)
         db = sqlite3.connect(':memory:', check_same_thread=False)
         file_db.backup(db)
-        return db
\ No newline at end of file
+        file_db.close()
+        db.row_factory = self._sqllite_dict_factory
+        return db
@@ -0,0 +1,212 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+""" This module provides an in-memory bitmap index over the informable columns of a domain. """
+
+from typing import Dict, FrozenSet, Iterable, List, Tuple
+
+import numpy as np
+
+from utils.cache import LRUCache
+
+
+# SQLite's NOCASE collation only folds the ASCII letters
+_NOCASE = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+
+Constraints = FrozenSet[Tuple[str, str]]
+
+
+def fold_nocase(value) -> str:
+    """ Returns the value as string with ASCII letters lowercased, the way SQLite's NOCASE
+        collation compares it """
+    return str(value).translate(_NOCASE)
+
+
+if hasattr(np, 'bitwise_count'):
+    def _popcount(bitmap: np.ndarray) -> int:
+        return int(np.bitwise_count(bitmap).sum())
+else:
+    def _popcount(bitmap: np.ndarray) -> int:
+        return int(np.unpackbits(bitmap).sum())
+
+
+class EntityMatchIndex:
+    """
+    Answers which and how many entities of a domain match a conjunction of constraints, and
+    how the values of a slot are distributed among them, without querying the database.
+
+    Each informable column is stored as an array of value codes. Sets of entities are bitmaps
+    (NumPy arrays of packed bits, one bit per entity), so constraints are combined with
+    vectorized bitwise operations. The bitmaps of all values of columns with few distinct
+    values (e.g. the true/false topic columns of the campus courses) are built in advance;
+    for other columns they are computed from the value codes when needed.
+    The bitmaps for a set of constraints are cached, so the bitmap of a dialog turn that adds
+    a constraint is computed by a single AND with the bitmap of the previous turn.
+    """
+
+    def __init__(self, domain, max_bitmap_values: int = 64, cache_size: int = 256):
+        """
+        Args:
+            domain (JSONLookupDomain): the domain whose entities are indexed
+            max_bitmap_values (int): columns with at most this many distinct values get
+                                     precomputed bitmaps
+            cache_size (int): maximum number of cached constraint bitmaps
+        """
+        columns = domain.get_table_columns()
+        self.slots = [slot for slot in domain.get_informable_slots() if slot in columns]
+        select = ", ".join(['rowid AS _rowid_'] + ['"{}"'.format(slot) for slot in self.slots])
+        rows = domain.query_db('SELECT {} FROM "{}" ORDER BY rowid'.format(
+            select, domain.get_domain_name()))
+        names = ['_rowid_'] + self.slots
+        rows = [[row[name] for name in names] if isinstance(row, dict) else row
+                for row in rows]
+        self.num_entities = len(rows)
+        self.rowids = np.array([row[0] for row in rows], dtype=np.int64)
+
+        # per column: value codes of the entities, the distinct values and a mapping from the
+        # case-folded values (as matched by the database) to their codes
+        self.values: Dict[str, List] = {}
+        self.codes: Dict[str, np.ndarray] = {}
+        self._folded_codes: Dict[str, Dict[str, List[int]]] = {}
+        self._bitmaps: Dict[str, Dict[int, np.ndarray]] = {}
+        for col, slot in enumerate(self.slots, start=1):
+            value_codes = {}
+            codes = np.array([value_codes.setdefault(row[col], len(value_codes))
+                              for row in rows], dtype=np.int32)
+            self.values[slot] = list(value_codes)
+            self.codes[slot] = codes
+            folded = {}
+            for value, code in value_codes.items():
+                if value is not None:
+                    folded.setdefault(fold_nocase(value), []).append(code)
+            self._folded_codes[slot] = folded
+            if len(value_codes) <= max_bitmap_values:
+                self._bitmaps[slot] = {code: np.packbits(codes == code)
+                                       for code in value_codes.values()}
+
+        self._all = np.packbits(np.ones(self.num_entities, dtype=bool))
+        self._none = np.packbits(np.zeros(self.num_entities, dtype=bool))
+        self._cache = LRUCache(max_size=cache_size)
+
+    def can_answer(self, constraints: dict) -> bool:
+        """ Returns whether all constrained slots are indexed columns """
+        return all(slot in self.codes for slot in constraints)
+
+    def match(self, constraints: dict) -> np.ndarray:
+        """ Returns the bitmap of the entities matching all constraints
+
+        Args:
+            constraints (dict): slot-value mapping; None and 'dontcare' values are ignored
+        """
+        key = frozenset((slot, fold_nocase(value)) for slot, value in constraints.items()
+                        if value is not None and str(value).lower() != 'dontcare')
+        return self._lookup(key)
+
+    def _lookup(self, key: Constraints) -> np.ndarray:
+        if not key:
+            return self._all
+        result = self._cache.get(key)
+        if result is not None:
+            return result
+        # one constraint more than a cached set (usually the previous turn): a single AND
+        for constraint in key:
+            base = self._cache.get(key - {constraint}) if len(key) > 1 else self._all
+            if base is not None:
+                result = base & self._bitmap(constraint)
+                break
+        else:
+            result = self._all
+            for constraint in key:
+                result = result & self._bitmap(constraint)
+        self._cache.put(key, result)
+        return result
+
+    def _bitmap(self, constraint: Tuple[str, str]) -> np.ndarray:
+        slot, value = constraint
+        codes = self._folded_codes[slot].get(value, [])
+        if slot in self._bitmaps:
+            bitmaps = [self._bitmaps[slot][code] for code in codes]
+        else:
+            bitmaps = [np.packbits(self.codes[slot] == code) for code in codes]
+        if not bitmaps:
+            return self._none
+        result = bitmaps[0]
+        for bitmap in bitmaps[1:]:
+            result = result | bitmap
+        return result
+
+    def count(self, bitmap: np.ndarray) -> int:
+        """ Returns the number of entities in a bitmap """
+        return _popcount(bitmap)
+
+    def mask(self, bitmap: np.ndarray) -> np.ndarray:
+        """ Returns a bitmap as boolean array with one entry per entity """
+        return np.unpackbits(bitmap, count=self.num_entities).astype(bool)
+
+    def entity_rowids(self, bitmap: np.ndarray) -> np.ndarray:
+        """ Returns the database rowids of the entities in a bitmap """
+        return self.rowids[self.mask(bitmap)]
+
+    def value_counts(self, bitmap: np.ndarray, slot: str) -> Dict:
+        """ Returns how often each value of a slot occurs among the entities of a bitmap """
+        counts = np.bincount(self.codes[slot][self.mask(bitmap)],
+                             minlength=len(self.values[slot]))
+        return {value: int(count) for value, count in zip(self.values[slot], counts) if count}
+
+    def discriminable(self, bitmap: np.ndarray, ignore_slots: Iterable[str] = ()) -> bool:
+        """ Returns whether the entities differ in the value of any informable slot except
+            the ignored slots (including the primary key, as when comparing the database rows)
+
+        Args:
+            bitmap (np.ndarray): bitmap of the matching entities
+            ignore_slots (Iterable[str]): slots which cannot be used to tell entities apart,
+                                          e.g. slots the user does not care about
+        """
+        if self.count(bitmap) < 2:
+            return False
+        mask = self.mask(bitmap)
+        ignore_slots = set(ignore_slots)
+        for slot in self.slots:
+            if slot in ignore_slots:
+                continue
+            codes = self.codes[slot][mask]
+            if (codes != codes[0]).any():
+                return True
+        return False
+
+    def count_matches(self, constraints: dict, ignore_slots: Iterable[str] = ()) \
+            -> Tuple[int, bool]:
+        """ Returns the number of entities matching the constraints and whether they are
+            discriminable (see `discriminable`)
+
+        Args:
+            constraints (dict): slot-value mapping of constraints
+            ignore_slots (Iterable[str]): slots not considered for discriminating the entities
+        """
+        bitmap = self.match(constraints)
+        return self.count(bitmap), self.discriminable(bitmap, ignore_slots)
+
+
+def load_match_index(domain) -> EntityMatchIndex:
+    """ Returns the match index of a domain, which is built on first use
+
+    Args:
+        domain (JSONLookupDomain): the domain whose entities are indexed
+    """
+    return domain.get_match_index()
@@ -0,0 +1,130 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+""" This module provides a tagger finding all topics (n-grams) mentioned in a text in a single
+    pass, used to compute the topic columns of the campus courses database. """
+
+from multiprocessing import Pool
+from typing import Dict, Iterable, List
+
+
+class TopicTagger:
+    """
+    Finds which of a fixed set of topics occur as substrings of a text, with an Aho-Corasick
+    automaton over all topics: the text is scanned once, character by character, instead of
+    once per topic.
+
+    Topics are n-grams joined by '_' (e.g. 'machine_learning'), which are searched for with
+    spaces (e.g. 'machine learning'); texts and topics are compared lowercased.
+    """
+
+    def __init__(self, topics: Iterable[str]):
+        """
+        Args:
+            topics (Iterable[str]): the topics, in the order of the flag vectors
+        """
+        self.topics = list(topics)
+        # state 0 is the root; per state: transitions, failure link and matched topics
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        for idx, topic in enumerate(self.topics):
+            state = 0
+            for char in topic.replace('_', ' ').lower():
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._out[state].append(idx)
+        self._link()
+
+    def _link(self):
+        """ Computes the failure links (breadth-first) and merges the matches of the states
+            they point to """
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, child in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+                queue.append(child)
+
+    def find(self, text: str) -> set:
+        """ Returns the indices of the topics occurring in text """
+        found = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for char in text.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+    def tag(self, fields: Iterable[str]) -> List[str]:
+        """ Returns for each topic 'true' if it occurs in one of the fields, else 'false'
+
+        Args:
+            fields (Iterable[str]): texts to search (None values are skipped); a topic has to
+                                    occur within one field
+        """
+        # topics contain no line breaks, so they cannot match across fields
+        found = self.find('\n'.join(field.replace('\n', ' ') for field in fields if field))
+        return ['true' if idx in found else 'false' for idx in range(len(self.topics))]
+
+
+_worker_tagger: TopicTagger = None
+
+
+def _init_worker(topics: List[str]):
+    global _worker_tagger
+    _worker_tagger = TopicTagger(topics)
+
+
+def _tag_in_worker(fields: List[str]) -> List[str]:
+    return _worker_tagger.tag(fields)
+
+
+def tag_texts(texts: List[List[str]], topics: List[str], processes: int = None,
+              chunksize: int = 64) -> List[List[str]]:
+    """ Tags many texts (e.g. the fields of all courses) in a pool of processes
+
+    Each process builds the automaton once; the texts are distributed in chunks.
+
+    Args:
+        texts (List[List[str]]): the fields of each text
+        topics (List[str]): the topics
+        processes (int): number of processes (default: number of CPUs); with 1, the texts are
+                         tagged in the calling process
+        chunksize (int): number of texts sent to a process at once
+
+    Returns:
+        (List[List[str]]): the flag vector (see `TopicTagger.tag`) of each text
+    """
+    if processes == 1 or len(texts) <= chunksize:
+        tagger = TopicTagger(topics)
+        return [tagger.tag(fields) for fields in texts]
+    with Pool(processes, initializer=_init_worker, initargs=(list(topics),)) as pool:
+        return pool.map(_tag_in_worker, texts, chunksize=chunksize)